@@ -0,0 +1,320 @@
+"""
+紫鸟客户端的asyncio版本
+HTTP通讯走 aiohttp，Selenium 的阻塞调用放到有上限的线程池里执行，
+等待页面加载时用 asyncio.sleep 轮询，不占用线程，一个事件循环即可同时打开上百个店铺
+ip检测在线程池中执行同步版本的 verify_store_ip，两者共用检测缓存
+只连接一个客户端，配置了多个客户端实例（ZINIAO_SOCKET_PORTS / ZINIAO_ACCOUNTS_FILE）时请使用同步版本
+
+示例：
+
+    async with AsyncZiniaoClient(socket_port) as client:
+        browser_list = await client.get_browser_list()
+        stores = await client.open_stores(browser_list[:100], concurrency=50)
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from logger import logger, log_context
+from config import ZINIAO_CONFIG
+from ip_check import verify_store_ip
+from shutdown import get_session_registry
+from store_directory import as_store_directory
+from ziniao_client import (
+    CONNECT_TIMEOUT, ACTION_TIMEOUTS, DEFAULT_TIMEOUT, LatencyStats,
+    build_payload, build_start_browser_payload, build_stop_browser_payload, check_result,
+)
+
+
+class AsyncZiniaoClient:
+    """紫鸟客户端通讯对象（asyncio）"""
+
+    def __init__(self, port=None, host: str = '127.0.0.1', pool_size: int = 100, timeouts: dict = None,
+                 executor_workers: int = 32, throttle=None):
+        """
+        :param port: 客户端的socket端口，默认取配置；只连接一个客户端，不支持多个客户端实例（ClientPool）
+        :param host: 客户端地址
+        :param pool_size: HTTP连接池大小
+        :param timeouts: 覆盖默认的 action -> 超时秒数
+        :param executor_workers: 执行Selenium阻塞调用的线程数上限
+        :param throttle: 限流，同 ZiniaoClient（见 runner.ProcessThrottle）
+        """
+        if port is None:
+            if ZINIAO_CONFIG['socket_ports'] or ZINIAO_CONFIG['accounts_file']:
+                raise ValueError("AsyncZiniaoClient 只支持单个客户端，配置了 ZINIAO_SOCKET_PORTS 或 ZINIAO_ACCOUNTS_FILE 时"
+                                 "请使用同步版本（ClientPool），或传入 port 指定客户端")
+            port = ZINIAO_CONFIG['socket_port']
+        self.url = 'http://{}:{}'.format(host, port)
+        self.timeouts = dict(ACTION_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.pool_size = pool_size
+        self.throttle = throttle
+        self.latency = LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='ziniao-selenium')
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers={'Content-Type': 'application/json'})
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._executor.shutdown(wait=False)
+
+    async def send(self, data: dict, timeout=None):
+        """
+        发送一次请求
+        :param data: 请求体，必须包含action
+        :param timeout: 本次请求的读取超时，不传则按action取默认值
+        :return: 返回的json字典，失败返回None
+        """
+        action = data.get('action', '')
+        if timeout is None:
+            timeout = self.timeouts.get(action, DEFAULT_TIMEOUT)
+        client_timeout = aiohttp.ClientTimeout(total=CONNECT_TIMEOUT + timeout, sock_connect=CONNECT_TIMEOUT)
+        body = json.dumps(data).encode('utf-8')
+        throttled = None
+        if self.throttle is not None:
+            # 限流的等待是阻塞的，在线程池中进入
+            throttled = self.throttle(action)
+            await self.run_blocking(throttled.__enter__)
+        start = time.perf_counter()
+        try:
+            async with self._get_session().post(self.url, data=body, timeout=client_timeout) as response:
+                result = json.loads(await response.read())
+        except Exception as err:
+            self.latency.record(action, time.perf_counter() - start, False)
+            logger.error(f"{action} 请求异常: {err!r}")
+            return None
+        finally:
+            if throttled is not None:
+                throttled.__exit__(None, None, None)
+        self.latency.record(action, time.perf_counter() - start, True)
+        return result
+
+    def stats(self) -> dict:
+        """各action的请求耗时统计"""
+        return self.latency.snapshot()
+
+    async def start_browser(self, store_info, isWebDriverReadOnlyMode=0, isprivacy=0, isHeadless=0,
+                            cookieTypeSave=0, jsInfo="", store_name: str = None):
+        from ziniao_func import _register_started_store
+
+        data = build_start_browser_payload(store_info, isWebDriverReadOnlyMode, isprivacy, isHeadless,
+                                           cookieTypeSave, jsInfo)
+        r = check_result("startBrowser", await self.send(data))
+        if str(r.get("statusCode")) == "0":
+            _register_started_store(r, store_info, store_name)
+        return r
+
+    async def stop_browser(self, browser_oauth):
+        r = check_result("stopBrowser", await self.send(build_stop_browser_payload(browser_oauth)))
+        get_session_registry().unregister(browser_oauth)
+        return r
+
+    async def get_browser_list(self) -> list:
+        r = check_result("getBrowserList", await self.send(build_payload("getBrowserList")))
+        if str(r.get("statusCode")) == "0":
+            return r.get("browserList") or []
+        return []
+
+    async def update_core(self, timeout: float = 1800):
+        """
+        下载所有内核，循环调用直到返回成功，重试间隔从0.2秒指数增长到2秒
+        :param timeout: 最长等待秒数
+        :return: 是否更新完成
+        """
+        from ziniao_func import _update_core_done
+
+        data = build_payload("updateCore")
+        deadline = time.monotonic() + timeout
+        interval = 0.2
+        while True:
+            if _update_core_done(await self.send(data)):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(f"更新内核超时（{timeout}秒）")
+                return False
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 2, 2)
+
+    async def exit(self):
+        await self.send(build_payload("exit"))
+
+    async def run_blocking(self, func, *args):
+        """在有上限的线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        # 带上当前协程的日志上下文
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args))
+
+    async def wait_until(self, func, timeout: float = 30, interval: float = 0.2):
+        """
+        轮询 func 直到返回真值
+        :param func: 阻塞的判断函数，在线程池中执行
+        :param timeout: 超时（秒）
+        :param interval: 轮询间隔（秒）
+        :return: 是否在超时前满足
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if await self.run_blocking(func):
+                    return True
+            except Exception:
+                pass
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+    async def wait_ready(self, driver, timeout: float = 30) -> bool:
+        """等待页面 document.readyState 为 complete"""
+        return await self.wait_until(
+            lambda: driver.execute_script('return document.readyState') == 'complete', timeout)
+
+    async def verify_ip(self, driver, store_id, ret_json, is_headless: bool) -> bool:
+        """
+        ip检测，在线程池中执行 ip_check.verify_store_ip（缓存 -> 页面内fetch -> 完整检测页），
+        与同步版本共用检测缓存，同一个ip的检测合并
+        :return: 是否通过
+        """
+        from ziniao_func import _custom_check_ip, _open_ip_check
+
+        expected_ip = ret_json.get("ip")
+        if is_headless:
+            full_check = functools.partial(_custom_check_ip, driver, expected_ip)
+        else:
+            ip_check_url = ret_json.get("ipDetectionPage")
+            if not ip_check_url:
+                logger.warning("ip检测页地址为空，请升级紫鸟浏览器到最新版")
+                return False
+            full_check = functools.partial(_open_ip_check, driver, ip_check_url)
+        return await self.run_blocking(verify_store_ip, driver, store_id, expected_ip, full_check)
+
+    async def open_launcher_page(self, driver, launcher_page, timeout: float = 30):
+        await self.run_blocking(driver.get, launcher_page)
+        if not await self.wait_ready(driver, timeout):
+            logger.warning("等待页面加载超时")
+
+    async def close_store(self, store_id, driver=None):
+        """关闭店铺并退出driver"""
+        await self.stop_browser(store_id)
+        if driver is not None:
+            try:
+                await self.run_blocking(driver.quit)
+            except Exception as e:
+                logger.warning(f"driver退出异常: {e}")
+
+    async def open_store(self, browser, is_headless: bool = False):
+        """
+        打开一个店铺，流程与 ziniao_func._use_one_browser_run_task 一致
+        :param browser: 店铺信息（getBrowserList 返回的一项）
+        :param is_headless: 是否无头模式
+        :return: StoreInfo 或 None
+        """
+        from ziniao_func import _get_driver, _started_store_id, _build_store_info
+
+        store_id = browser.get('browserOauth')
+        store_name = browser.get("browserName")
+        with log_context(store=store_name, store_id=store_id):
+            logger.info(f"=====打开店铺：{store_name}=====")
+            ret_json = await self.start_browser(store_id, isHeadless=1 if is_headless else 0, store_name=store_name)
+            code = str(ret_json.get("statusCode"))
+            if code != "0":
+                logger.error(f"打开店铺失败，statusCode={code}")
+                return None
+            store_id = _started_store_id(ret_json)
+            driver = await self.run_blocking(_get_driver, ret_json, is_headless, False, store_name)
+            get_session_registry().attach(store_id, driver=driver)
+            if driver is None:
+                logger.info(f"=====关闭店铺：{store_name}=====")
+                await self.stop_browser(store_id)
+                return None
+            try:
+                if not await self.wait_ready(driver):
+                    logger.warning("等待店铺打开超时")
+                ip_usable = await self.verify_ip(driver, store_id, ret_json, is_headless)
+                if not ip_usable:
+                    logger.warning("ip检测不通过，请检查")
+                    await self.close_store(store_id, driver)
+                    return None
+                logger.info("ip检测通过，打开店铺平台主页")
+                await self.open_launcher_page(driver, ret_json.get("launcherPage"))
+                logger.info(f"店铺{store_name}打开成功")
+                return _build_store_info(ret_json, store_id, store_name, driver=driver)
+            except Exception:
+                logger.error("脚本运行异常:" + traceback.format_exc())
+                await self.close_store(store_id, driver)
+                return None
+
+    async def open_stores(self, browsers: list, is_headless: bool = False, concurrency: int = 50) -> list:
+        """
+        并发打开多个店铺
+        :param browsers: 店铺信息列表
+        :param is_headless: 是否无头模式
+        :param concurrency: 同时打开的店铺数上限
+        :return: 打开成功的 StoreInfo 列表
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def open_one(browser):
+            async with semaphore:
+                try:
+                    return await self.open_store(browser, is_headless)
+                except Exception as e:
+                    logger.error(f"打开店铺 {browser.get('browserName')} 失败: {e}")
+                    return None
+
+        results = await asyncio.gather(*(open_one(browser) for browser in browsers))
+        return [result for result in results if result]
+
+
+async def open_stores_by_names_async(store_names: list, browser_list=None, is_headless: bool = False,
+                                     concurrency: int = 50, client: AsyncZiniaoClient = None) -> list:
+    """
+    open_stores_by_names 的asyncio版本
+    :param store_names: 店铺名称列表
+    :param browser_list: 已获取的店铺列表或 StoreDirectory，不传则初始化客户端并获取
+    :param is_headless: 是否无头模式
+    :param concurrency: 同时打开的店铺数上限
+    :param client: 复用已有的 AsyncZiniaoClient，不传则临时创建（打开的driver不受影响）
+    :return: [{"driver":..., "store_id":..., "store_name":...}, ...]
+    """
+    from ziniao_func import _init_process
+
+    own_client = client is None
+    if own_client:
+        client = AsyncZiniaoClient()
+    try:
+        if browser_list is None:
+            await asyncio.get_running_loop().run_in_executor(None, _init_process)
+            logger.info("=====获取店铺列表=====")
+            browser_list = await client.get_browser_list()
+        if not browser_list:
+            logger.warning("browser list is empty")
+            return []
+        selected_browsers, missing = as_store_directory(browser_list).find(store_names)
+        if missing:
+            logger.warning(f"店铺不存在：{missing}")
+        return await client.open_stores(selected_browsers, is_headless, concurrency)
+    finally:
+        if own_client:
+            await client.close()
@@ -0,0 +1,257 @@
+"""
+批量打开店铺
+- 并发数按 startBrowser 的耗时和返回码自适应调整（AIMD：成功时加性增加，失败或变慢时乘性减少）
+- 店铺按优先级排队
+- 临时性失败按带抖动的指数退避重试
+- 每个店铺有截止时间（startBrowser、连接店铺和各阶段的等待都不超过截止时间）
+- 每个店铺打开完成就立即返回结果，不用等整批结束
+
+示例：
+
+    launcher = BatchLauncher(browser_list, max_concurrency=20)
+    for result in launcher.launch(["AMZ-1", ("AMZ-VIP", -1), "AMZ-2"]):
+        if result["status"] == "ok":
+            run_task(result["store_info"])
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from logger import logger, log_context
+from metrics import get_metrics, SummaryCollector
+from store_directory import get_store_directory, as_store_directory
+from typings import LaunchResult
+from ziniao_client import get_client
+from ziniao_func import _use_one_browser_run_task, close_store_info, DRIVER_MODE_SELENIUM
+
+# 可重试的 statusCode，-1 表示与客户端通讯失败或超时
+TRANSIENT_CODES = frozenset({"-1"})
+
+
+class AimdLimiter:
+    """AIMD并发控制：每次成功把上限增加 1/上限（约每轮+1），失败或耗时超标时上限乘以 decrease_factor"""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32, latency_target: float = 30,
+                 decrease_factor: float = 0.5, cooldown: float = 2):
+        """
+        :param initial: 初始并发数
+        :param min_limit: 最小并发数
+        :param max_limit: 最大并发数
+        :param latency_target: startBrowser 耗时超过该秒数视为客户端过载
+        :param decrease_factor: 减少时的乘数
+        :param cooldown: 两次减少之间的最小间隔（秒），避免同一批并发的失败把上限连续砍到底
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.on_overload()
+            return
+        with self._lock:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+
+    def on_overload(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+            logger.info(f"客户端响应变慢或出错，并发数降为 {int(self.limit)}")
+
+
+class _LaunchTask:
+    __slots__ = ('store_name', 'browser', 'priority', 'deadline', 'started', 'attempts', 'code')
+
+    def __init__(self, store_name, browser, priority, deadline):
+        self.store_name = store_name
+        self.browser = browser
+        self.priority = priority
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.attempts = 0
+        self.code = None
+
+
+class BatchLauncher:
+    """自适应并发的批量店铺启动器"""
+
+    def __init__(self, browser_list=None, is_headless: bool = False, driver_mode: str = DRIVER_MODE_SELENIUM,
+                 capture_network: bool = False, initial_concurrency: int = 4, min_concurrency: int = 1,
+                 max_concurrency: int = 32, latency_target: float = 30, max_attempts: int = 3,
+                 backoff_base: float = 2, backoff_max: float = 30, transient_codes=TRANSIENT_CODES,
+                 store_deadline: float = 300):
+        """
+        :param browser_list: 店铺列表或 StoreDirectory，默认使用默认店铺目录
+        :param is_headless: 是否无头模式
+        :param driver_mode: selenium / cdp
+        :param capture_network: 是否开启performance日志
+        :param initial_concurrency: 初始并发数
+        :param min_concurrency: 最小并发数
+        :param max_concurrency: 最大并发数
+        :param latency_target: startBrowser 耗时超过该秒数时降低并发
+        :param max_attempts: 每个店铺最多尝试 startBrowser 的次数
+        :param backoff_base: 重试退避的基数（秒），第n次重试最多等待 backoff_base * 2^(n-1)
+        :param backoff_max: 重试退避的上限（秒）
+        :param transient_codes: 可重试的 statusCode
+        :param store_deadline: 每个店铺从排队开始算起的截止时间（秒）
+        """
+        self._directory = get_store_directory() if browser_list is None else as_store_directory(browser_list)
+        self.is_headless = is_headless
+        self.driver_mode = driver_mode
+        self.capture_network = capture_network
+        self.max_concurrency = max_concurrency
+        self.limiter = AimdLimiter(initial_concurrency, min_concurrency, max_concurrency, latency_target)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transient_codes = frozenset(str(code) for code in transient_codes)
+        self.store_deadline = store_deadline
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def _result(task: _LaunchTask, status: str, store_info=None) -> LaunchResult:
+        return {
+            "store_name": task.store_name,
+            "status": status,
+            "store_info": store_info,
+            "code": task.code,
+            "attempts": task.attempts,
+            "elapsed": time.monotonic() - task.started,
+        }
+
+    def _attempt(self, task: _LaunchTask):
+        """
+        尝试打开一次
+        :return: ("done", LaunchResult) 或 ("retry", 延迟秒数)
+        """
+        with log_context(store=task.store_name, attempt=task.attempts + 1):
+            return self._attempt_once(task)
+
+    def _attempt_once(self, task: _LaunchTask):
+        if task.deadline <= time.monotonic():
+            return "done", self._result(task, "timeout")
+        task.attempts += 1
+        task.code = None
+
+        def on_start_browser(code, latency):
+            # 在连接店铺之前就调整并发，不用等整个打开流程结束
+            task.code = code
+            if code == "0":
+                self.limiter.on_success(latency)
+            elif code in self.transient_codes:
+                self.limiter.on_overload()
+
+        if task.attempts > 1:
+            logger.info(f"第{task.attempts}次尝试打开店铺 {task.store_name}")
+        # 与 open_store_by_name 相同的流程：优先重新连接店铺记录中的店铺，各阶段耗时和 store_open 指标
+        store_info = _use_one_browser_run_task(task.browser, self.is_headless, self.driver_mode,
+                                               self.capture_network, task.deadline, on_start_browser)
+        if store_info:
+            return "done", self._result(task, "ok", store_info)
+        if task.code in self.transient_codes and task.attempts < self.max_attempts:
+            delay = self._backoff(task.attempts)
+            if time.monotonic() + delay < task.deadline:
+                logger.warning(f"打开店铺 {task.store_name} 失败，statusCode={task.code}，{delay:.1f}秒后重试")
+                return "retry", delay
+        if time.monotonic() >= task.deadline:
+            return "done", self._result(task, "timeout")
+        return "done", self._result(task, "failed")
+
+    def launch(self, stores):
+        """
+        批量打开店铺，按完成顺序逐个返回结果
+        :param stores: 店铺名称，或 (店铺名称, 优先级) 的列表，优先级数值越小越先打开
+        :return: LaunchResult 生成器；提前停止迭代时，仍在打开中的店铺会在打开后被关闭
+        """
+        queue = []
+        delayed = []
+        seq = itertools.count()
+        now = time.monotonic()
+        for item in stores:
+            store_name, priority = (item, 0) if isinstance(item, str) else item
+            browser = self._directory.get_by_name(store_name)
+            task = _LaunchTask(store_name, browser, priority, now + self.store_deadline)
+            if browser is None:
+                logger.warning(f"店铺不存在：{store_name}")
+                yield self._result(task, "failed")
+                continue
+            heapq.heappush(queue, (priority, next(seq), task))
+
+        get_client().ensure_pool_size(self.max_concurrency)
+        collector = SummaryCollector()
+        get_metrics().add_hook(collector)
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='batch-launcher')
+        running = {}
+        try:
+            while queue or delayed or running:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    _, _, task = heapq.heappop(delayed)
+                    heapq.heappush(queue, (task.priority, next(seq), task))
+                while queue and self.limiter.try_acquire():
+                    _, _, task = heapq.heappop(queue)
+                    if task.deadline <= now:
+                        self.limiter.release()
+                        yield self._result(task, "timeout")
+                        continue
+                    running[executor.submit(self._attempt, task)] = task
+
+                wait_timeout = 0.5
+                if delayed:
+                    wait_timeout = min(wait_timeout, max(delayed[0][0] - now, 0))
+                if not running:
+                    time.sleep(wait_timeout)
+                    continue
+                done, _ = wait(running, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    self.limiter.release()
+                    try:
+                        outcome, value = future.result()
+                    except Exception as e:
+                        logger.error(f"打开店铺 {task.store_name} 异常: {e}")
+                        yield self._result(task, "failed")
+                        continue
+                    if outcome == "retry":
+                        heapq.heappush(delayed, (time.monotonic() + value, next(seq), task))
+                    else:
+                        yield value
+        finally:
+            if running:
+                logger.warning(f"批量打开被中断，关闭 {len(running)} 个正在打开的店铺")
+                for future in running:
+                    try:
+                        outcome, value = future.result()
+                        if outcome == "done" and value["store_info"]:
+                            close_store_info(value["store_info"])
+                    except Exception:
+                        pass
+            executor.shutdown(wait=False)
+            get_metrics().remove_hook(collector)
+            collector.report("批量打开 ")
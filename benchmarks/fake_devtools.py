@@ -0,0 +1,240 @@
+"""
+模拟店铺浏览器的 DevTools 端点（debuggingPort）
+只用标准库实现 /json/list、/json/version 和 WebSocket，覆盖店铺打开流程用到的CDP命令：
+Page.enable、Page.setLifecycleEventsEnabled、Page.navigate（随后推送 DOMContentLoaded/load 生命周期事件）、
+Runtime.evaluate、Network.*、Target.createTarget/closeTarget、SystemInfo.getProcessInfo、Performance.getMetrics，其余命令返回空结果
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有5，并发连接多时会丢SYN，客户端要等1秒重传
+    request_queue_size = 1024
+    daemon_threads = True
+
+def _recv_exact(sock, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        data += chunk
+    return data
+
+
+def read_frame(sock):
+    """读取一个WebSocket帧，返回 (opcode, payload)"""
+    head = _recv_exact(sock, 2)
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if masked else None
+    payload = _recv_exact(sock, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def build_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    """服务端发出的帧不加掩码"""
+    head = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        head += bytes([length])
+    elif length < 1 << 16:
+        head += bytes([126]) + struct.pack('>H', length)
+    else:
+        head += bytes([127]) + struct.pack('>Q', length)
+    return head + payload
+
+
+class _DevToolsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.devtools
+        if self.headers.get('Upgrade', '').lower() == 'websocket':
+            self._serve_websocket(server)
+        elif self.path.startswith('/json/version'):
+            self._send_json({
+                "Browser": "Chrome/120.0.0.0",
+                "webSocketDebuggerUrl": f"ws://127.0.0.1:{server.port}/devtools/browser/fake",
+            })
+        elif self.path.startswith('/json'):
+            self._send_json([{
+                "id": "FAKE-PAGE",
+                "type": "page",
+                "url": "about:blank",
+                "webSocketDebuggerUrl": f"ws://127.0.0.1:{server.port}/devtools/page/FAKE-PAGE",
+            }])
+        else:
+            self.send_error(404)
+
+    def _serve_websocket(self, server):
+        key = self.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        sock = self.connection
+        send_lock = threading.Lock()
+
+        def send(message):
+            frame = build_frame(json.dumps(message).encode('utf-8'))
+            with send_lock:
+                sock.sendall(frame)
+
+        server.count("connections", 1)
+        try:
+            while True:
+                opcode, payload = read_frame(sock)
+                if opcode == 0x8:
+                    with send_lock:
+                        sock.sendall(build_frame(payload[:2], 0x8))
+                    return
+                if opcode == 0x9:
+                    with send_lock:
+                        sock.sendall(build_frame(payload, 0xA))
+                    continue
+                if opcode != 0x1:
+                    continue
+                server.handle_command(json.loads(payload), send)
+        except (ConnectionError, OSError, ValueError):
+            return
+        finally:
+            server.count("connections", -1)
+
+
+class FakeDevTools:
+    """
+    模拟的 DevTools 端点，所有店铺共用一个端口
+
+        devtools = FakeDevTools(command_latency=0.002, load_time=0.05).start()
+        ...
+        devtools.stop()
+    """
+
+    def __init__(self, port: int = 0, command_latency: float = 0.0, load_time: float = 0.0,
+                 ip: str = "127.0.0.1"):
+        """
+        :param port: 监听端口，0表示随机分配
+        :param command_latency: 每个CDP命令的响应延迟（秒）
+        :param load_time: Page.navigate 之后到 load 事件的时间（秒），DOMContentLoaded 在一半时推送
+        :param ip: 无头模式ip检测页中显示的ip
+        """
+        self.command_latency = command_latency
+        self.load_time = load_time
+        self.ip = ip
+        self.connections = 0
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._loader_ids = iter(range(1, 1 << 62))
+        self._httpd = _Server(('127.0.0.1', port), _DevToolsHandler)
+        self._httpd.devtools = self
+        self.port = self._httpd.server_address[1]
+        self._thread = None
+
+    def count(self, name: str, value: int):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def handle_command(self, message: dict, send):
+        self.count("commands", 1)
+        if self.command_latency:
+            time.sleep(self.command_latency)
+        method = message.get("method")
+        params = message.get("params") or {}
+        result = {}
+        if method == "Page.navigate":
+            with self._lock:
+                loader_id = f"L{next(self._loader_ids)}"
+            result = {"frameId": "FAKE-FRAME", "loaderId": loader_id}
+            send({"id": message["id"], "result": result})
+            threading.Thread(target=self._push_lifecycle, args=(loader_id, send), daemon=True).start()
+            return
+        if method == "Runtime.evaluate":
+            result = {"result": {"type": "object", "value": self._evaluate(params.get("expression", ""))}}
+        elif method == "Network.getCookies":
+            result = {"cookies": []}
+        elif method == "Network.getResponseBody":
+            result = {"body": "", "base64Encoded": False}
+        elif method == "Target.createTarget":
+            with self._lock:
+                result = {"targetId": f"FAKE-TAB-{next(self._loader_ids)}"}
+        elif method == "Target.closeTarget":
+            result = {"success": True}
+        elif method == "SystemInfo.getProcessInfo":
+            # 用本进程代替浏览器进程，供看门狗采样
+            result = {"processInfo": [{"type": "browser", "id": os.getpid(), "cpuTime": time.process_time()}]}
+        elif method == "Performance.getMetrics":
+            result = {"metrics": [{"name": "JSHeapTotalSize", "value": 32 * 1024 * 1024}]}
+        send({"id": message["id"], "result": result})
+
+    def _evaluate(self, expression: str):
+        if expression == "document.readyState":
+            return "complete"
+        if expression.startswith("!!"):
+            return True
+        if "textContent" in expression or "fetch(" in expression:
+            return self.ip
+        return None
+
+    def _push_lifecycle(self, loader_id, send):
+        try:
+            for name in ("DOMContentLoaded", "load"):
+                if self.load_time:
+                    time.sleep(self.load_time / 2 * random.uniform(0.5, 1.5))
+                send({"method": "Page.lifecycleEvent",
+                      "params": {"frameId": "FAKE-FRAME", "loaderId": loader_id, "name": name,
+                                 "timestamp": time.time()}})
+        except OSError:
+            pass
+
+    def start(self) -> 'FakeDevTools':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-devtools', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
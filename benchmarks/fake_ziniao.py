@@ -0,0 +1,252 @@
+"""
+模拟紫鸟客户端的 HTTP 接口和 chromedriver 下载 CDN
+- FakeZiniaoServer：startBrowser/stopBrowser/getBrowserList/updateCore/exit，可注入延迟和错误
+- FakeDriverCdn：config.json（带ETag）和驱动文件，用于 DriverSync 的基准测试
+"""
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def make_browser_list(count: int, core_version: str = "120.0.6099.71") -> list:
+    """生成 count 个店铺"""
+    return [{
+        "browserName": f"BENCH-{i:05d}",
+        "browserOauth": f"oauth{i:05d}",
+        "browserId": str(100000 + i),
+        "coreVersion": core_version,
+    } for i in range(count)]
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有5，并发连接多时会丢SYN，客户端要等1秒重传
+    request_queue_size = 1024
+    daemon_threads = True
+
+class _NoDelayHandler(BaseHTTPRequestHandler):
+    """关闭Nagle算法，否则响应头和响应体分两次发送时会被延迟确认拖慢约40ms"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ZiniaoHandler(_NoDelayHandler):
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            data = {}
+        result = self.server.fake.handle(data)
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeZiniaoServer:
+    """
+    模拟的紫鸟客户端
+
+        server = FakeZiniaoServer(store_count=100, devtools_port=devtools.port,
+                                  latency={"startBrowser": (0.2, 0.5)}, error_rate=0.05).start()
+        set_client(ZiniaoClient(server.port))
+    """
+
+    def __init__(self, store_count: int = 10, devtools_port: int = 9222, port: int = 0, latency: dict = None,
+                 error_rate: float = 0.0, error_code: int = -1, core_version: str = "120.0.6099.71",
+                 seed: int = None):
+        """
+        :param store_count: getBrowserList 返回的店铺数量
+        :param devtools_port: startBrowser 返回的 debuggingPort
+        :param port: 监听端口，0表示随机分配
+        :param latency: action -> 秒数 或 (最小秒数, 最大秒数)
+        :param error_rate: startBrowser 返回 error_code 的概率
+        :param error_code: 注入的 statusCode
+        :param seed: 随机种子，便于重复同样的错误序列
+        """
+        self.browser_list = make_browser_list(store_count, core_version)
+        self.devtools_port = devtools_port
+        self.latency = latency or {}
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.core_version = core_version
+        self.requests = {}
+        self.open_stores = set()
+        self.max_open = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _Server(('127.0.0.1', port), _ZiniaoHandler)
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        self._thread = None
+
+    def _delay(self, action: str):
+        latency = self.latency.get(action)
+        if not latency:
+            return
+        if isinstance(latency, (tuple, list)):
+            with self._lock:
+                latency = self._random.uniform(*latency)
+        time.sleep(latency)
+
+    def handle(self, data: dict) -> dict:
+        action = data.get("action")
+        with self._lock:
+            self.requests[action] = self.requests.get(action, 0) + 1
+        self._delay(action)
+        if action == "getBrowserList":
+            return {"statusCode": 0, "browserList": self.browser_list}
+        if action == "startBrowser":
+            with self._lock:
+                failed = self._random.random() < self.error_rate
+            if failed:
+                return {"statusCode": self.error_code, "err": "injected error"}
+            store_id = data.get("browserOauth") or data.get("browserId")
+            with self._lock:
+                self.open_stores.add(store_id)
+                self.max_open = max(self.max_open, len(self.open_stores))
+            return {
+                "statusCode": 0,
+                "browserOauth": store_id,
+                "debuggingPort": self.devtools_port,
+                "core_type": "Chromium",
+                "core_version": self.core_version,
+                "ip": "127.0.0.1",
+                "ipDetectionPage": f"http://127.0.0.1:{self.port}/ip",
+                "launcherPage": f"http://127.0.0.1:{self.port}/launcher",
+            }
+        if action == "stopBrowser":
+            with self._lock:
+                self.open_stores.discard(data.get("browserOauth"))
+            return {"statusCode": 0}
+        if action in ("updateCore", "exit"):
+            return {"statusCode": 0}
+        return {"statusCode": -10003, "err": f"unknown action {action}"}
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = {}
+            self.max_open = len(self.open_stores)
+
+    def start(self) -> 'FakeZiniaoServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-ziniao', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class _CdnHandler(_NoDelayHandler):
+
+    def do_GET(self):
+        cdn = self.server.cdn
+        with cdn.lock:
+            cdn.requests += 1
+        name = self.path.rsplit('/', 1)[-1]
+        if name == "config.json":
+            if self.headers.get('If-None-Match') == cdn.etag:
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self._send(cdn.config, extra={"ETag": cdn.etag})
+            return
+        content = cdn.files.get(name)
+        if content is None:
+            self.send_error(404)
+            return
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start = int(range_header[len('bytes='):].split('-')[0] or 0)
+        with cdn.lock:
+            cdn.bytes_sent += len(content) - start
+        if start:
+            self._send(content[start:], status=206,
+                       extra={"Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"})
+        else:
+            self._send(content)
+
+    def _send(self, body: bytes, status: int = 200, extra: dict = None):
+        self.send_response(status)
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeDriverCdn:
+    """
+    模拟的chromedriver下载服务器
+
+        cdn = FakeDriverCdn(majors=range(100, 120), size=2 * 1024 * 1024).start()
+        DriverSync(folder, config_url=cdn.config_url).sync()
+    """
+
+    def __init__(self, majors=range(100, 110), size: int = 1024 * 1024, port: int = 0):
+        """
+        :param majors: 提供的Chromium主版本
+        :param size: 每个驱动文件的字节数
+        """
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.files = {}
+        self._httpd = _Server(('127.0.0.1', port), _CdnHandler)
+        self._httpd.cdn = self
+        self.port = self._httpd.server_address[1]
+        items = []
+        for major in majors:
+            name = f"chromedriver{major}"
+            content = os.urandom(size)
+            self.files[name] = content
+            items.append({
+                "name": name,
+                "url": f"http://127.0.0.1:{self.port}/{name}",
+                "sha1": hashlib.sha1(content).hexdigest(),
+            })
+        self.config = json.dumps(items).encode('utf-8')
+        self.etag = '"%s"' % hashlib.sha1(self.config).hexdigest()
+        self._thread = None
+
+    @property
+    def config_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/config.json"
+
+    def start(self) -> 'FakeDriverCdn':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-cdn', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
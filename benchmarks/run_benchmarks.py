@@ -0,0 +1,319 @@
+"""
+离线基准测试
+不需要安装紫鸟客户端：用 FakeZiniaoServer 模拟客户端接口，用 FakeDevTools 模拟店铺浏览器的 debuggingPort，
+店铺按 CDP 模式打开（不需要chromedriver），结果写成JSON文件，便于在不同提交之间对比
+
+    python benchmarks/run_benchmarks.py                       # 全部
+    python benchmarks/run_benchmarks.py --only throughput --sizes 10 100
+    python benchmarks/run_benchmarks.py --start-latency 0.2 0.5 --error-rate 0.05
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_devtools import FakeDevTools
+from fake_ziniao import FakeZiniaoServer, FakeDriverCdn, make_browser_list
+
+from logger import logger
+from config import configure
+from driver_sync import DriverSync
+from metrics import get_metrics, summarize
+from store_directory import StoreDirectory
+from ziniao_client import ZiniaoClient, set_client, get_client
+from ziniao_func import (
+    DRIVER_MODE_CDP, _use_one_browser_run_task, _get_browser_list, close_store_info, open_stores_by_names,
+)
+
+BENCHMARKS = ("import_time", "open_latency", "throughput", "directory", "driver_sync")
+
+# 在新进程中导入 ziniao_func，输出耗时和副作用
+IMPORT_PROBE = """
+import json, logging, os, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import ziniao_func
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "logs_created": os.path.exists("logs"),
+    "root_handlers": len(logging.getLogger().handlers),
+    "heavy_modules": [m for m in ("selenium", "requests", "dotenv", "websocket", "aiohttp",
+                                                    "concurrent.futures") if m in sys.modules],
+}))
+"""
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class FakeEnvironment:
+    """一个模拟客户端 + 一个模拟浏览器，并把默认的 ZiniaoClient 指向模拟客户端"""
+
+    def __init__(self, store_count: int, args):
+        self.devtools = FakeDevTools(command_latency=args.cdp_latency, load_time=args.load_time).start()
+        latency = {}
+        if args.start_latency:
+            latency["startBrowser"] = tuple(args.start_latency)
+        self.server = FakeZiniaoServer(store_count, self.devtools.port, latency=latency,
+                                       error_rate=args.error_rate, seed=args.seed).start()
+        set_client(ZiniaoClient(self.server.port))
+
+    def close(self):
+        self.server.stop()
+        self.devtools.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def bench_import_time(args) -> dict:
+    """import ziniao_func 的耗时（新进程、冷启动），以及是否有创建日志目录、加载重依赖等副作用"""
+    durations, process_durations = [], []
+    probe = None
+    for _ in range(args.import_runs):
+        with tempfile.TemporaryDirectory() as cwd:
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', IMPORT_PROBE % ROOT_DIR], cwd=cwd, capture_output=True,
+                                    text=True, check=True).stdout
+            process_durations.append(time.perf_counter() - start)
+        probe = json.loads(output.strip().splitlines()[-1])
+        durations.append(probe.pop("elapsed"))
+    return {
+        "runs": args.import_runs,
+        "import": summarize(durations),
+        "process": summarize(process_durations),
+        **probe,
+    }
+
+
+def bench_open_latency(args) -> dict:
+    """单个店铺依次打开/关闭，统计各阶段耗时"""
+    with FakeEnvironment(1, args) as env:
+        browser = env.server.browser_list[0]
+        with get_metrics().collect() as collector:
+            ok = 0
+            for _ in range(args.iterations):
+                store_info = _use_one_browser_run_task(browser, driver_mode=DRIVER_MODE_CDP)
+                if store_info:
+                    ok += 1
+                    close_store_info(store_info)
+        return {
+            "iterations": args.iterations,
+            "ok": ok,
+            "phases": collector.summary(),
+            "client": get_client().stats(),
+        }
+
+
+def bench_throughput(args) -> dict:
+    """open_stores_by_names 在不同店铺数量下的吞吐"""
+    results = {}
+    for size in args.sizes:
+        with FakeEnvironment(size, args) as env:
+            browser_list = env.server.browser_list
+            names = [browser["browserName"] for browser in browser_list]
+            get_client().reset_stats()
+            with get_metrics().collect() as collector:
+                start = time.perf_counter()
+                opened = open_stores_by_names(names, browser_list, max_threads=args.threads,
+                                              driver_mode=DRIVER_MODE_CDP)
+                elapsed = time.perf_counter() - start
+            for store_info in opened:
+                close_store_info(store_info)
+            results[str(size)] = {
+                "stores": size,
+                "threads": args.threads,
+                "ok": len(opened),
+                "elapsed": elapsed,
+                "stores_per_second": len(opened) / elapsed if elapsed else 0.0,
+                "max_open": env.server.max_open,
+                "total": collector.summary().get("store_open.total"),
+                "client": get_client().stats(),
+            }
+        logger.warning(f"throughput {size}: {results[str(size)]['stores_per_second']:.1f} 店铺/秒")
+    return results
+
+
+def _time_calls(func, items) -> dict:
+    durations = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        durations.append(time.perf_counter() - start)
+    stat = summarize(durations)
+    stat["total"] = sum(durations)
+    return stat
+
+
+def bench_directory(args) -> dict:
+    """大店铺列表下的查找耗时，与逐个遍历比对（原实现）对比"""
+    results = {}
+    rng = random.Random(args.seed)
+    for size in args.directory_sizes:
+        browser_list = make_browser_list(size)
+        names = [rng.choice(browser_list)["browserName"] for _ in range(args.lookups)]
+        build_start = time.perf_counter()
+        directory = StoreDirectory.from_list(browser_list)
+        build = time.perf_counter() - build_start
+
+        def linear(name):
+            for browser in browser_list:
+                if browser.get("browserName") == name:
+                    return browser
+
+        linear_names = names[:max(1, args.lookups // 10)]
+        batch_start = time.perf_counter()
+        directory.find(names)
+        batch = time.perf_counter() - batch_start
+        with FakeEnvironment(size, args):
+            fetched = StoreDirectory(fetch=_get_browser_list)
+            refresh_start = time.perf_counter()
+            fetched.refresh()
+            refresh = time.perf_counter() - refresh_start
+        results[str(size)] = {
+            "stores": size,
+            "build_index": build,
+            "get_by_name": _time_calls(directory.get_by_name, names),
+            "get_by_name_lower": _time_calls(directory.get_by_name, [name.lower() for name in names]),
+            "linear_scan": _time_calls(linear, linear_names),
+            "find_batch": {"count": len(names), "total": batch},
+            "refresh_from_client": refresh,
+        }
+    return results
+
+
+def bench_driver_sync(args) -> dict:
+    """DriverSync 冷启动（全部下载）和热启动（清单命中+304）的耗时"""
+    results = {}
+    majors = list(range(100, 100 + args.driver_count))
+    with FakeDriverCdn(majors, size=args.driver_size) as cdn:
+        for workers in args.driver_workers:
+            with tempfile.TemporaryDirectory() as folder:
+                sync = DriverSync(folder, config_url=cdn.config_url, workers=workers)
+                start = time.perf_counter()
+                cold = sync.sync()
+                cold_elapsed = time.perf_counter() - start
+                start = time.perf_counter()
+                warm = DriverSync(folder, config_url=cdn.config_url, workers=workers).sync()
+                warm_elapsed = time.perf_counter() - start
+                single_start = time.perf_counter()
+                os.remove(os.path.join(folder, os.path.basename(sync.ensure(majors[0]))))
+                sync.ensure(majors[0])
+                single = time.perf_counter() - single_start
+            results[str(workers)] = {
+                "workers": workers,
+                "drivers": args.driver_count,
+                "driver_bytes": args.driver_size,
+                "cold": cold_elapsed,
+                "cold_downloaded": len(cold["downloaded"]),
+                "warm": warm_elapsed,
+                "warm_ok": len(warm["ok"]),
+                "ensure_missing_one": single,
+            }
+    return results
+
+
+def _flatten(data, prefix='') -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    """对比两个结果文件中共同的数值指标"""
+    with open(old_path, encoding='utf-8') as f:
+        old = _flatten(json.load(f)["results"])
+    with open(new_path, encoding='utf-8') as f:
+        new = _flatten(json.load(f)["results"])
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<70} {before:>14.6f} {after:>14.6f} {change:>+8.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="紫鸟店铺打开流程的离线基准测试")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="只运行这些基准")
+    parser.add_argument('--output', help="结果文件路径，默认 benchmarks/results/<时间>-<提交>.json")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="对比两个结果文件")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="输出INFO日志")
+    group = parser.add_argument_group("模拟环境")
+    group.add_argument('--start-latency', nargs=2, type=float, metavar=('MIN', 'MAX'),
+                       help="startBrowser 的延迟范围（秒）")
+    group.add_argument('--error-rate', type=float, default=0.0, help="startBrowser 返回错误的概率")
+    group.add_argument('--cdp-latency', type=float, default=0.0, help="每个CDP命令的延迟（秒）")
+    group.add_argument('--load-time', type=float, default=0.0, help="页面加载耗时（秒）")
+    group = parser.add_argument_group("基准参数")
+    group.add_argument('--import-runs', type=int, default=10, help="import_time 的重复次数")
+    group.add_argument('--iterations', type=int, default=20, help="open_latency 的打开次数")
+    group.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 500], help="throughput 的店铺数量")
+    group.add_argument('--threads', type=int, default=20, help="throughput 的并发线程数")
+    group.add_argument('--directory-sizes', nargs='+', type=int, default=[1000, 10000, 50000])
+    group.add_argument('--lookups', type=int, default=10000, help="directory 的查找次数")
+    group.add_argument('--driver-count', type=int, default=8)
+    group.add_argument('--driver-size', type=int, default=4 * 1024 * 1024, help="每个驱动文件的字节数")
+    group.add_argument('--driver-workers', nargs='+', type=int, default=[1, 4])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    configure(log_level=logging.INFO if args.verbose else logging.WARNING)
+    selected = args.only or BENCHMARKS
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {key: value for key, value in vars(args).items() if key not in ('compare', 'output')},
+        "results": {},
+    }
+    for name in selected:
+        logger.warning(f"=====基准：{name}=====")
+        start = time.perf_counter()
+        report["results"][name] = globals()[f"bench_{name}"](args)
+        logger.warning(f"{name} 完成，耗时 {time.perf_counter() - start:.1f}s")
+
+    output = args.output
+    if not output:
+        folder = os.path.join(BENCH_DIR, 'results')
+        os.makedirs(folder, exist_ok=True)
+        output = os.path.join(folder, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
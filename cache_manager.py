@@ -0,0 +1,255 @@
+"""
+店铺浏览器缓存管理
+_delete_all_cache 只能整个删除 SuperBrowser 缓存目录：有店铺在运行时会失败，所有店铺下次打开都要重新加载。
+CacheManager 按店铺管理缓存目录：
+- 用 os.scandir 统计每个店铺缓存目录的大小，记住每个子目录的修改时间，再次统计时只重新扫描有变化的目录
+- 总大小超过预算时，按最近使用时间从旧到新删除店铺缓存，直到满足预算
+- 跳过本进程正在打开的店铺，以及最近一段时间内有写入的目录（可能被其他进程打开），
+  删除前会重新读取目录下所有文件的修改时间（浏览器原地改写文件不会改变目录的修改时间）
+- 可在后台线程定期执行
+
+示例：
+
+    manager = CacheManager(budget_bytes=50 * 1024 ** 3)        # 默认缓存目录，预算50GB
+    manager = CacheManager(cache_root("/data/ziniao-cache"))   # 客户端使用 --enforce-cache-path 时
+    manager.evict()
+    manager.start(interval=600)
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+
+from logger import logger
+from config import ZINIAO_CONFIG
+from shutdown import get_session_registry
+
+is_windows = sys.platform == 'win32'
+
+
+def cache_root(path: str = None) -> str:
+    """
+    店铺缓存根目录
+    :param path: 客户端参数 --enforce-cache-path 设置的路径，默认取配置 ZINIAO_CACHE_PATH，
+                 都为空时Windows下为 %LOCALAPPDATA%/SuperBrowser
+    :return: 目录路径，无法确定时返回None
+    """
+    path = path or ZINIAO_CONFIG['cache_path']
+    if path:
+        return os.path.join(path, 'SuperBrowser')
+    if is_windows and os.getenv('LOCALAPPDATA'):
+        return os.path.join(os.getenv('LOCALAPPDATA'), 'SuperBrowser')
+    return None
+
+
+class _DirStat:
+    """一个目录的扫描结果：该目录的修改时间、直接包含的文件大小和最新修改时间、子目录"""
+    __slots__ = ('mtime_ns', 'files_size', 'files_mtime', 'subdirs')
+
+    def __init__(self, mtime_ns, files_size, files_mtime, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files_size = files_size
+        self.files_mtime = files_mtime
+        self.subdirs = subdirs
+
+
+class CacheManager:
+    """按店铺统计和回收缓存目录"""
+
+    def __init__(self, root: str = None, budget_bytes: int = None, min_idle: float = 600, store_depth: int = 1,
+                 is_open=None):
+        """
+        :param root: 缓存根目录，默认 cache_root()
+        :param budget_bytes: 缓存总大小预算，默认取配置 ZINIAO_CACHE_BUDGET_MB
+        :param min_idle: 最近这么多秒内有写入的店铺缓存不删除
+        :param store_depth: 店铺缓存目录在根目录下的层级（1 表示根目录的直接子目录）
+        :param is_open: (目录名) -> bool，判断店铺是否正在打开，默认目录名与本进程打开的店铺id相同时认为正在打开
+        """
+        self.root = root or cache_root()
+        if budget_bytes is None and ZINIAO_CONFIG['cache_budget_mb']:
+            budget_bytes = int(float(ZINIAO_CONFIG['cache_budget_mb']) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self.min_idle = min_idle
+        self.store_depth = store_depth
+        self.is_open = is_open or self._is_open_in_registry
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _is_open_in_registry(name: str) -> bool:
+        return any(str(session["store_id"]) == name for session in get_session_registry().sessions())
+
+    @staticmethod
+    def _newest_mtime(path: str) -> float:
+        """不使用扫描缓存，重新读取目录下所有文件和目录的最新修改时间"""
+        try:
+            newest = os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return newest
+
+    def _store_dirs(self) -> list:
+        """根目录下 store_depth 层的目录"""
+        if not self.root or not os.path.isdir(self.root):
+            return []
+        level = [self.root]
+        for _ in range(self.store_depth):
+            next_level = []
+            for path in level:
+                try:
+                    with os.scandir(path) as it:
+                        next_level.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+                except OSError:
+                    continue
+            level = next_level
+        return level
+
+    def _scan_dir(self, path: str, seen: set) -> tuple[int, float]:
+        """
+        统计目录大小和最新修改时间，目录的修改时间没变时复用上次的结果（只递归子目录）
+        :return: (字节数, 最新修改时间)
+        """
+        seen.add(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0, 0.0
+        stat = self._dirs.get(path)
+        if stat is None or stat.mtime_ns != mtime_ns:
+            files_size = 0
+            files_mtime = mtime_ns / 1e9
+            subdirs = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            else:
+                                st = entry.stat(follow_symlinks=False)
+                                files_size += st.st_size
+                                files_mtime = max(files_mtime, st.st_mtime)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            stat = self._dirs[path] = _DirStat(mtime_ns, files_size, files_mtime, subdirs)
+        size, newest = stat.files_size, stat.files_mtime
+        for subdir in stat.subdirs:
+            sub_size, sub_newest = self._scan_dir(subdir, seen)
+            size += sub_size
+            newest = max(newest, sub_newest)
+        return size, newest
+
+    def scan(self, full: bool = False) -> list:
+        """
+        统计各店铺缓存
+        :param full: 忽略上次的结果全部重新扫描（文件原地改写不会改变目录的修改时间）
+        :return: [{"path", "name", "size", "last_used"}]，按最近使用时间从旧到新排序
+        """
+        with self._lock:
+            if full:
+                self._dirs.clear()
+            seen = set()
+            stores = []
+            for path in self._store_dirs():
+                size, last_used = self._scan_dir(path, seen)
+                stores.append({"path": path, "name": os.path.basename(path), "size": size, "last_used": last_used})
+            # 已删除的目录不再保留
+            for path in list(self._dirs):
+                if path not in seen:
+                    del self._dirs[path]
+        stores.sort(key=lambda store: store["last_used"])
+        return stores
+
+    def total_size(self) -> int:
+        return sum(store["size"] for store in self.scan())
+
+    def _remove(self, path: str) -> bool:
+        errors = []
+        if sys.version_info >= (3, 12):
+            shutil.rmtree(path, onexc=lambda func, p, exc: errors.append(p))
+        else:
+            shutil.rmtree(path, onerror=lambda func, p, exc: errors.append(p))
+        if errors:
+            logger.warning(f"缓存目录 {path} 有 {len(errors)} 个文件删除失败（可能正在使用）")
+        return not errors
+
+    def evict(self, budget_bytes: int = None, full: bool = False) -> dict:
+        """
+        按最近使用时间从旧到新删除店铺缓存，直到总大小不超过预算
+        :param budget_bytes: 预算，默认 self.budget_bytes
+        :param full: 是否全部重新扫描
+        :return: {"total": 删除前总大小, "freed": 释放的字节数, "evicted": [目录名], "skipped": [目录名]}
+        """
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        stores = self.scan(full)
+        total = sum(store["size"] for store in stores)
+        result = {"total": total, "freed": 0, "evicted": [], "skipped": []}
+        if budget is None or total <= budget:
+            return result
+        now = time.time()
+        for store in stores:
+            if total - result["freed"] <= budget:
+                break
+            if self.is_open(store["name"]) or now - store["last_used"] < self.min_idle:
+                result["skipped"].append(store["name"])
+                continue
+            # 扫描结果可能是旧的：其他进程打开的店铺原地改写文件时目录的修改时间不变
+            if time.time() - self._newest_mtime(store["path"]) < self.min_idle:
+                result["skipped"].append(store["name"])
+                continue
+            self._remove(store["path"])
+            remaining = 0
+            if os.path.exists(store["path"]):
+                with self._lock:
+                    remaining = self._scan_dir(store["path"], set())[0]
+            result["freed"] += store["size"] - remaining
+            result["evicted"].append(store["name"])
+        logger.info(f"店铺缓存 {total / 1024 ** 2:.0f}MB，预算 {budget / 1024 ** 2:.0f}MB，"
+                    f"删除 {len(result['evicted'])} 个店铺的缓存，释放 {result['freed'] / 1024 ** 2:.0f}MB，"
+                    f"跳过 {len(result['skipped'])} 个使用中的店铺")
+        return result
+
+    def _run(self, interval: float, full_every: int):
+        runs = 0
+        while not self._stop.wait(interval):
+            runs += 1
+            try:
+                self.evict(full=runs % full_every == 0)
+            except Exception as e:
+                logger.error(f"回收店铺缓存异常: {e}")
+
+    def start(self, interval: float = 600, full_every: int = 6) -> 'CacheManager':
+        """
+        在后台线程中每隔 interval 秒检查一次预算
+        :param full_every: 每隔几次全部重新扫描一次
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval, max(1, full_every)),
+                                            name='cache-manager', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,344 @@
+"""
+Chrome DevTools Protocol 客户端
+直接通过 WebSocket 连接店铺浏览器的 debuggingPort，不需要chromedriver，
+适合只需要打开页面、执行JS、读取cookie和网络响应的轻量任务
+
+示例：
+
+    cdp = CDPSession.connect(debugging_port)
+    cdp.navigate("https://www.amazon.com/")
+    title = cdp.evaluate("document.title")
+    cdp.close()
+"""
+import base64
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from logger import logger
+
+
+def _get_json(url: str, timeout: float):
+    import requests
+
+    return requests.get(url, timeout=timeout).json()
+
+
+class CDPError(Exception):
+    """CDP命令返回错误"""
+
+    def __init__(self, method, error):
+        self.method = method
+        self.error = error
+        super().__init__(f"{method}: {error.get('message')} ({error.get('code')})")
+
+
+class CDPEventWaiter:
+    """
+    事件等待器，创建后即开始缓存事件，避免在发送命令和开始等待之间漏掉事件
+    """
+
+    def __init__(self, session, event):
+        self._session = session
+        self.event = event
+        self._cond = threading.Condition()
+        self._events = deque()
+
+    def _push(self, params):
+        with self._cond:
+            self._events.append(params)
+            self._cond.notify_all()
+
+    def wait(self, predicate=None, timeout: float = 30):
+        """
+        等待满足条件的事件
+        :param predicate: (params) -> bool，为None时返回第一个事件
+        :return: 事件参数，超时返回None
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._events:
+                    params = self._events.popleft()
+                    if predicate is None or predicate(params):
+                        return params
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._session.closed:
+                    return None
+                self._cond.wait(remaining)
+
+    def cancel(self):
+        self._session._remove_waiter(self)
+
+
+class CDPSession:
+    """一个 target（页面或浏览器）的CDP会话，可在多个线程中使用"""
+
+    def __init__(self, ws_url: str, timeout: float = 30):
+        """
+        :param ws_url: webSocketDebuggerUrl
+        :param timeout: 命令默认超时（秒）
+        """
+        self.ws_url = ws_url
+        self.timeout = timeout
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # id -> [Event, message]
+        self._pending = {}
+        # event -> [callback]
+        self._listeners = {}
+        self._waiters = []
+        self._lifecycle_enabled = False
+        import websocket
+
+        self._ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True,
+                                               enable_multithread=True)
+        self._ws.settimeout(None)
+        self._reader = threading.Thread(target=self._read_loop, name='cdp-reader', daemon=True)
+        self._reader.start()
+
+    @staticmethod
+    def list_targets(port, host: str = '127.0.0.1', timeout: float = 5) -> list:
+        """/json/list 返回的target列表"""
+        return _get_json(f"http://{host}:{port}/json/list", timeout)
+
+    @classmethod
+    def connect(cls, port, host: str = '127.0.0.1', target_id: str = None, timeout: float = 30) -> 'CDPSession':
+        """
+        连接到浏览器的一个页面
+        :param port: debuggingPort
+        :param host: 浏览器地址
+        :param target_id: 指定页面的targetId，不传则使用第一个页面
+        """
+        targets = [t for t in cls.list_targets(port, host) if t.get("type") == "page"]
+        if target_id is not None:
+            targets = [t for t in targets if t.get("id") == target_id]
+        if not targets:
+            raise CDPError("connect", {"message": f"端口 {port} 上没有可用的页面"})
+        return cls(targets[0]["webSocketDebuggerUrl"], timeout)
+
+    @classmethod
+    def connect_browser(cls, port, host: str = '127.0.0.1', timeout: float = 30) -> 'CDPSession':
+        """连接到浏览器级别的target（用于 Target.*、SystemInfo.* 等命令）"""
+        version = _get_json(f"http://{host}:{port}/json/version", 5)
+        return cls(version["webSocketDebuggerUrl"], timeout)
+
+    def _read_loop(self):
+        while not self.closed:
+            try:
+                raw = self._ws.recv()
+            except Exception:
+                break
+            if not raw:
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if "id" in message:
+                with self._lock:
+                    pending = self._pending.pop(message["id"], None)
+                if pending is not None:
+                    pending[1] = message
+                    pending[0].set()
+            elif "method" in message:
+                self._dispatch(message["method"], message.get("params") or {})
+        self._on_closed()
+
+    def _dispatch(self, method, params):
+        with self._lock:
+            callbacks = list(self._listeners.get(method, ()))
+            waiters = [waiter for waiter in self._waiters if waiter.event == method]
+        for waiter in waiters:
+            waiter._push(params)
+        for callback in callbacks:
+            try:
+                callback(params)
+            except Exception as e:
+                logger.warning(f"CDP事件 {method} 回调异常: {e}")
+
+    def _on_closed(self):
+        self.closed = True
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            waiters = list(self._waiters)
+        for item in pending:
+            item[0].set()
+        for waiter in waiters:
+            with waiter._cond:
+                waiter._cond.notify_all()
+
+    def send(self, method: str, params: dict = None, timeout: float = None) -> dict:
+        """
+        发送CDP命令并等待结果
+        :return: result 字典
+        """
+        if self.closed:
+            raise CDPError(method, {"message": "CDP连接已关闭"})
+        message_id = next(self._ids)
+        pending = [threading.Event(), None]
+        with self._lock:
+            self._pending[message_id] = pending
+        payload = json.dumps({"id": message_id, "method": method, "params": params or {}})
+        try:
+            with self._send_lock:
+                self._ws.send(payload)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(message_id, None)
+            raise CDPError(method, {"message": str(e)})
+        if not pending[0].wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self._pending.pop(message_id, None)
+            raise CDPError(method, {"message": "timeout"})
+        message = pending[1]
+        if message is None:
+            raise CDPError(method, {"message": "CDP连接已关闭"})
+        if "error" in message:
+            raise CDPError(method, message["error"])
+        return message.get("result") or {}
+
+    def send_nowait(self, method: str, params: dict = None):
+        """发送CDP命令，不等待结果（可以在事件回调中调用）"""
+        if self.closed:
+            return
+        payload = json.dumps({"id": next(self._ids), "method": method, "params": params or {}})
+        try:
+            with self._send_lock:
+                self._ws.send(payload)
+        except Exception as e:
+            logger.warning(f"发送CDP命令 {method} 失败: {e}")
+
+    def on(self, event: str, callback):
+        """注册事件回调（在读取线程中执行，回调里不要调用 send，可以用 send_nowait）"""
+        with self._lock:
+            self._listeners.setdefault(event, []).append(callback)
+
+    def off(self, event: str, callback):
+        with self._lock:
+            callbacks = self._listeners.get(event) or []
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def expect(self, event: str) -> CDPEventWaiter:
+        """创建事件等待器，先创建再发送会触发事件的命令"""
+        waiter = CDPEventWaiter(self, event)
+        with self._lock:
+            self._waiters.append(waiter)
+        return waiter
+
+    def _remove_waiter(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _enable_lifecycle(self):
+        if not self._lifecycle_enabled:
+            self.send("Page.enable")
+            self.send("Page.setLifecycleEventsEnabled", {"enabled": True})
+            self._lifecycle_enabled = True
+
+    def navigate(self, url: str, wait_until: str = "load", timeout: float = 30) -> bool:
+        """
+        打开页面
+        :param url: 地址
+        :param wait_until: 等待的生命周期事件，load / DOMContentLoaded / networkIdle，为None时不等待
+        :param timeout: 超时（秒）
+        :return: 是否在超时前到达该生命周期
+        """
+        self._enable_lifecycle()
+        waiter = self.expect("Page.lifecycleEvent") if wait_until else None
+        try:
+            result = self.send("Page.navigate", {"url": url}, timeout)
+            if result.get("errorText"):
+                logger.warning(f"打开页面失败 {url}: {result['errorText']}")
+                return False
+            if waiter is None:
+                return True
+            loader_id = result.get("loaderId")
+            event = waiter.wait(
+                lambda p: p.get("name") == wait_until and (loader_id is None or p.get("loaderId") == loader_id),
+                timeout,
+            )
+            return event is not None
+        finally:
+            if waiter is not None:
+                waiter.cancel()
+
+    def wait_for_lifecycle(self, name: str = "load", timeout: float = 30) -> bool:
+        """
+        等待当前页面到达某个生命周期，已经到达时立即返回
+        :param name: load / DOMContentLoaded / networkIdle
+        """
+        self._enable_lifecycle()
+        waiter = self.expect("Page.lifecycleEvent")
+        try:
+            state = self.evaluate("document.readyState")
+            if name == "load" and state == "complete":
+                return True
+            if name == "DOMContentLoaded" and state in ("interactive", "complete"):
+                return True
+            return waiter.wait(lambda p: p.get("name") == name, timeout) is not None
+        finally:
+            waiter.cancel()
+
+    def evaluate(self, expression: str, await_promise: bool = False, timeout: float = None):
+        """
+        在页面中执行JS表达式
+        :return: 表达式的值（按值返回）
+        """
+        result = self.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": await_promise,
+        }, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            message = (details.get("exception") or {}).get("description") or details.get("text")
+            raise CDPError("Runtime.evaluate", {"message": message})
+        return result.get("result", {}).get("value")
+
+    def get_cookies(self, urls: list = None) -> list:
+        params = {"urls": urls} if urls else {}
+        return self.send("Network.getCookies", params).get("cookies", [])
+
+    def set_cookies(self, cookies: list):
+        self.send("Network.setCookies", {"cookies": cookies})
+
+    def clear_cookies(self):
+        self.send("Network.clearBrowserCookies")
+
+    def enable_network(self, **params):
+        self.send("Network.enable", params)
+
+    def get_response_body(self, request_id: str) -> str:
+        """读取网络响应内容（需先 enable_network）"""
+        result = self.send("Network.getResponseBody", {"requestId": request_id})
+        body = result.get("body", "")
+        if result.get("base64Encoded"):
+            return base64.b64decode(body).decode("utf-8", errors="replace")
+        return body
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        self._on_closed()
+
+    # 与 selenium driver 的退出方法保持一致，方便 close_store_and_quit_driver 统一处理
+    quit = close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,315 @@
+"""
+多个紫鸟客户端实例的负载均衡
+单个客户端进程串行处理 startBrowser，店铺很多时客户端本身就是瓶颈。
+可以在不同端口启动多个客户端（同一账号，或每个客户端登录不同账号），由 ClientPool 统一发送请求：
+- startBrowser 发给当前负载最低（进行中的 startBrowser + 已打开的店铺）的健康实例
+- 店铺打开后记住所在实例，stopBrowser 发回同一个实例
+- 多账号时 getBrowserList 合并各实例的店铺列表，并记住店铺属于哪个实例，startBrowser 只发给该实例
+- updateCore / exit 发给所有实例
+- 每个实例单独启动和检测健康（端口是否在监听），连续失败的实例暂停分配，过一段时间再检测
+
+ClientPool 与 ZiniaoClient 的用法一致，配置了 ZINIAO_SOCKET_PORTS 或 ZINIAO_ACCOUNTS_FILE 时 get_client() 自动返回 ClientPool：
+
+    set_client(ClientPool([ClientInstance(16851), ClientInstance(16852)]))
+    open_stores_by_names(store_names, browser_list)
+"""
+import json
+import threading
+import time
+
+from logger import logger
+from config import ZINIAO_CONFIG
+from readiness import is_port_open
+from ziniao_client import ZiniaoClient
+
+# 发给所有实例的 action
+BROADCAST_ACTIONS = frozenset({"getBrowserList", "updateCore", "exit"})
+
+
+class ClientInstance:
+    """一个客户端实例：端口 + 可选的独立账号"""
+
+    def __init__(self, port, user_info: dict = None, name: str = None, host: str = '127.0.0.1',
+                 pool_size: int = 10, timeouts: dict = None, throttle=None):
+        """
+        :param port: 客户端的socket端口
+        :param user_info: 该实例登录的账号 {"company", "username", "password"}，None表示使用配置中的账号
+        :param name: 实例名称，默认 "host:port"
+        """
+        self.port = port
+        self.host = host
+        self.user_info = user_info
+        self.name = name or f"{host}:{port}"
+        self.client = ZiniaoClient(port, host, pool_size, timeouts, throttle)
+        self.in_flight = 0
+        self.open_stores = set()
+        self.healthy = True
+        self.failures = 0
+        self.checked_at = 0.0
+
+    @property
+    def load(self) -> int:
+        return self.in_flight + len(self.open_stores)
+
+    def prepare(self, data: dict) -> dict:
+        """替换成本实例的账号信息"""
+        if self.user_info:
+            return {**data, **self.user_info}
+        return data
+
+    def check_health(self) -> bool:
+        self.healthy = is_port_open(self.port, self.host)
+        self.checked_at = time.monotonic()
+        if self.healthy:
+            self.failures = 0
+        return self.healthy
+
+    def __repr__(self):
+        return f"ClientInstance({self.name}, load={self.load}, healthy={self.healthy})"
+
+
+class ClientPool:
+    """多个客户端实例，接口与 ZiniaoClient 相同（send/timeouts/get_timeout/ensure_pool_size/stats/reset_stats/close）"""
+
+    def __init__(self, instances: list, health_interval: float = 10, max_failures: int = 3):
+        """
+        :param instances: ClientInstance 列表
+        :param health_interval: 不健康的实例隔多少秒重新检测
+        :param max_failures: 连续请求失败多少次后标记为不健康
+        """
+        if not instances:
+            raise ValueError("ClientPool 至少需要一个实例")
+        self.instances = list(instances)
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        # 已打开的店铺（browserOauth/browserId）-> (实例, 店铺key)
+        self._affinity = {}
+        # 多账号时店铺 -> 所属实例（来自 getBrowserList）
+        self._owner = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, pool_size: int = None, throttle=None) -> 'ClientPool':
+        """
+        按配置创建：ZINIAO_ACCOUNTS_FILE（每个实例的端口和账号）或 ZINIAO_SOCKET_PORTS（同一账号的多个端口）
+        :param throttle: 各实例共用的限流（见 ZiniaoClient）
+        """
+        pool_size = pool_size or int(ZINIAO_CONFIG['http_pool_size'])
+        accounts_file = ZINIAO_CONFIG['accounts_file']
+        if accounts_file:
+            with open(accounts_file, encoding='utf-8') as f:
+                accounts = json.load(f)
+            instances = []
+            for account in accounts:
+                account = dict(account)
+                port = account.pop("port")
+                name = account.pop("name", None)
+                instances.append(ClientInstance(port, account or None, name, pool_size=pool_size, throttle=throttle))
+        else:
+            ports = [port.strip() for port in ZINIAO_CONFIG['socket_ports'].split(',') if port.strip()]
+            instances = [ClientInstance(port, pool_size=pool_size, throttle=throttle)
+                         for port in ports or [ZINIAO_CONFIG['socket_port']]]
+        return cls(instances)
+
+    @property
+    def multi_account(self) -> bool:
+        return any(instance.user_info for instance in self.instances)
+
+    def _healthy_instances(self) -> list:
+        now = time.monotonic()
+        for instance in self.instances:
+            if not instance.healthy and now - instance.checked_at >= self.health_interval:
+                if instance.check_health():
+                    logger.info(f"客户端实例 {instance.name} 恢复")
+        return [instance for instance in self.instances if instance.healthy]
+
+    def check_health(self) -> dict:
+        """检测所有实例，返回 {实例名称: 是否健康}"""
+        return {instance.name: instance.check_health() for instance in self.instances}
+
+    def start_all(self, timeout: float = 60, skip_running: bool = False) -> dict:
+        """
+        在各自的端口上并行启动所有实例（_kill_process 之后调用）
+        :param skip_running: 端口已在监听的实例不再启动
+        :return: {实例名称: 端口是否就绪}
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from ziniao_func import _start_browser
+
+        def start(instance):
+            if skip_running and instance.check_health():
+                logger.info(f"客户端实例 {instance.name} 已在运行")
+                return True
+            ready = _start_browser(timeout, socket_port=instance.port)
+            instance.check_health()
+            return ready
+
+        with ThreadPoolExecutor(max_workers=len(self.instances)) as executor:
+            return dict(zip((instance.name for instance in self.instances),
+                            executor.map(start, self.instances)))
+
+    @staticmethod
+    def _store_keys(data: dict) -> list:
+        return [str(data[key]) for key in ("browserOauth", "browserId") if data.get(key) is not None]
+
+    def route(self, data: dict, reserve: bool = False) -> ClientInstance:
+        """
+        选择处理该请求的实例
+        :param reserve: 选中的同时把实例的进行中数量+1（与选择在同一把锁内，避免并发时都选中同一个实例）
+        """
+        keys = self._store_keys(data)
+        with self._lock:
+            for key in keys:
+                opened = self._affinity.get(key)
+                instance = opened[0] if opened is not None else self._owner.get(key)
+                if instance is not None:
+                    if reserve:
+                        instance.in_flight += 1
+                    return instance
+        candidates = self._healthy_instances()
+        if not candidates:
+            logger.warning("没有健康的客户端实例，尝试使用负载最低的实例")
+            candidates = self.instances
+        with self._lock:
+            instance = min(candidates, key=lambda instance: instance.load)
+            if reserve:
+                instance.in_flight += 1
+            return instance
+
+    def send(self, data: dict, timeout=None):
+        """
+        发送一次请求
+        :return: 返回的json字典，失败返回None
+        """
+        action = data.get('action', '')
+        if action in BROADCAST_ACTIONS:
+            return self._broadcast(data, timeout)
+        starting = action == "startBrowser"
+        if starting and self.multi_account and not self._owner:
+            # 还没有获取过店铺列表（例如 runner 的工作进程），先获取才知道店铺属于哪个账号的实例
+            from ziniao_client import build_payload
+
+            self._broadcast(build_payload("getBrowserList"))
+        instance = self.route(data, reserve=starting)
+        try:
+            result = self._send_to(instance, data, timeout)
+        finally:
+            if starting:
+                with self._lock:
+                    instance.in_flight -= 1
+        if result is None or str(result.get("statusCode")) != "0":
+            return result
+        keys = self._store_keys(data)
+        with self._lock:
+            if starting:
+                keys = list(dict.fromkeys(self._store_keys(result) + keys))
+                for key in keys:
+                    self._affinity[key] = (instance, keys[0])
+                instance.open_stores.add(keys[0])
+            elif action == "stopBrowser":
+                for key in keys:
+                    opened = self._affinity.get(key)
+                    if opened is not None:
+                        self._forget(*opened)
+        return result
+
+    def _forget(self, instance: ClientInstance, store_key: str):
+        """店铺关闭后删除它在实例上的记录（browserOauth 和 browserId 两个key）"""
+        instance.open_stores.discard(store_key)
+        for key in [key for key, opened in self._affinity.items() if opened == (instance, store_key)]:
+            del self._affinity[key]
+
+    def _send_to(self, instance: ClientInstance, data: dict, timeout=None):
+        result = instance.client.send(instance.prepare(data), timeout)
+        if result is None:
+            instance.failures += 1
+            if instance.failures >= self.max_failures and instance.healthy:
+                instance.check_health()
+                if not instance.healthy:
+                    logger.warning(f"客户端实例 {instance.name} 连续 {instance.failures} 次请求失败，暂停分配")
+        else:
+            instance.failures = 0
+        return result
+
+    def _broadcast(self, data: dict, timeout=None):
+        action = data.get('action')
+        if action == "getBrowserList" and not self.multi_account:
+            # 同一账号的店铺列表相同，问一个实例就够了
+            return self._send_to(self.route({}), data, timeout)
+        from concurrent.futures import ThreadPoolExecutor
+
+        instances = self.instances if action == "exit" else self._healthy_instances() or self.instances
+        with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+            results = list(executor.map(lambda instance: self._send_to(instance, data, timeout), instances))
+        if action == "getBrowserList":
+            return self._merge_browser_lists(instances, results)
+        # updateCore/exit：全部成功才算成功，否则返回第一个失败的结果
+        for instance, result in zip(instances, results):
+            if result is None or str(result.get("statusCode")) != "0":
+                if result is not None and len(instances) > 1:
+                    logger.info(f"客户端实例 {instance.name} 的 {action} 未完成")
+                return result
+        return results[0]
+
+    def _merge_browser_lists(self, instances: list, results: list):
+        browser_list = []
+        owner = {}
+        for instance, result in zip(instances, results):
+            if result is None or str(result.get("statusCode")) != "0":
+                logger.warning(f"客户端实例 {instance.name} 获取店铺列表失败")
+                continue
+            for browser in result.get("browserList") or []:
+                browser_list.append(browser)
+                for key in self._store_keys(browser):
+                    owner[key] = instance
+        if not owner and not browser_list:
+            return next((result for result in results if result is not None), None)
+        with self._lock:
+            self._owner = owner
+        return {"statusCode": 0, "browserList": browser_list}
+
+    @property
+    def timeouts(self) -> dict:
+        """action -> 超时秒数（各实例使用相同的超时配置，取第一个实例的）"""
+        return self.instances[0].client.timeouts
+
+    def get_timeout(self, action: str):
+        return self.instances[0].client.get_timeout(action)
+
+    def ensure_pool_size(self, pool_size: int):
+        for instance in self.instances:
+            instance.client.ensure_pool_size(pool_size)
+
+    def stats(self) -> dict:
+        """所有实例合计的各action请求耗时统计"""
+        merged = {}
+        for instance in self.instances:
+            for action, stat in instance.client.stats().items():
+                total = merged.setdefault(action, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+                total['count'] += stat['count']
+                total['errors'] += stat['errors']
+                total['total'] += stat['total']
+                total['max'] = max(total['max'], stat['max'])
+                total['last'] = stat['last']
+        for stat in merged.values():
+            stat['avg'] = stat['total'] / stat['count'] if stat['count'] else 0.0
+        return merged
+
+    def instance_stats(self) -> dict:
+        """{实例名称: {port, healthy, in_flight, open, stats}}"""
+        with self._lock:
+            return {instance.name: {
+                "port": instance.port,
+                "healthy": instance.healthy,
+                "in_flight": instance.in_flight,
+                "open": len(instance.open_stores),
+                "stats": instance.client.stats(),
+            } for instance in self.instances}
+
+    def reset_stats(self):
+        for instance in self.instances:
+            instance.client.reset_stats()
+
+    def close(self):
+        for instance in self.instances:
+            instance.client.close()
@@ -1,7 +1,6 @@
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+from collections.abc import MutableMapping
 
 
 def _strip_env(value, default=None):
@@ -20,15 +19,102 @@ def _strip_path(value):
     return _strip_env(value, "")
 
 
-# 紫鸟浏览器配置
-ZINIAO_CONFIG = {
-    'client_path': _strip_path(os.getenv('ZINIAO_CLIENT_PATH')),
-    'driver_folder_path': _strip_path(os.getenv('ZINIAO_DRIVER_FOLDER_PATH')),
-    'socket_port': _strip_env(os.getenv('ZINIAO_SOCKET_PORT'), "16851"),
-    'user_info': {
-        'company': _strip_env(os.getenv('ZINIAO_COMPANY')),
-        'username': _strip_env(os.getenv('ZINIAO_USERNAME')),
-        'password': _strip_env(os.getenv('ZINIAO_PASSWORD')),
-    },
-    'debuggingPort': _strip_env(os.getenv('ZINIAO_DEBUGGING_PORT'), "9222"),
-}
\ No newline at end of file
+def _read_env() -> dict:
+    # 紫鸟浏览器配置
+    return {
+        'client_path': _strip_path(os.getenv('ZINIAO_CLIENT_PATH')),
+        'driver_folder_path': _strip_path(os.getenv('ZINIAO_DRIVER_FOLDER_PATH')),
+        'socket_port': _strip_env(os.getenv('ZINIAO_SOCKET_PORT'), "16851"),
+        'socket_ports': _strip_env(os.getenv('ZINIAO_SOCKET_PORTS')),
+        'accounts_file': _strip_path(os.getenv('ZINIAO_ACCOUNTS_FILE')),
+        'user_info': {
+            'company': _strip_env(os.getenv('ZINIAO_COMPANY')),
+            'username': _strip_env(os.getenv('ZINIAO_USERNAME')),
+            'password': _strip_env(os.getenv('ZINIAO_PASSWORD')),
+        },
+        'debuggingPort': _strip_env(os.getenv('ZINIAO_DEBUGGING_PORT'), "9222"),
+        'driver_majors': _strip_env(os.getenv('ZINIAO_DRIVER_MAJORS')),
+        'shared_driver_service': _strip_env(os.getenv('ZINIAO_SHARED_DRIVER_SERVICE'), "1"),
+        'http_pool_size': _strip_env(os.getenv('ZINIAO_HTTP_POOL_SIZE'), "10"),
+        'ip_check_ttl': _strip_env(os.getenv('ZINIAO_IP_CHECK_TTL'), "1800"),
+        'ip_echo_url': _strip_env(os.getenv('ZINIAO_IP_ECHO_URL'), "https://api-ipv4.ip.sb/ip"),
+        'cache_path': _strip_path(os.getenv('ZINIAO_CACHE_PATH')),
+        'cache_budget_mb': _strip_env(os.getenv('ZINIAO_CACHE_BUDGET_MB')),
+        'session_journal': _strip_path(os.getenv('ZINIAO_SESSION_JOURNAL')),
+        'kill_client': _strip_env(os.getenv('ZINIAO_KILL_CLIENT'), "0"),
+        'resource_profile': _strip_env(os.getenv('ZINIAO_RESOURCE_PROFILE'), "full"),
+        'resource_profiles_file': _strip_path(os.getenv('ZINIAO_RESOURCE_PROFILES_FILE')),
+        'log_level': _strip_env(os.getenv('ZINIAO_LOG_LEVEL'), "INFO"),
+        'log_queue': _strip_env(os.getenv('ZINIAO_LOG_QUEUE'), "0"),
+        'log_json': _strip_env(os.getenv('ZINIAO_LOG_JSON'), "0"),
+    }
+
+
+class _LazyConfig(MutableMapping):
+    """
+    第一次读取时才加载 .env 和环境变量
+    用法与普通字典相同：ZINIAO_CONFIG['socket_port']
+    """
+
+    def __init__(self):
+        self._data = None
+        self._lock = threading.Lock()
+
+    def load(self, env_file: str = None, override: bool = False):
+        """加载 .env 并重新读取环境变量"""
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file, override=override)
+        with self._lock:
+            self._data = _read_env()
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self.load()
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data)
+
+
+ZINIAO_CONFIG = _LazyConfig()
+
+
+def configure(env_file: str = None, override_env: bool = False, log_dir: str = None, log_level=None,
+              log_console: bool = True, log_queue: bool = None, log_json: bool = None,
+              **overrides) -> MutableMapping:
+    """
+    显式初始化：加载配置并配置日志
+    不调用时，第一次读取配置/第一次写日志时会按默认参数自动完成
+    :param env_file: .env 文件路径，默认从当前目录向上查找
+    :param override_env: .env 中的值是否覆盖已存在的环境变量
+    :param log_dir: 日志目录，默认 ./logs
+    :param log_level: 日志级别，默认取 ZINIAO_LOG_LEVEL
+    :param log_console: 是否同时输出到控制台
+    :param log_queue: 是否由后台线程写日志，默认取 ZINIAO_LOG_QUEUE
+    :param log_json: 日志文件是否为JSON lines格式，默认取 ZINIAO_LOG_JSON
+    :param overrides: 直接覆盖的配置项，例如 socket_port="16852"
+    :return: ZINIAO_CONFIG
+    """
+    from logger import setup_logging
+
+    ZINIAO_CONFIG.load(env_file, override_env)
+    ZINIAO_CONFIG.update(overrides)
+    setup_logging(log_dir, log_level, log_console, log_queue, log_json)
+    return ZINIAO_CONFIG
@@ -0,0 +1,147 @@
+"""
+共享chromedriver服务
+每个Chromium主版本只启动一个常驻的chromedriver进程，该版本的所有店铺都通过 debuggerAddress 连接到它，
+而不是每打开一个店铺就启动一个新的chromedriver进程
+"""
+import atexit
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.webdriver.remote.command import Command
+
+from logger import logger
+
+
+class SharedServiceChrome(webdriver.Remote):
+    """
+    连接到共享chromedriver的driver，quit() 只结束自己的会话，不停止共享的chromedriver进程
+    webdriver.Chrome 的初始化会启动一个新的chromedriver进程，所以用 webdriver.Remote 连接已启动服务的地址，
+    ChromiumRemoteConnection 提供 execute_cdp_cmd、get_log 等Chromium命令
+    """
+
+    def __init__(self, manager: 'DriverServiceManager', major: str, service: Service, options):
+        self._manager = manager
+        self._major = major
+        self._service = service
+        self._released = False
+        executor = ChromiumRemoteConnection(
+            remote_server_addr=service.service_url,
+            vendor_prefix="goog",
+            browser_name="chrome",
+            keep_alive=True,
+        )
+        super().__init__(command_executor=executor, options=options)
+
+    def get_log(self, log_type):
+        """获取日志（如 performance），webdriver.Remote 没有此方法"""
+        return self.execute(Command.GET_LOG, {"type": log_type})["value"]
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            if not self._released:
+                self._released = True
+                self._manager.release(self._major, self._service)
+
+
+class DriverServiceManager:
+    """按Chromium主版本管理共享的chromedriver服务，带引用计数"""
+
+    def __init__(self, stop_when_idle: bool = False):
+        """
+        :param stop_when_idle: 某个版本没有店铺在用时是否立即停止其chromedriver，默认常驻直到 shutdown()
+        """
+        self.stop_when_idle = stop_when_idle
+        self._lock = threading.Lock()
+        # major -> [Service, 引用数]
+        self._services = {}
+
+    def acquire(self, major: str, driver_path: str) -> Service:
+        """
+        获取某个主版本的chromedriver服务，没有或已退出时启动
+        :return: 已启动的 Service
+        """
+        exited = None
+        with self._lock:
+            entry = self._services.get(major)
+            if entry is not None and entry[0].process.poll() is not None:
+                logger.warning(f"chromedriver{major} 已退出，重新启动")
+                # 旧服务上的driver退出时按服务对象释放（release），不会减掉新服务的引用数
+                exited = self._services.pop(major)[0]
+                entry = None
+            if entry is None:
+                entry = [Service(driver_path), 0]
+                entry[0].start()
+                logger.info(f"已启动共享 chromedriver{major}: {entry[0].service_url}")
+                self._services[major] = entry
+            entry[1] += 1
+            service = entry[0]
+        if exited is not None:
+            self._stop_service(major, exited)
+        return service
+
+    def release(self, major: str, service: Service):
+        """释放一次 acquire 得到的服务引用，服务已重启或已停止时忽略"""
+        to_stop = None
+        with self._lock:
+            entry = self._services.get(major)
+            if entry is None or entry[0] is not service:
+                return
+            entry[1] = max(entry[1] - 1, 0)
+            if entry[1] == 0 and self.stop_when_idle:
+                to_stop = self._services.pop(major)[0]
+        if to_stop is not None:
+            self._stop_service(major, to_stop)
+
+    def create_driver(self, major: str, driver_path: str, options) -> SharedServiceChrome:
+        """
+        通过共享的chromedriver创建driver
+        :param major: Chromium主版本
+        :param driver_path: chromedriver路径
+        :param options: 已设置 debuggerAddress 的 Options
+        """
+        service = self.acquire(major, driver_path)
+        try:
+            return SharedServiceChrome(self, major, service, options)
+        except Exception:
+            self.release(major, service)
+            raise
+
+    def ref_counts(self) -> dict:
+        """各版本当前的引用数"""
+        with self._lock:
+            return {major: entry[1] for major, entry in self._services.items()}
+
+    @staticmethod
+    def _stop_service(major, service):
+        try:
+            service.stop()
+            logger.info(f"已停止共享 chromedriver{major}")
+        except Exception as e:
+            logger.warning(f"停止 chromedriver{major} 异常: {e}")
+
+    def shutdown(self):
+        """停止所有chromedriver服务"""
+        with self._lock:
+            services = list(self._services.items())
+            self._services.clear()
+        for major, entry in services:
+            self._stop_service(major, entry[0])
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_driver_service_manager() -> DriverServiceManager:
+    """获取默认的chromedriver服务管理器，进程退出时自动停止所有服务"""
+    global _default_manager
+    if _default_manager is None:
+        with _default_manager_lock:
+            if _default_manager is None:
+                _default_manager = DriverServiceManager()
+                atexit.register(_default_manager.shutdown)
+    return _default_manager
@@ -0,0 +1,274 @@
+"""
+chromedriver同步
+- 本地清单记录每个驱动文件的 size/mtime/sha1，文件没变化时不再重新计算sha1
+- sha1按块流式计算，不把整个文件读进内存
+- 缺失或不一致的驱动并行下载，支持断点续传，先写 .part 临时文件，校验通过后再原子替换
+- 可以只同步指定的Chromium主版本，或打开店铺时按需同步（ensure）该店铺用到的版本
+"""
+import hashlib
+import json
+import os
+import platform
+import threading
+from typing import TYPE_CHECKING
+
+from logger import logger
+
+if TYPE_CHECKING:
+    import requests
+
+CDN_BASE_URL = "https://cdn-superbrowser-attachment.ziniao.com/webdriver"
+MANIFEST_NAME = ".driver_manifest.json"
+DRIVER_PREFIX = "chromedriver"
+CHUNK_SIZE = 1024 * 1024
+
+
+def driver_config_url():
+    """当前平台的驱动配置地址，不支持的平台返回None"""
+    system = platform.system()
+    if system == 'Windows':
+        return f"{CDN_BASE_URL}/exe_32/config.json"
+    if system == 'Darwin':
+        arch = platform.machine()
+        if arch == 'x86_64':
+            return f"{CDN_BASE_URL}/mac/x64/config.json"
+        if arch == 'arm64':
+            return f"{CDN_BASE_URL}/mac/arm64/config.json"
+    return None
+
+
+def driver_filename(major) -> str:
+    """chromedriver文件名，例如 chromedriver114 / chromedriver114.exe"""
+    filename = f"{DRIVER_PREFIX}{major}"
+    if platform.system() == 'Windows':
+        filename += ".exe"
+    return filename
+
+
+def file_sha1(fpath: str) -> str:
+    """流式计算文件sha1"""
+    sha1 = hashlib.sha1()
+    with open(fpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class DriverSync:
+    """chromedriver同步器"""
+
+    def __init__(self, folder: str, config_url: str = None, workers: int = 4, session: 'requests.Session' = None):
+        """
+        :param folder: 存放chromedriver的文件夹
+        :param config_url: 驱动配置地址，默认按当前平台
+        :param workers: 并行下载数
+        :param session: 复用的 requests.Session
+        """
+        self.folder = folder
+        self.config_url = config_url or driver_config_url()
+        self.workers = workers
+        if session is None:
+            import requests
+
+            session = requests.Session()
+        self._session = session
+        self._lock = threading.Lock()
+        # 同一时间只允许一次同步，避免多个线程同时写同一个临时文件
+        self._sync_lock = threading.Lock()
+        self._manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self._manifest = None
+        # 本进程内已通过 ensure 校验的主版本
+        self._ensured = set()
+
+    def _load_manifest(self) -> dict:
+        if self._manifest is None:
+            manifest = {"files": {}, "config": {}}
+            if os.path.exists(self._manifest_path):
+                try:
+                    with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                        manifest.update(json.load(f))
+                except Exception as e:
+                    logger.warning(f"读取驱动清单失败，将重新校验: {e}")
+            self._manifest = manifest
+        return self._manifest
+
+    def _save_manifest(self):
+        with self._lock:
+            data = json.dumps(self._manifest, ensure_ascii=False, indent=2)
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _fetch_config(self):
+        """获取驱动配置，未变化时（304）复用清单中缓存的配置"""
+        cached = self._load_manifest().get("config") or {}
+        headers = {}
+        if cached.get("items") is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = self._session.get(self.config_url, headers=headers, timeout=(5, 30))
+        except Exception as e:
+            if cached.get("items") is not None:
+                logger.warning(f"获取驱动配置失败，使用缓存的配置: {e}")
+                return cached["items"]
+            logger.error(f"获取驱动配置失败: {e}")
+            return None
+        if response.status_code == 304:
+            return cached["items"]
+        if response.status_code != 200:
+            logger.error(f"下载驱动失败，状态码：{response.status_code}")
+            return None
+        items = json.loads(response.text)
+        with self._lock:
+            self._manifest["config"] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "items": items,
+            }
+        return items
+
+    def _local_sha1(self, filename: str):
+        """本地文件的sha1，size和mtime都没变时直接取清单中的值"""
+        path = os.path.join(self.folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        files = self._load_manifest()["files"]
+        record = files.get(filename)
+        if record and record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns:
+            return record.get("sha1")
+        sha1 = file_sha1(path)
+        self._record(filename, stat, sha1)
+        return sha1
+
+    def _record(self, filename, stat, sha1):
+        with self._lock:
+            self._manifest["files"][filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1}
+
+    def _download(self, url: str, filename: str, expected_sha1: str, attempts: int = 2) -> bool:
+        """
+        下载到 .part 临时文件（已有则续传），sha1校验通过后替换正式文件
+        :return: 是否成功
+        """
+        path = os.path.join(self.folder, filename)
+        part_path = path + '.part'
+        for attempt in range(attempts):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with self._session.get(url, stream=True, headers=headers, timeout=(10, 60)) as response:
+                    if response.status_code == 206:
+                        mode = 'ab'
+                    elif response.status_code == 200:
+                        mode = 'wb'
+                    elif response.status_code == 416:
+                        # 临时文件已经完整
+                        mode = None
+                    else:
+                        logger.error(f"下载失败，响应状态码为：{response.status_code}")
+                        return False
+                    if mode:
+                        with open(part_path, mode) as f:
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                if chunk:
+                                    f.write(chunk)
+            except Exception as e:
+                logger.warning(f"下载{filename}中断（已保留临时文件，下次续传）: {e}")
+                continue
+            sha1 = file_sha1(part_path)
+            if sha1 != expected_sha1:
+                logger.warning(f"驱动{filename}下载后sha1不一致，第{attempt + 1}次")
+                os.remove(part_path)
+                continue
+            if platform.system() != 'Windows':
+                os.chmod(part_path, 0o755)
+            try:
+                os.replace(part_path, path)
+            except OSError as e:
+                # windows下驱动正在被使用时无法替换
+                logger.error(f"替换驱动{filename}失败: {e}")
+                return False
+            self._record(filename, os.stat(path), sha1)
+            logger.info(f"文件已成功下载并保存到：{path}")
+            return True
+        return False
+
+    def sync(self, majors=None) -> dict:
+        """
+        同步驱动
+        :param majors: 只同步这些Chromium主版本（如 ["114", "120"]），None表示全部
+        :return: {"ok": [...], "downloaded": [...], "failed": [...]}
+        """
+        with self._sync_lock:
+            return self._sync(majors)
+
+    def _sync(self, majors) -> dict:
+        result = {"ok": [], "downloaded": [], "failed": []}
+        if not self.config_url:
+            return result
+        items = self._fetch_config()
+        if items is None:
+            return result
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        if majors is not None:
+            majors = {str(major) for major in majors}
+            items = [item for item in items if item['name'][len(DRIVER_PREFIX):] in majors]
+
+        to_download = []
+        for item in items:
+            filename = item['name']
+            if platform.system() == 'Windows':
+                filename = filename + ".exe"
+            local_sha1 = self._local_sha1(filename)
+            if local_sha1 == item['sha1']:
+                result["ok"].append(filename)
+            else:
+                if local_sha1 is None:
+                    logger.info(f"驱动{filename}不存在，开始下载...")
+                else:
+                    logger.warning(f"驱动{filename}的sha1不一致，重新下载...")
+                to_download.append((item, filename))
+        if result["ok"]:
+            logger.info(f"{len(result['ok'])}个驱动已存在，sha1校验通过")
+
+        if to_download:
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self._download, item['url'], filename, item['sha1']): filename
+                           for item, filename in to_download}
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        logger.error(f"下载驱动{filename}异常: {e}")
+                        ok = False
+                    result["downloaded" if ok else "failed"].append(filename)
+        self._save_manifest()
+        return result
+
+    def ensure(self, major):
+        """
+        确保某个主版本的驱动存在且与配置一致，只同步这一个版本，每个版本在本进程内只校验一次
+        :return: 驱动路径，下载失败返回None
+        """
+        major = str(major)
+        filename = driver_filename(major)
+        path = os.path.join(self.folder, filename)
+        with self._lock:
+            if major in self._ensured and os.path.exists(path):
+                return path
+        result = self.sync(majors=[major])
+        if filename in result["downloaded"] or filename in result["ok"]:
+            with self._lock:
+                self._ensured.add(major)
+            return path
+        # 获取不到驱动配置（离线、不支持的平台）时沿用本地已有的驱动
+        return path if os.path.exists(path) else None
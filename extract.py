@@ -0,0 +1,177 @@
+"""
+批量提取页面数据
+用 find_element + .text 逐个读取元素时，每个元素、每个属性都是一次chromedriver HTTP往返，几百行的表格要几分钟。
+extract 把声明式的提取规则编译成一段JS，通过一次 execute_script（selenium）或 Runtime.evaluate（CDPSession）
+在页面内完成查找和取值，直接返回Python数据。
+
+提取规则（字段）：
+- 字符串：CSS选择器，取第一个匹配元素的文本
+- 字典：
+    selector / xpath：CSS选择器或XPath（相对当前元素的XPath要以 . 开头，如 ".//td"），都不写表示当前元素本身
+    attr：取属性值；prop：取DOM属性（如 "value"、"checked"）；html：为True时取innerHTML；都不写时取文本（去掉首尾空白）
+    fields：嵌套字段，每个匹配元素提取为一个字典
+    all：是否取所有匹配元素（列表），有 fields 时默认True，否则默认False
+    default：没有匹配元素时的值，默认None
+
+示例：
+
+    orders = extract(driver, {
+        "selector": "table#orders tbody tr",
+        "fields": {
+            "order_id": "td.order-id",
+            "link": {"selector": "a", "attr": "href"},
+            "skus": {"selector": "li.sku", "all": True},
+            "items": {"selector": "li.item", "fields": {"name": ".name", "qty": {"selector": "input", "prop": "value"}}},
+        },
+    })
+    ip = extract(driver, {"xpath": "//td[@class='proto_address']/a"})
+
+    # 行数很多时分批提取（每批一次往返，避免单次返回的数据过大）
+    for rows in iter_extract(cdp, spec, chunk_size=500):
+        save(rows)
+"""
+import json
+
+from cdp_client import CDPSession
+
+_FIELD_KEYS = {"selector", "xpath", "attr", "prop", "html", "fields", "all", "default"}
+
+# 按规则在页面内提取数据的JS，参数：(编译后的规则, 起始下标, 结束下标)
+# 最外层规则取多个元素时只提取 [start, end) 范围内的元素，并返回总数
+_EXTRACT_JS = """(function (spec, start, end) {
+    function query(ctx, f, all) {
+        if (f.x) {
+            var r = document.evaluate(f.x, ctx, null,
+                all ? XPathResult.ORDERED_NODE_SNAPSHOT_TYPE : XPathResult.FIRST_ORDERED_NODE_TYPE, null);
+            if (!all) return r.singleNodeValue ? [r.singleNodeValue] : [];
+            var nodes = [];
+            for (var i = 0; i < r.snapshotLength; i++) nodes.push(r.snapshotItem(i));
+            return nodes;
+        }
+        if (!f.s) return [ctx];
+        if (!all) {
+            var el = ctx.querySelector(f.s);
+            return el ? [el] : [];
+        }
+        return Array.prototype.slice.call(ctx.querySelectorAll(f.s));
+    }
+    function value(el, f) {
+        if (f.fields) {
+            var obj = {};
+            for (var key in f.fields) obj[key] = field(el, f.fields[key]);
+            return obj;
+        }
+        var v;
+        if (f.get[0] === "attr") v = el.getAttribute ? el.getAttribute(f.get[1]) : null;
+        else if (f.get[0] === "prop") v = el[f.get[1]];
+        else if (f.get[0] === "html") v = el.innerHTML;
+        else {
+            v = el.innerText;
+            if (v == null) v = el.textContent;
+            if (v != null) v = String(v).trim();
+        }
+        return v === undefined ? null : v;
+    }
+    function field(ctx, f) {
+        var els = query(ctx, f, f.all);
+        if (f.all) return els.map(function (el) { return value(el, f); });
+        return els.length ? value(els[0], f) : f.d;
+    }
+    if (!spec.all) return {total: null, items: field(document, spec)};
+    var els = query(document, spec, true);
+    return {total: els.length, items: els.slice(start, end == null ? undefined : end).map(function (el) { return value(el, spec); })};
+})"""
+
+
+def _compile_field(field, path: str) -> dict:
+    if isinstance(field, str):
+        field = {"selector": field}
+    if not isinstance(field, dict):
+        raise ValueError(f"提取规则 {path} 必须是选择器字符串或字典")
+    unknown = set(field) - _FIELD_KEYS
+    if unknown:
+        raise ValueError(f"提取规则 {path} 有未知的键: {sorted(unknown)}")
+    if field.get("selector") and field.get("xpath"):
+        raise ValueError(f"提取规则 {path} 不能同时指定 selector 和 xpath")
+    getters = [key for key in ("attr", "prop", "html", "fields") if field.get(key)]
+    if len(getters) > 1:
+        raise ValueError(f"提取规则 {path} 的 {getters} 只能指定一个")
+    compiled = {
+        "s": field.get("selector") or None,
+        "x": field.get("xpath") or None,
+        "all": bool(field.get("all", "fields" in field)),
+        "d": field.get("default"),
+    }
+    if "fields" in field:
+        fields = field["fields"]
+        if not isinstance(fields, dict) or not fields:
+            raise ValueError(f"提取规则 {path} 的 fields 必须是非空字典")
+        compiled["fields"] = {name: _compile_field(sub, f"{path}.{name}") for name, sub in fields.items()}
+    elif field.get("attr"):
+        compiled["get"] = ["attr", field["attr"]]
+    elif field.get("prop"):
+        compiled["get"] = ["prop", field["prop"]]
+    elif field.get("html"):
+        compiled["get"] = ["html"]
+    else:
+        compiled["get"] = ["text"]
+    return compiled
+
+
+def compile_spec(spec) -> dict:
+    """
+    检查并编译提取规则（规则有误时抛出 ValueError，不会等到页面上执行才报错）
+    :return: 编译后的规则，可以直接传给 extract / iter_extract
+    """
+    if isinstance(spec, dict) and spec.get("__compiled__"):
+        return spec
+    compiled = _compile_field(spec, "spec")
+    compiled["__compiled__"] = True
+    return compiled
+
+
+def _run(target, compiled: dict, start: int, end, timeout: float = None) -> dict:
+    expression = f"{_EXTRACT_JS}({json.dumps(compiled, ensure_ascii=False)}, {start}, {json.dumps(end)})"
+    if isinstance(target, CDPSession):
+        return target.evaluate(expression, timeout=timeout)
+    return target.execute_script("return " + expression)
+
+
+def extract(target, spec, chunk_size: int = None, timeout: float = None):
+    """
+    一次往返提取页面数据
+    :param target: selenium driver 或 CDPSession
+    :param spec: 提取规则（见模块说明）或 compile_spec 的结果
+    :param chunk_size: 最外层规则取多个元素时，每次最多提取的元素数，不传时一次全部提取
+    :param timeout: CDP模式下单次执行的超时（秒）
+    :return: 提取结果（最外层取多个元素时为列表）
+    """
+    compiled = compile_spec(spec)
+    if chunk_size and compiled["all"]:
+        items = []
+        for chunk in iter_extract(target, compiled, chunk_size, timeout):
+            items.extend(chunk)
+        return items
+    return _run(target, compiled, 0, None, timeout)["items"]
+
+
+def iter_extract(target, spec, chunk_size: int = 500, timeout: float = None):
+    """
+    分批提取最外层规则匹配的元素，每批一次往返
+    每批都会重新查询元素，提取过程中页面发生变化时各批之间可能重复或遗漏
+    :return: 每批结果列表的生成器
+    """
+    compiled = compile_spec(spec)
+    if not compiled["all"]:
+        yield [_run(target, compiled, 0, None, timeout)["items"]]
+        return
+    chunk_size = max(1, int(chunk_size))
+    start = 0
+    while True:
+        ret = _run(target, compiled, start, start + chunk_size, timeout)
+        items = ret["items"]
+        if items:
+            yield items
+        start += chunk_size
+        if not items or start >= ret["total"]:
+            break
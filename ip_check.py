@@ -0,0 +1,179 @@
+"""
+店铺出口ip检测缓存
+- 同一店铺在有效期内用同一个ip检测通过后，再次打开时跳过检测
+- 未命中时先在页面里 fetch 一个返回出口ip的接口，与期望的ip一致就算通过，不用整页打开检测页再等元素出现；
+  获取失败或不一致时再走原来的检测页
+- 同一个代理ip同时只检测一次，其余店铺等待并复用通过的结果
+
+示例：
+
+    ip_usable = verify_store_ip(driver, store_id, ret_json.get("ip"), lambda: _open_ip_check(driver, url))
+"""
+import json
+import threading
+import time
+
+from logger import logger
+from config import ZINIAO_CONFIG
+from cdp_client import CDPSession
+from metrics import get_metrics
+
+# 轻量检测的超时（秒）
+FETCH_IP_TIMEOUT = 5
+# 同一个ip正在检测时，其余店铺最多等待的秒数
+COALESCE_WAIT_TIMEOUT = 60
+
+
+def fetch_ip_expression(url: str, timeout: float = FETCH_IP_TIMEOUT) -> str:
+    """在页面里请求出口ip的JS表达式，结果为ip字符串，失败为null"""
+    return (
+        "Promise.race(["
+        "fetch(%s, {cache: 'no-store', credentials: 'omit'}).then(r => r.ok ? r.text() : null),"
+        "new Promise(resolve => setTimeout(() => resolve(null), %d))"
+        "]).then(text => text && text.trim()).catch(() => null)" % (json.dumps(url), int(timeout * 1000))
+    )
+
+
+def fetch_exit_ip(driver, url: str = None, timeout: float = FETCH_IP_TIMEOUT):
+    """
+    在当前页面中请求出口ip
+    :param driver: selenium driver 或 CDPSession
+    :param url: 返回纯文本ip的接口，默认取配置 ZINIAO_IP_ECHO_URL
+    :return: ip，失败返回None
+    """
+    expression = fetch_ip_expression(url or ZINIAO_CONFIG['ip_echo_url'], timeout)
+    try:
+        if isinstance(driver, CDPSession):
+            return driver.evaluate(expression, await_promise=True, timeout=timeout + 5)
+        return driver.execute_script("return " + expression)
+    except Exception as e:
+        logger.info(f"页面内获取出口ip失败: {e}")
+        return None
+
+
+class _InflightCheck:
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = False
+
+
+class IpCheckCache:
+    """(店铺, ip) -> 检测通过的过期时间，线程安全"""
+
+    def __init__(self, ttl: float = 1800):
+        """
+        :param ttl: 检测通过的结果保留秒数，<=0 表示不缓存
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._verified = {}
+        self._inflight = {}
+
+    def is_verified(self, store_id, ip) -> bool:
+        with self._lock:
+            expires_at = self._verified.get((str(store_id), ip))
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._verified[(str(store_id), ip)]
+                return False
+            return True
+
+    def mark_verified(self, store_id, ip):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._verified[(str(store_id), ip)] = time.monotonic() + self.ttl
+
+    def invalidate(self, store_id=None, ip=None):
+        """删除某个店铺或某个ip的缓存，都不传时清空"""
+        with self._lock:
+            if store_id is None and ip is None:
+                self._verified.clear()
+                return
+            for key in list(self._verified):
+                if (store_id is None or key[0] == str(store_id)) and (ip is None or key[1] == ip):
+                    del self._verified[key]
+
+    def verify(self, store_id, ip, check, wait_timeout: float = COALESCE_WAIT_TIMEOUT) -> bool:
+        """
+        检测店铺的ip，命中缓存时直接返回True
+        :param check: 实际的检测函数 () -> bool
+        :param wait_timeout: 同一个ip正在检测时最多等待的秒数
+        """
+        if not ip or self.ttl <= 0:
+            return check()
+        metrics = get_metrics()
+        if self.is_verified(store_id, ip):
+            logger.info(f"ip {ip} 在 {self.ttl:.0f} 秒内已检测通过，跳过检测")
+            metrics.inc("ip_check", result="cached")
+            return True
+        with self._lock:
+            inflight = self._inflight.get(ip)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[ip] = _InflightCheck()
+        if not leader:
+            # 同一个代理正在检测，等待结果，通过则直接复用，否则自己再检测一次
+            if inflight.event.wait(wait_timeout) and inflight.result:
+                logger.info(f"ip {ip} 已由其他店铺检测通过")
+                self.mark_verified(store_id, ip)
+                metrics.inc("ip_check", result="coalesced")
+                return True
+            ok = check()
+        else:
+            ok = False
+            try:
+                ok = check()
+            finally:
+                inflight.result = ok
+                with self._lock:
+                    self._inflight.pop(ip, None)
+                inflight.event.set()
+        if ok:
+            self.mark_verified(store_id, ip)
+        metrics.inc("ip_check", result="passed" if ok else "failed")
+        return ok
+
+
+def verify_store_ip(driver, store_id, expected_ip, full_check, cache: IpCheckCache = None,
+                    timeout: float = None) -> bool:
+    """
+    检测店铺出口ip：缓存 -> 页面内fetch -> 完整检测页
+    :param driver: selenium driver 或 CDPSession
+    :param store_id: 店铺id
+    :param expected_ip: startBrowser 返回的ip
+    :param full_check: 完整的检测函数 () -> bool（打开检测页等待结果）
+    :param cache: 默认使用 get_ip_check_cache()
+    :param timeout: 页面内获取ip和等待其他店铺检测结果的最长秒数（full_check 的超时由它自己控制）
+    :return: 是否通过
+    """
+    if not expected_ip:
+        return full_check()
+
+    def check():
+        ip = fetch_exit_ip(driver, timeout=FETCH_IP_TIMEOUT if timeout is None else min(FETCH_IP_TIMEOUT, timeout))
+        if ip == expected_ip:
+            logger.info(f"页面内获取的出口ip与期望一致：{ip}")
+            return True
+        logger.info(f"页面内获取的出口ip（{ip}）与期望的ip（{expected_ip}）不一致，打开检测页确认")
+        return full_check()
+
+    wait_timeout = COALESCE_WAIT_TIMEOUT if timeout is None else min(COALESCE_WAIT_TIMEOUT, timeout)
+    return (cache or get_ip_check_cache()).verify(store_id, expected_ip, check, wait_timeout)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_ip_check_cache() -> IpCheckCache:
+    """默认的ip检测缓存（有效期取配置 ZINIAO_IP_CHECK_TTL）"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = IpCheckCache(float(ZINIAO_CONFIG['ip_check_ttl']))
+    return _default_cache
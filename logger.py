@@ -1,45 +1,226 @@
+import atexit
+import contextvars
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
 import os
+import threading
+from contextlib import contextmanager
 
-# 确保日志目录存在
+# 日志目录
 log_dir = './logs'
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
+
+_configured = False
+_configure_lock = threading.RLock()
+_listener = None
+
+# 当前线程/协程的日志上下文（店铺名称、店铺id等），会附加到每条日志上
+_log_context = contextvars.ContextVar('ziniao_log_context', default={})
+
+TEXT_FORMAT = '[%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s]%(context)s - %(message)s'
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    在 with 代码块内写的日志都带上这些字段，例如 log_context(store="AMZ-1", store_id="xxx")
+    线程池中需要在任务函数内部设置（contextvars 不会自动带到其他线程）
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def get_log_context() -> dict:
+    return _log_context.get()
+
+
+class LazyJson:
+    """
+    日志参数：只有日志级别启用、真正格式化时才序列化
+        logger.debug("返回: %s", LazyJson(result))
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        try:
+            return json.dumps(self.obj, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            return str(self.obj)
+
+
+class ContextFilter(logging.Filter):
+    """把日志上下文写入 record.context_fields，文本格式写入 record.context"""
+
+    def filter(self, record):
+        if not hasattr(record, 'context_fields'):
+            fields = _log_context.get()
+            record.context_fields = fields
+            record.context = ' [' + ' '.join(f'{k}={v}' for k, v in fields.items()) + ']' if fields else ''
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "file": record.filename,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, 'context_fields', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _make_queue_handler(queue):
+    from logging.handlers import QueueHandler
+
+    class _ContextQueueHandler(QueueHandler):
+        """
+        只在当前线程里拼好消息文本和异常堆栈，时间格式化、JSON序列化和写文件都交给后台线程
+        """
+
+        def prepare(self, record):
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            return record
+
+    return _ContextQueueHandler(queue)
+
+
+def stop_logging_listener():
+    """停止后台写日志的线程（会先写完队列中剩余的日志），程序退出时自动调用"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def setup_logging(directory: str = None, level: int = None, console: bool = None, use_queue: bool = None,
+                  json_lines: bool = None) -> logging.Logger:
+    """
+    配置根logger：按日期轮转的日志文件 + 控制台
+    只有第一次调用生效；不主动调用时，第一次使用 logger 会按默认参数自动调用
+    参数为None时取配置（ZINIAO_LOG_LEVEL / ZINIAO_LOG_QUEUE / ZINIAO_LOG_JSON）
+    :param directory: 日志目录，默认 ./logs
+    :param level: 日志级别
+    :param console: 是否同时输出到控制台
+    :param use_queue: 是否启用队列模式：业务线程只把日志放进队列，由后台线程写文件和控制台，
+                      并发打开大量店铺时不会因为写日志互相阻塞
+    :param json_lines: 日志文件是否使用JSON lines格式（running.jsonl），带上 log_context 中的字段
+    :return: 根logger
+    """
+    global _configured, _listener
+    root = logging.getLogger()
+    with _configure_lock:
+        if _configured:
+            return root
+        # 先置位，配置过程中再次调用（同一线程）时直接返回
+        _configured = True
+        try:
+            from logging.handlers import TimedRotatingFileHandler
+            from config import ZINIAO_CONFIG
+
+            directory = directory or log_dir
+            if level is None:
+                level = logging.getLevelName(ZINIAO_CONFIG['log_level'].upper())
+                if not isinstance(level, int):
+                    level = logging.INFO
+            if console is None:
+                console = True
+            if use_queue is None:
+                use_queue = ZINIAO_CONFIG['log_queue'] == '1'
+            if json_lines is None:
+                json_lines = ZINIAO_CONFIG['log_json'] == '1'
+
+            # 确保日志目录存在
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+            root.setLevel(level)
+
+            # 创建按日期轮转的文件处理器
+            # when='midnight': 每天午夜创建新的日志文件
+            # interval=1: 每1天轮转一次
+            # backupCount=30: 保留最近30天的日志文件，超过30天的自动删除
+            # encoding='utf-8': 支持中文日志
+            fh = TimedRotatingFileHandler(
+                filename=os.path.join(directory, 'running.jsonl' if json_lines else 'running.log'),
+                when='midnight',           # 每天午夜轮转
+                interval=1,                # 轮转间隔：1天
+                backupCount=30,            # 保留30天的日志
+                encoding='utf-8',          # 支持中文
+                delay=False,
+                utc=False                  # 使用本地时间
+            )
+            fh.setLevel(logging.DEBUG)
+            # 设置日志文件的日期后缀格式为：YYYY-MM-DD
+            fh.suffix = "%Y-%m-%d"
+
+            # 创建格式化器
+            formatter = logging.Formatter(TEXT_FORMAT)
+
+            # 设置格式化器
+            fh.setFormatter(JsonLinesFormatter() if json_lines else formatter)
+            handlers = [fh]
+
+            if console:
+                # 创建控制台处理器
+                ch = logging.StreamHandler()
+                ch.setLevel(logging.DEBUG)
+                ch.setFormatter(formatter)
+                handlers.append(ch)
+
+            context_filter = ContextFilter()
+            if use_queue:
+                import queue
+                from logging.handlers import QueueListener
+
+                log_queue = queue.SimpleQueue()
+                queue_handler = _make_queue_handler(log_queue)
+                # 上下文要在写日志的线程里取，所以过滤器加在 QueueHandler 上
+                queue_handler.addFilter(context_filter)
+                _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+                _listener.start()
+                atexit.register(stop_logging_listener)
+                root.addHandler(queue_handler)
+            else:
+                # 添加处理器到logger
+                for handler in handlers:
+                    handler.addFilter(context_filter)
+                    root.addHandler(handler)
+        except BaseException:
+            # 配置失败（如无法创建日志目录）时允许下次重新配置，而不是一直没有日志
+            _configured = False
+            raise
+    return root
+
+
+class _LazyLogger:
+    """
+    根logger的代理：import 时不创建目录、不添加handler，第一次使用时才调用 setup_logging
+    """
+
+    def __getattr__(self, name):
+        if not _configured:
+            setup_logging()
+        return getattr(logging.getLogger(), name)
+
 
 # 创建logger
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# 创建按日期轮转的文件处理器
-# when='midnight': 每天午夜创建新的日志文件
-# interval=1: 每1天轮转一次
-# backupCount=30: 保留最近30天的日志文件，超过30天的自动删除
-# encoding='utf-8': 支持中文日志
-fh = TimedRotatingFileHandler(
-    filename='./logs/running.log',
-    when='midnight',           # 每天午夜轮转
-    interval=1,                # 轮转间隔：1天
-    backupCount=30,            # 保留30天的日志
-    encoding='utf-8',          # 支持中文
-    delay=False,
-    utc=False                  # 使用本地时间
-)
-fh.setLevel(logging.DEBUG)
-# 设置日志文件的日期后缀格式为：YYYY-MM-DD
-fh.suffix = "%Y-%m-%d"
-
-# 创建控制台处理器
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-
-# 创建格式化器
-formatter = logging.Formatter('[%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s] - %(message)s')
-
-# 设置格式化器
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-
-# 添加处理器到logger
-logger.addHandler(fh)
-logger.addHandler(ch)
\ No newline at end of file
+logger = _LazyLogger()
@@ -1,7 +1,8 @@
 from logger import logger
-from ziniao_func import open_store_by_name
+from ziniao_func import configure, open_store_by_name
 
 def main():
+    configure()
     logger.info(f"基础紫鸟WebDriver项目模板")
     open_store_by_name("Test-Store")
 
@@ -0,0 +1,265 @@
+"""
+打开店铺的分阶段耗时统计
+- 按 类型(kind)/阶段(phase)/店铺(store) 记录耗时，按名称和标签(如 statusCode)记录计数
+- 可注册回调(hook)，每条记录都会实时推送给回调
+- 导出 Prometheus 文本格式和 JSON lines
+- 计算 p50/p95/p99
+
+示例：
+
+    metrics = get_metrics()
+    metrics.add_hook(JsonLinesExporter("./logs/metrics.jsonl"))
+    open_stores_by_names([...])
+    print(metrics.to_prometheus())
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from logger import logger
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """最近秩法计算分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(values) -> dict:
+    """{count, mean, max, p50, p95, p99}"""
+    values = sorted(values)
+    count = len(values)
+    result = {
+        "count": count,
+        "mean": sum(values) / count if count else 0.0,
+        "max": values[-1] if values else 0.0,
+    }
+    for q in QUANTILES:
+        result[f"p{int(q * 100)}"] = percentile(values, q)
+    return result
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class SummaryCollector:
+    """收集一段时间内的耗时记录，用于输出单批次的分位数统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def __call__(self, event: dict):
+        if event["type"] != "timing":
+            return
+        key = f"{event['kind']}.{event['phase']}"
+        with self._lock:
+            self._values.setdefault(key, []).append(event["value"])
+
+    def summary(self) -> dict:
+        """{kind.phase: {count, mean, max, p50, p95, p99}}"""
+        with self._lock:
+            values = {key: list(items) for key, items in self._values.items()}
+        return {key: summarize(items) for key, items in values.items()}
+
+    def report(self, title: str = '') -> dict:
+        summary = self.summary()
+        for key, stat in summary.items():
+            logger.info(f"{title}{key}: count={stat['count']} p50={stat['p50']:.2f}s "
+                        f"p95={stat['p95']:.2f}s p99={stat['p99']:.2f}s max={stat['max']:.2f}s")
+        return summary
+
+
+class JsonLinesExporter:
+    """把每条记录以 JSON lines 追加写入文件，作为hook使用"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class MetricsRegistry:
+    """耗时和计数的内存注册表，线程安全"""
+
+    def __init__(self, max_samples: int = 2000):
+        """
+        :param max_samples: 每个 (kind, phase, store) 最多保留的耗时样本数，超出后丢弃最早的
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        # (kind, phase, store) -> {"samples": deque, "sum": float, "count": int}
+        self._timings = {}
+        # (name, ((label, value), ...)) -> int
+        self._counters = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        """注册回调 hook(event)，event 为 {"type", "ts", ...}"""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _emit(self, event: dict):
+        with self._lock:
+            hooks = list(self._hooks)
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logger.warning(f"metrics hook 异常: {e}")
+
+    def observe(self, kind: str, phase: str, seconds: float, store: str = None):
+        """记录一次耗时"""
+        key = (kind, phase, store)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = {"samples": deque(maxlen=self.max_samples), "sum": 0.0, "count": 0}
+                self._timings[key] = timing
+            timing["samples"].append(seconds)
+            timing["sum"] += seconds
+            timing["count"] += 1
+        self._emit({"type": "timing", "ts": time.time(), "kind": kind, "phase": phase, "store": store,
+                    "value": seconds})
+
+    def inc(self, name: str, value: int = 1, **labels):
+        """计数 +value，labels 例如 code="0", store="AMZ-1" """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._emit({"type": "counter", "ts": time.time(), "name": name, "labels": labels, "value": value})
+
+    @contextmanager
+    def collect(self):
+        """
+        在 with 代码块内收集耗时记录
+        :return: SummaryCollector
+        """
+        collector = SummaryCollector()
+        self.add_hook(collector)
+        try:
+            yield collector
+        finally:
+            self.remove_hook(collector)
+
+    def summary(self, by_store: bool = False) -> dict:
+        """
+        耗时分位数统计
+        :param by_store: 是否按店铺分开统计
+        :return: {"kind.phase": {...}} 或 {"kind.phase": {store: {...}}}
+        """
+        with self._lock:
+            items = [(key, list(timing["samples"])) for key, timing in self._timings.items()]
+        merged = {}
+        for (kind, phase, store), samples in items:
+            name = f"{kind}.{phase}"
+            if by_store:
+                merged.setdefault(name, {}).setdefault(store, []).extend(samples)
+            else:
+                merged.setdefault(name, []).extend(samples)
+        if by_store:
+            return {name: {store: summarize(values) for store, values in stores.items()}
+                    for name, stores in merged.items()}
+        return {name: summarize(values) for name, values in merged.items()}
+
+    def counters(self) -> dict:
+        """{name: {labels_tuple: value}}"""
+        with self._lock:
+            items = list(self._counters.items())
+        result = {}
+        for (name, labels), value in items:
+            result.setdefault(name, {})[labels] = value
+        return result
+
+    def to_prometheus(self, include_store: bool = False) -> str:
+        """
+        导出 Prometheus 文本格式
+        :param include_store: 是否带上 store 标签（店铺很多时标签基数会很大）
+        """
+        with self._lock:
+            timings = [(key, list(t["samples"]), t["sum"], t["count"]) for key, t in self._timings.items()]
+            counters = list(self._counters.items())
+        merged = {}
+        for (kind, phase, store), samples, total, count in timings:
+            labels = {"kind": kind, "phase": phase}
+            if include_store and store is not None:
+                labels["store"] = store
+            key = tuple(labels.items())
+            entry = merged.setdefault(key, [[], 0.0, 0])
+            entry[0].extend(samples)
+            entry[1] += total
+            entry[2] += count
+
+        lines = [
+            "# HELP ziniao_phase_seconds 打开店铺/初始化各阶段耗时",
+            "# TYPE ziniao_phase_seconds summary",
+        ]
+        for key, (samples, total, count) in sorted(merged.items()):
+            labels = dict(key)
+            samples.sort()
+            for q in QUANTILES:
+                lines.append(f"ziniao_phase_seconds{_format_labels({**labels, 'quantile': q})} "
+                             f"{percentile(samples, q):.6f}")
+            lines.append(f"ziniao_phase_seconds_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"ziniao_phase_seconds_count{_format_labels(labels)} {count}")
+
+        merged_counters = {}
+        for (name, labels), value in counters:
+            if not include_store:
+                labels = tuple((k, v) for k, v in labels if k != "store")
+            merged_counters[(name, labels)] = merged_counters.get((name, labels), 0) + value
+        declared = set()
+        for (name, labels), value in sorted(merged_counters.items()):
+            metric = f"ziniao_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(dict(labels))} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_jsonl(self, path: str, by_store: bool = False):
+        """把当前的分位数统计和计数写成 JSON lines 文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for name, stat in self.summary(by_store).items():
+                f.write(json.dumps({"type": "summary", "name": name, "value": stat}, ensure_ascii=False) + '\n')
+            for name, values in self.counters().items():
+                for labels, value in values.items():
+                    f.write(json.dumps({"type": "counter", "name": name, "labels": dict(labels), "value": value},
+                                       ensure_ascii=False) + '\n')
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+_default_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """默认的统计注册表"""
+    return _default_metrics
@@ -0,0 +1,148 @@
+"""
+网络事件采集
+后台线程持续读取 performance 日志（或订阅 CDPSession 的网络事件），按事件类型和URL过滤，
+只解析匹配的条目，保存在固定长度的环形缓冲区里或交给回调处理，长时间运行的店铺内存不会一直增长
+
+需要在打开店铺时开启采集：open_store_by_name(..., capture_network=True)
+
+示例：
+
+    with PerformanceLogConsumer(store["driver"], url_patterns=[r"/api/orders"]) as consumer:
+        store["driver"].get("https://sellercentral.amazon.com/orders")
+        ...
+        for event in consumer.drain():
+            print(event["params"]["response"]["url"])
+"""
+import json
+import re
+import threading
+from collections import deque
+
+from logger import logger
+from cdp_client import CDPSession
+
+DEFAULT_EVENT_TYPES = ("Network.responseReceived",)
+
+
+def _event_url(params: dict):
+    request = params.get("request") or params.get("response")
+    if request:
+        return request.get("url")
+    return params.get("url")
+
+
+class PerformanceLogConsumer:
+    """网络事件采集器"""
+
+    def __init__(self, driver, url_patterns=None, event_types=DEFAULT_EVENT_TYPES, maxlen: int = 1000,
+                 callback=None, interval: float = 1.0):
+        """
+        :param driver: 开启了 performance 日志的 selenium driver，或 CDPSession
+        :param url_patterns: URL正则列表，为None时不按URL过滤
+        :param event_types: 采集的CDP事件类型
+        :param maxlen: 环形缓冲区长度，超出后丢弃最早的事件
+        :param callback: 每个匹配的事件调用一次 callback(event)，设置后事件不再放入缓冲区
+        :param interval: 读取 performance 日志的间隔（秒）
+        """
+        self.driver = driver
+        self.event_types = frozenset(event_types)
+        self.url_patterns = [re.compile(pattern) for pattern in url_patterns] if url_patterns else None
+        self.callback = callback
+        self.interval = interval
+        self.dropped = 0
+        self._buffer = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cdp_handlers = {}
+        # 事件类型的原始字符串，用来在json解析前快速跳过不相关的条目
+        self._method_markers = tuple(f'"{event_type}"' for event_type in self.event_types)
+
+    def _match_url(self, url) -> bool:
+        if self.url_patterns is None:
+            return True
+        return url is not None and any(pattern.search(url) for pattern in self.url_patterns)
+
+    def _accept(self, event: dict):
+        if self.callback is not None:
+            try:
+                self.callback(event)
+            except Exception as e:
+                logger.warning(f"网络事件回调异常: {e}")
+            return
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(event)
+
+    def _handle_raw(self, raw: str):
+        if not any(marker in raw for marker in self._method_markers):
+            return
+        message = json.loads(raw).get("message") or {}
+        method = message.get("method")
+        params = message.get("params") or {}
+        if method in self.event_types and self._match_url(_event_url(params)):
+            self._accept({"method": method, "params": params})
+
+    def _handle_cdp_event(self, method):
+        def handler(params):
+            if self._match_url(_event_url(params)):
+                self._accept({"method": method, "params": params})
+        return handler
+
+    def poll(self):
+        """读取一次 performance 日志（selenium模式）"""
+        for entry in self.driver.get_log('performance'):
+            try:
+                self._handle_raw(entry.get("message", ""))
+            except ValueError:
+                continue
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"读取performance日志失败，停止采集: {e}")
+                return
+
+    def start(self):
+        if isinstance(self.driver, CDPSession):
+            self._cdp_handlers = {method: self._handle_cdp_event(method) for method in self.event_types}
+            for method, handler in self._cdp_handlers.items():
+                self.driver.on(method, handler)
+            self.driver.enable_network()
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='perf-log-consumer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if isinstance(self.driver, CDPSession):
+            for method, handler in self._cdp_handlers.items():
+                self.driver.off(method, handler)
+            self._cdp_handlers = {}
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+    def events(self) -> list:
+        """当前缓冲区中的事件（不清空）"""
+        with self._lock:
+            return list(self._buffer)
+
+    def drain(self) -> list:
+        """取出并清空缓冲区中的事件"""
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+        return events
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
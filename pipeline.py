@@ -0,0 +1,175 @@
+"""
+店铺任务流水线：打开 -> 运行任务 -> 关闭（在finally中），同时在线的浏览器不超过 max_live 个
+不像 open_stores_by_names 那样先把整批店铺全部打开，批量再大内存占用也只与 max_live 有关
+
+示例：
+
+    def task(store_info):
+        store_info["driver"].get("https://sellercentral.amazon.com/orders-v3")
+        return store_info["driver"].title
+
+    for result in run_pipeline(store_names, task, browser_list, max_live=5):
+        print(result["store_name"], result["status"], result["result"])
+
+    async for result in run_pipeline_async(store_names, async_task, browser_list, max_live=20):
+        ...
+"""
+import asyncio
+import inspect
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from logger import logger, log_context
+from typings import PipelineResult
+from ziniao_client import get_client
+from ziniao_func import (
+    _resolve_directory, _use_one_browser_run_task, close_store_info, DRIVER_MODE_SELENIUM,
+)
+
+
+def _result(store_name, status, result=None, error=None, started=None) -> PipelineResult:
+    return {
+        "store_name": store_name,
+        "status": status,
+        "result": result,
+        "error": error,
+        "elapsed": round(time.monotonic() - started, 3) if started is not None else 0.0,
+    }
+
+
+def _run_one(browser, task, is_headless: bool, driver_mode: str, capture_network: bool) -> PipelineResult:
+    store_name = browser.get("browserName")
+    started = time.monotonic()
+    store_info = _use_one_browser_run_task(browser, is_headless, driver_mode, capture_network)
+    if not store_info:
+        return _result(store_name, "open_failed", started=started)
+    try:
+        with log_context(store=store_name, store_id=store_info.get("store_id")):
+            return _result(store_name, "ok", task(store_info), started=started)
+    except Exception as e:
+        logger.error(f"店铺 {store_name} 的任务异常:" + traceback.format_exc())
+        return _result(store_name, "task_failed", error=f"{type(e).__name__}: {e}", started=started)
+    finally:
+        try:
+            close_store_info(store_info)
+        except Exception as e:
+            logger.warning(f"关闭店铺 {store_name} 失败: {e}")
+
+
+def _select(directory, store_names):
+    selected, missing = directory.find(store_names)
+    if missing:
+        logger.warning(f"店铺不存在：{missing}")
+    return selected, missing
+
+
+def run_pipeline(store_names: list, task, browser_list=None, max_live: int = 5, is_headless: bool = False,
+                 driver_mode: str = DRIVER_MODE_SELENIUM, capture_network: bool = False):
+    """
+    逐个店铺 打开 -> 运行任务 -> 关闭，按完成顺序返回结果
+    :param store_names: 店铺名称列表
+    :param task: 任务函数 (StoreInfo) -> 任意返回值，异常会记录到结果的 error 中
+    :param browser_list: 已获取的店铺列表或 StoreDirectory，为None时初始化客户端并获取
+    :param max_live: 同时在线的浏览器数量上限（同时也是线程数）
+    :param is_headless: 是否无头模式
+    :param driver_mode: selenium / cdp
+    :param capture_network: 是否开启performance日志
+    :return: PipelineResult 生成器；提前停止迭代时不再打开新店铺，正在运行的店铺运行完后关闭
+    """
+    directory = _resolve_directory(browser_list)
+    selected, missing = _select(directory, store_names)
+    for store_name in missing:
+        yield _result(store_name, "missing", error="店铺不存在")
+    if not selected:
+        return
+    get_client().ensure_pool_size(max_live)
+    pending = iter(selected)
+    running = set()
+    executor = ThreadPoolExecutor(max_workers=max_live, thread_name_prefix='pipeline')
+    try:
+        while True:
+            # 只提交能立即运行的店铺，生成器被丢弃时不会有排队中的店铺继续被打开
+            while len(running) < max_live:
+                browser = next(pending, None)
+                if browser is None:
+                    break
+                running.add(executor.submit(_run_one, browser, task, is_headless, driver_mode, capture_network))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        if running:
+            logger.warning(f"流水线提前结束，等待 {len(running)} 个运行中的店铺关闭")
+        executor.shutdown(wait=True)
+
+
+async def _run_one_async(client, browser, task, is_headless: bool) -> PipelineResult:
+    store_name = browser.get("browserName")
+    started = time.monotonic()
+    store_info = await client.open_store(browser, is_headless)
+    if not store_info:
+        return _result(store_name, "open_failed", started=started)
+    try:
+        with log_context(store=store_name, store_id=store_info.get("store_id")):
+            if inspect.iscoroutinefunction(task):
+                value = await task(store_info)
+            else:
+                value = await client.run_blocking(task, store_info)
+        return _result(store_name, "ok", value, started=started)
+    except Exception as e:
+        logger.error(f"店铺 {store_name} 的任务异常:" + traceback.format_exc())
+        return _result(store_name, "task_failed", error=f"{type(e).__name__}: {e}", started=started)
+    finally:
+        try:
+            await client.close_store(store_info["store_id"], store_info.get("driver"))
+        except Exception as e:
+            logger.warning(f"关闭店铺 {store_name} 失败: {e}")
+
+
+async def run_pipeline_async(store_names: list, task, browser_list=None, max_live: int = 20,
+                             is_headless: bool = False, client=None):
+    """
+    run_pipeline 的asyncio版本
+    :param task: 协程函数 async (StoreInfo) -> 返回值；普通函数会放到客户端的线程池中执行
+    :param browser_list: 已获取的店铺列表或 StoreDirectory，不传则初始化客户端并获取
+    :param max_live: 同时在线的浏览器数量上限
+    :param client: 复用已有的 AsyncZiniaoClient，不传则临时创建
+    :return: PipelineResult 异步生成器
+    """
+    from async_ziniao_client import AsyncZiniaoClient
+    from store_directory import as_store_directory
+    from ziniao_func import _init_process
+
+    own_client = client is None
+    if own_client:
+        client = AsyncZiniaoClient()
+    running = set()
+    try:
+        if browser_list is None:
+            await asyncio.get_running_loop().run_in_executor(None, _init_process)
+            logger.info("=====获取店铺列表=====")
+            browser_list = await client.get_browser_list()
+        selected, missing = _select(as_store_directory(browser_list), store_names)
+        for store_name in missing:
+            yield _result(store_name, "missing", error="店铺不存在")
+        pending = iter(selected)
+        while True:
+            while len(running) < max_live:
+                browser = next(pending, None)
+                if browser is None:
+                    break
+                running.add(asyncio.ensure_future(_run_one_async(client, browser, task, is_headless)))
+            if not running:
+                break
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        if running:
+            logger.warning(f"流水线提前结束，等待 {len(running)} 个运行中的店铺关闭")
+            await asyncio.gather(*running, return_exceptions=True)
+        if own_client:
+            await client.close()
@@ -0,0 +1,113 @@
+"""
+就绪探测
+用带退避的轮询代替固定的 sleep：条件满足立即返回，最多等到截止时间，并记录每个阶段的实际耗时
+"""
+import platform
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+
+from logger import logger
+from metrics import get_metrics
+
+# WebDriverWait 的轮询间隔（秒），默认的0.5秒会让每次等待平均多花0.25秒
+WAIT_POLL_FREQUENCY = 0.1
+
+
+def wait_until(predicate, timeout: float, initial_interval: float = 0.05, max_interval: float = 1.0,
+               factor: float = 1.5) -> bool:
+    """
+    轮询直到 predicate 返回真值，轮询间隔按 factor 指数增长到 max_interval
+    :param predicate: 判断函数，抛出异常视为未满足
+    :param timeout: 截止时间（秒）
+    :return: 是否在截止前满足
+    """
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+    while True:
+        try:
+            if predicate():
+                return True
+        except Exception:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
+
+
+def is_port_open(port, host: str = '127.0.0.1', timeout: float = 0.5) -> bool:
+    """端口是否已经在监听"""
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_port(port, timeout: float = 60, host: str = '127.0.0.1') -> bool:
+    """等待端口开始监听"""
+    return wait_until(lambda: is_port_open(port, host), timeout)
+
+
+def is_process_running(process_name: str) -> bool:
+    """按进程名判断进程是否还在运行"""
+    if platform.system() == 'Windows':
+        ret = subprocess.run(
+            ['tasklist', '/FI', f'IMAGENAME eq {process_name}', '/NH'],
+            capture_output=True,
+            text=True,
+        )
+        return process_name.lower() in ret.stdout.lower()
+    ret = subprocess.run(['pgrep', '-x', process_name], capture_output=True)
+    return ret.returncode == 0
+
+
+def wait_for_process_exit(process_name: str, timeout: float = 10) -> bool:
+    """等待进程退出"""
+    return wait_until(lambda: not is_process_running(process_name), timeout, initial_interval=0.1)
+
+
+class PhaseTimer:
+    """
+    记录各阶段耗时
+
+        timer = PhaseTimer("启动", kind="init")
+        with timer.phase("start_client"):
+            ...
+        timer.report()
+    """
+
+    def __init__(self, name: str = '', kind: str = None, store: str = None):
+        """
+        :param name: 日志中显示的名称
+        :param kind: 设置后每个阶段的耗时同时记录到 metrics（如 store_open / init）
+        :param store: 店铺名称，记录到 metrics 的 store 维度
+        """
+        self.name = name
+        self.kind = kind
+        self.store = store
+        self.durations = {}
+
+    @contextmanager
+    def phase(self, phase_name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[phase_name] = self.durations.get(phase_name, 0.0) + elapsed
+            if self.kind:
+                get_metrics().observe(self.kind, phase_name, elapsed, self.store)
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations.values())
+
+    def report(self) -> dict:
+        """日志输出各阶段耗时，并返回 {阶段: 秒数}"""
+        detail = ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in self.durations.items())
+        logger.info(f"{self.name}耗时 {self.total:.2f}s: {detail}")
+        return dict(self.durations)
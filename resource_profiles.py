@@ -0,0 +1,172 @@
+"""
+店铺浏览器的资源加载配置
+大多数自动化只需要DOM和XHR数据，图片、字体、音视频和第三方统计脚本都要经过店铺代理下载，拖慢页面加载。
+连接店铺浏览器时（_get_driver / CDP模式连接后）按配置屏蔽这些请求：
+- url_patterns：Network.setBlockedURLs 的通配符规则（selenium和CDP模式都支持）
+- resource_types：按资源类型屏蔽。CDP模式用 Fetch 拦截（Fetch.requestPaused -> Fetch.failRequest）；
+  selenium模式收不到CDP事件，换算成对应扩展名的 url_patterns
+
+内置配置：full（不屏蔽，默认）、light（图片/字体/音视频/统计脚本）、minimal（再加上样式表）。
+默认配置取 ZINIAO_RESOURCE_PROFILE；ZINIAO_RESOURCE_PROFILES_FILE 可以自定义配置和按店铺指定：
+
+    {
+        "profiles": {"scrape": {"extends": "light", "url_patterns": ["*://*.example-ads.com/*"]}},
+        "stores": {"AMZ-1": "scrape", "AMZ-VIP": "full"}
+    }
+
+代码中按店铺指定：set_store_profile("AMZ-1", "minimal")
+"""
+import json
+import threading
+
+from logger import logger
+from config import ZINIAO_CONFIG
+from cdp_client import CDPSession
+
+# selenium模式下资源类型对应的扩展名
+RESOURCE_TYPE_EXTENSIONS = {
+    "Image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"],
+    "Font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "Media": ["mp4", "webm", "mp3", "m4a", "ogg", "wav", "m3u8", "ts"],
+    "Stylesheet": ["css"],
+}
+
+# 常见的第三方统计/广告
+TRACKER_PATTERNS = [
+    "*://*.google-analytics.com/*",
+    "*://*.googletagmanager.com/*",
+    "*://*.doubleclick.net/*",
+    "*://*.googlesyndication.com/*",
+    "*://*.facebook.net/*",
+    "*://*.hotjar.com/*",
+    "*://*.clarity.ms/*",
+    "*://bat.bing.com/*",
+]
+
+PROFILES = {
+    "full": {},
+    "light": {"resource_types": ["Image", "Font", "Media"], "url_patterns": TRACKER_PATTERNS},
+    "minimal": {"resource_types": ["Image", "Font", "Media", "Stylesheet"], "url_patterns": TRACKER_PATTERNS},
+}
+
+_lock = threading.Lock()
+_custom_profiles = None
+_store_profiles = {}
+
+
+def _load_file():
+    """读取 ZINIAO_RESOURCE_PROFILES_FILE（只读一次）"""
+    global _custom_profiles
+    if _custom_profiles is not None:
+        return
+    with _lock:
+        if _custom_profiles is not None:
+            return
+        profiles, stores = {}, {}
+        path = ZINIAO_CONFIG['resource_profiles_file']
+        if path:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                profiles = data.get("profiles") or {}
+                stores = data.get("stores") or {}
+            except (OSError, ValueError) as e:
+                logger.error(f"读取资源配置文件 {path} 失败: {e}")
+        for store_name, name in stores.items():
+            _store_profiles.setdefault(store_name, name)
+        _custom_profiles = profiles
+
+
+def set_store_profile(store_name: str, profile):
+    """指定店铺使用的资源配置（名称或配置字典），None表示恢复默认"""
+    _load_file()
+    with _lock:
+        if profile is None:
+            _store_profiles.pop(store_name, None)
+        else:
+            _store_profiles[store_name] = profile
+
+
+def get_profile(profile) -> dict:
+    """
+    :param profile: 配置名称或配置字典（可用 "extends" 继承其他配置）
+    :return: {"resource_types": [...], "url_patterns": [...]}
+    """
+    _load_file()
+    seen = set()
+    resource_types, url_patterns = [], []
+    while profile:
+        if isinstance(profile, str):
+            if profile in seen:
+                break
+            seen.add(profile)
+            name = profile
+            profile = _custom_profiles.get(name, PROFILES.get(name))
+            if profile is None:
+                logger.warning(f"资源配置 {name} 不存在，不屏蔽")
+                break
+        resource_types += [t for t in profile.get("resource_types") or [] if t not in resource_types]
+        url_patterns += [p for p in profile.get("url_patterns") or [] if p not in url_patterns]
+        profile = profile.get("extends")
+    return {"resource_types": resource_types, "url_patterns": url_patterns}
+
+
+def resolve_profile(store_name: str = None) -> dict:
+    """店铺使用的资源配置：按店铺指定的，否则为 ZINIAO_RESOURCE_PROFILE"""
+    _load_file()
+    with _lock:
+        profile = _store_profiles.get(store_name) if store_name else None
+    return get_profile(profile or ZINIAO_CONFIG['resource_profile'] or "full")
+
+
+def _extension_patterns(resource_types) -> list:
+    patterns = []
+    for resource_type in resource_types:
+        for ext in RESOURCE_TYPE_EXTENSIONS.get(resource_type, []):
+            patterns += [f"*.{ext}", f"*.{ext}?*"]
+    return patterns
+
+
+def apply_resource_profile(target, profile) -> bool:
+    """
+    在已连接的店铺页面上应用资源配置
+    :param target: selenium driver 或 CDPSession
+    :param profile: 配置名称、配置字典或 get_profile/resolve_profile 的结果
+    :return: 是否屏蔽了请求
+    """
+    if not isinstance(profile, dict) or set(profile) - {"resource_types", "url_patterns"}:
+        profile = get_profile(profile)
+    resource_types = profile.get("resource_types") or []
+    url_patterns = list(profile.get("url_patterns") or [])
+    if not resource_types and not url_patterns:
+        return False
+    try:
+        if isinstance(target, CDPSession):
+            if url_patterns:
+                target.send("Network.enable")
+                target.send("Network.setBlockedURLs", {"urls": url_patterns})
+            if resource_types:
+                blocked = set(resource_types)
+
+                def on_paused(params):
+                    # 只拦截了这些资源类型，其余请求不会暂停
+                    if params.get("resourceType") in blocked:
+                        target.send_nowait("Fetch.failRequest",
+                                           {"requestId": params["requestId"], "errorReason": "BlockedByClient"})
+                    else:
+                        target.send_nowait("Fetch.continueRequest", {"requestId": params["requestId"]})
+
+                target.on("Fetch.requestPaused", on_paused)
+                target.send("Fetch.enable", {"patterns": [
+                    {"urlPattern": "*", "resourceType": resource_type, "requestStage": "Request"}
+                    for resource_type in resource_types
+                ]})
+        else:
+            url_patterns += _extension_patterns(resource_types)
+            target.execute_cdp_cmd("Network.enable", {})
+            target.execute_cdp_cmd("Network.setBlockedURLs", {"urls": url_patterns})
+    except Exception as e:
+        logger.warning(f"应用资源配置失败: {e}")
+        return False
+    logger.debug(f"已屏蔽资源类型 {resource_types}，{len(url_patterns)} 条url规则")
+    return True
@@ -0,0 +1,370 @@
+"""
+多进程分片运行大量店铺（命令行）
+- 协调进程只初始化一次客户端（_init_process）并获取一次店铺列表，按名称列表/文件/正则筛选店铺
+- 店铺放进跨进程的任务队列，由多个工作进程领取，每个工作进程内再用线程池并发打开店铺、运行任务、关闭店铺
+- 所有进程共用一个限流器（ProcessThrottle）访问客户端端口：限制 startBrowser 的速率和同时进行中的数量
+- 每个店铺的结果实时发回协调进程，汇总进度并写入 JSON lines 结果文件
+
+示例：
+
+    python runner.py --filter "^AMZ-" --workers 8 --threads 4 --task my_tasks:check_orders --output results.jsonl
+    python runner.py --stores-file stores.txt --driver-mode cdp --headless --rate 2 --max-in-flight 8
+
+任务函数接收 StoreInfo，返回值（可JSON序列化）写入结果文件；不指定任务时只打开并关闭店铺：
+
+    def check_orders(store_info):
+        store_info["driver"].get("https://sellercentral.amazon.com/orders-v3")
+        return {"title": store_info["driver"].title}
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from logger import logger
+from config import configure
+from store_directory import as_store_directory
+
+# 工作进程退出的标记
+_STOP = None
+
+
+class ProcessThrottle:
+    """
+    跨进程的客户端请求限流：令牌桶限制每秒发起的请求数，信号量限制同时进行中的请求数
+    只对 actions 中的请求生效，作为 ZiniaoClient(throttle=...) 使用；需在创建工作进程前创建并作为参数传入
+    """
+
+    def __init__(self, rate: float = 2, burst: int = 4, max_in_flight: int = 8, actions=("startBrowser",),
+                 ctx=None):
+        """
+        :param rate: 每秒最多发起的请求数，<=0 表示不限
+        :param burst: 令牌桶容量（允许的瞬时突发数）
+        :param max_in_flight: 同时进行中的请求数上限，<=0 表示不限
+        :param actions: 需要限流的 action
+        :param ctx: multiprocessing 上下文
+        """
+        ctx = ctx or multiprocessing.get_context()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.actions = frozenset(actions)
+        self._lock = ctx.Lock()
+        self._tokens = ctx.Value('d', float(self.burst), lock=False)
+        self._updated = ctx.Value('d', time.monotonic(), lock=False)
+        self._slots = ctx.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    def _take_token(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(self.burst, self._tokens.value + (now - self._updated.value) * self.rate)
+                self._updated.value = now
+                if tokens >= 1:
+                    self._tokens.value = tokens - 1
+                    return
+                self._tokens.value = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+    @contextmanager
+    def __call__(self, action: str):
+        if action not in self.actions:
+            yield
+            return
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            self._take_token()
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+def load_task(spec: str):
+    """按 "模块:函数" 加载任务函数，为空时返回None"""
+    if not spec:
+        return None
+    module_name, _, func_name = spec.partition(':')
+    if not func_name:
+        raise ValueError(f"任务格式应为 模块:函数，实际为 {spec}")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _json_safe(value):
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def _run_store(browser, task, options: dict) -> dict:
+    """在工作进程中打开一个店铺、运行任务并关闭"""
+    from ziniao_func import _use_one_browser_run_task, close_store_info
+
+    store_name = browser.get("browserName")
+    started = time.monotonic()
+    record = {"store_name": store_name, "store_id": browser.get("browserOauth"), "status": "failed",
+              "open_elapsed": None, "elapsed": None, "result": None, "error": None}
+    store_info = None
+    try:
+        store_info = _use_one_browser_run_task(browser, options["headless"], options["driver_mode"])
+        record["open_elapsed"] = round(time.monotonic() - started, 3)
+        if store_info:
+            record["result"] = _json_safe(task(store_info)) if task else None
+            record["status"] = "ok"
+    except Exception as e:
+        logger.exception(f"运行店铺 {store_name} 的任务失败")
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if store_info:
+            try:
+                close_store_info(store_info)
+            except Exception as e:
+                logger.warning(f"关闭店铺 {store_name} 失败: {e}")
+    record["elapsed"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def _worker_main(index: int, task_queue, result_queue, stop_event, throttle: ProcessThrottle, options: dict):
+    """工作进程入口：线程池从任务队列领取店铺，结果放进结果队列"""
+    from ziniao_client import create_client, set_client
+    from shutdown import install_shutdown_hooks
+
+    # 同一个日志文件不能被多个进程同时轮转，每个工作进程单独一个目录
+    # 工作进程打开的店铺都会在本进程内关闭，不写店铺记录（多个进程同时写同一个文件会互相覆盖）
+    configure(env_file=options["env_file"], log_dir=os.path.join(options["log_dir"], f"worker-{index}"),
+              log_console=False, **{"session_journal": "", **options["overrides"]})
+    threads = options["threads"]
+    # 与协调进程相同的客户端配置（包括多实例 ZINIAO_SOCKET_PORTS / ZINIAO_ACCOUNTS_FILE）
+    set_client(create_client(pool_size=threads, throttle=throttle))
+    task = load_task(options["task"])
+    pid = os.getpid()
+    # 中断时关闭本进程打开的店铺，客户端由协调进程管理
+    install_shutdown_hooks(exit_client=False)
+
+    def consume():
+        while not stop_event.is_set():
+            browser = task_queue.get()
+            if browser is _STOP:
+                break
+            result_queue.put({"type": "started", "worker": index, "store_name": browser.get("browserName")})
+            record = _run_store(browser, task, options)
+            record.update(type="done", worker=index, pid=pid)
+            result_queue.put(record)
+
+    pool = [threading.Thread(target=consume, name=f"runner-{index}-{i}") for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    result_queue.put({"type": "exit", "worker": index})
+
+
+def select_browsers(browser_list: list, names=None, pattern: str = None, limit: int = None) -> tuple[list, list]:
+    """
+    筛选店铺
+    :param names: 店铺名称列表，None表示不按名称筛选
+    :param pattern: 店铺名称的正则（re.search）
+    :param limit: 最多返回的店铺数量
+    :return: (店铺列表, 不存在的店铺名称)
+    """
+    missing = []
+    if names is not None:
+        # 与 open_stores_by_names 相同的名称匹配规则（精确匹配优先，其次忽略大小写）
+        found, missing = as_store_directory(browser_list).find(list(dict.fromkeys(names)))
+        selected = list({id(browser): browser for browser in found}.values())
+    else:
+        selected = list(browser_list)
+    if pattern:
+        regex = re.compile(pattern)
+        selected = [browser for browser in selected if regex.search(browser.get("browserName") or "")]
+    if limit:
+        selected = selected[:limit]
+    return selected, missing
+
+
+def _read_names(args) -> list:
+    if args.stores is None and args.stores_file is None:
+        return None
+    names = list(args.stores or [])
+    if args.stores_file:
+        with open(args.stores_file, encoding='utf-8') as f:
+            names.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return names
+
+
+class _Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.started = 0
+        self.ok = 0
+        self.failed = 0
+        self.running = 0
+        self.began = time.monotonic()
+
+    @property
+    def done(self) -> int:
+        return self.ok + self.failed
+
+    def update(self, event: dict):
+        if event["type"] == "started":
+            self.started += 1
+            self.running += 1
+        elif event["type"] == "done":
+            self.running -= 1
+            if event["status"] == "ok":
+                self.ok += 1
+            else:
+                self.failed += 1
+
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.began
+        rate = self.done / elapsed if elapsed > 0 else 0
+        return (f"进度 {self.done}/{self.total}：成功 {self.ok}，失败 {self.failed}，运行中 {self.running}，"
+                f"{rate:.2f} 店铺/秒，已用 {elapsed:.0f} 秒")
+
+
+def run(browsers: list, workers: int = None, threads: int = 4, task: str = None, is_headless: bool = False,
+        driver_mode: str = 'selenium', rate: float = 2, burst: int = 4, max_in_flight: int = 8,
+        output: str = None, env_file: str = None, log_dir: str = './logs', progress_interval: float = 10,
+        **overrides) -> dict:
+    """
+    协调进程：把店铺分给多个工作进程运行，汇总结果（客户端需已初始化）
+    :param browsers: 要运行的店铺列表（getBrowserList 的元素）
+    :param workers: 工作进程数，默认CPU核数（不超过店铺数）
+    :param threads: 每个工作进程的线程数
+    :param task: 任务函数 "模块:函数"，为空时只打开并关闭店铺
+    :param rate: 所有进程合计每秒最多发起的 startBrowser 数
+    :param max_in_flight: 所有进程合计同时进行中的 startBrowser 数
+    :param output: JSON lines 结果文件，每个店铺完成时写入一行
+    :param progress_interval: 输出进度的间隔（秒）
+    :param overrides: 传给工作进程 configure() 的配置项
+    :return: 汇总 {"total", "ok", "failed", "elapsed", "failed_stores"}
+    """
+    load_task(task)  # 提前检查任务能否导入
+    total = len(browsers)
+    workers = max(1, min(workers or os.cpu_count() or 1, total or 1))
+    # 工作进程统一用spawn（与Windows一致），不继承协调进程的线程和连接
+    ctx = multiprocessing.get_context('spawn')
+    throttle = ProcessThrottle(rate, burst, max_in_flight, ctx=ctx)
+    task_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    options = {"threads": threads, "task": task, "headless": is_headless, "driver_mode": driver_mode,
+               "env_file": env_file, "log_dir": log_dir, "overrides": overrides}
+    for browser in browsers:
+        task_queue.put(browser)
+    for _ in range(workers * threads):
+        task_queue.put(_STOP)
+
+    logger.info(f"开始运行 {total} 个店铺：{workers} 个进程 x {threads} 个线程，"
+                f"startBrowser 限速 {rate}/秒，最多同时 {max_in_flight} 个")
+    processes = [ctx.Process(target=_worker_main, name=f"runner-{i}", daemon=True,
+                             args=(i, task_queue, result_queue, stop_event, throttle, options))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    progress = _Progress(total)
+    failed_stores = []
+    exited = set()
+    out = open(output, 'a', encoding='utf-8') if output else None
+    next_report = time.monotonic() + progress_interval
+    try:
+        while len(exited) < workers:
+            try:
+                event = result_queue.get(timeout=1)
+            except queue.Empty:
+                dead = [i for i, p in enumerate(processes) if i not in exited and not p.is_alive()]
+                for i in dead:
+                    logger.error(f"工作进程 {i} 异常退出，退出码 {processes[i].exitcode}")
+                    exited.add(i)
+                event = None
+            if event is not None:
+                if event["type"] == "exit":
+                    exited.add(event["worker"])
+                else:
+                    progress.update(event)
+                if event["type"] == "done":
+                    if event["status"] != "ok":
+                        failed_stores.append(event["store_name"])
+                    if out:
+                        out.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+                        out.flush()
+            if time.monotonic() >= next_report:
+                logger.info(progress.line())
+                next_report = time.monotonic() + progress_interval
+    except KeyboardInterrupt:
+        logger.warning("收到中断，工作进程处理完当前店铺后退出")
+        stop_event.set()
+        raise
+    finally:
+        if out:
+            out.close()
+        for process in processes:
+            process.join(timeout=5 if stop_event.is_set() else None)
+
+    logger.info(progress.line())
+    summary = {
+        "total": total,
+        "ok": progress.ok,
+        "failed": progress.failed,
+        # 工作进程异常退出时未运行的店铺
+        "not_run": total - progress.done,
+        "elapsed": round(time.monotonic() - progress.began, 3),
+        "failed_stores": failed_stores,
+    }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程分片运行店铺任务")
+    parser.add_argument("--stores", nargs="*", help="店铺名称")
+    parser.add_argument("--stores-file", help="店铺名称文件，每行一个，#开头为注释")
+    parser.add_argument("--filter", help="店铺名称正则，在 getBrowserList 的结果中筛选")
+    parser.add_argument("--limit", type=int, help="最多运行的店铺数量")
+    parser.add_argument("--task", help="任务函数，格式 模块:函数，参数为 StoreInfo")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="工作进程数，默认CPU核数")
+    parser.add_argument("--threads", type=int, default=4, help="每个工作进程的线程数")
+    parser.add_argument("--driver-mode", choices=("selenium", "cdp"), default="selenium")
+    parser.add_argument("--headless", action="store_true", help="无头模式")
+    parser.add_argument("--rate", type=float, default=2, help="每秒最多发起的 startBrowser 数（所有进程合计）")
+    parser.add_argument("--burst", type=int, default=4, help="startBrowser 允许的瞬时突发数")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="同时进行中的 startBrowser 数（所有进程合计）")
+    parser.add_argument("--output", help="JSON lines 结果文件")
+    parser.add_argument("--env-file", help=".env 文件路径")
+    parser.add_argument("--log-dir", default="./logs", help="日志目录，工作进程写入其中的 worker-<n> 子目录")
+    parser.add_argument("--skip-init", action="store_true", help="客户端已启动时跳过初始化（下载驱动、重启客户端、更新内核）")
+    parser.add_argument("--progress-interval", type=float, default=10, help="输出进度的间隔（秒）")
+    args = parser.parse_args(argv)
+
+    configure(env_file=args.env_file, log_dir=args.log_dir)
+    from ziniao_func import _init_process, _get_browser_list
+
+    if not args.skip_init:
+        _init_process()
+    logger.info("=====获取店铺列表=====")
+    browsers, missing = select_browsers(_get_browser_list(), _read_names(args), args.filter, args.limit)
+    if missing:
+        logger.warning(f"店铺不存在：{missing}")
+    if not browsers:
+        logger.warning("没有要运行的店铺")
+        return 1
+    summary = run(browsers, args.workers, args.threads, args.task, args.headless, args.driver_mode, args.rate,
+                  args.burst, args.max_in_flight, args.output, args.env_file, args.log_dir, args.progress_interval)
+    logger.info(f"运行完成：{json.dumps(summary, ensure_ascii=False)}")
+    return 0 if not summary["failed"] and not summary["not_run"] else 2
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
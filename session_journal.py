@@ -0,0 +1,252 @@
+"""
+打开店铺的落盘记录，用于进程崩溃后重新连接
+Python进程意外退出时，已打开的店铺仍在紫鸟客户端中运行。每个打开的店铺记录
+店铺id、debuggingPort、内核版本、打开时间、浏览器的DevTools标识和打开它的进程id，重启后：
+- 打开它的进程还在运行时不接管（同一目录下同时运行的其他脚本正在使用）
+- 调试端口还在监听、且 /json/version 返回的浏览器标识与记录一致（不是端口被其他浏览器复用），
+  就直接连接 driver/CDP，不再调用 startBrowser
+- 校验不通过的记录直接删除
+
+默认不记录，ZINIAO_SESSION_JOURNAL 设置记录文件路径后启用（建议使用绝对路径，每个项目一个文件）。
+记录变化后合并在 SAVE_DELAY 秒内整体原子替换一次，不在锁内写文件。
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from logger import logger
+from config import ZINIAO_CONFIG
+from cdp_client import _get_json
+
+# 校验调试端口的超时（秒）
+VALIDATE_TIMEOUT = 2
+# 记录变化后延迟写入的秒数，期间的多次变化合并成一次写入
+SAVE_DELAY = 0.5
+
+
+def _pid_alive(pid) -> bool:
+    """进程是否还在运行（无法判断时按在运行处理，不接管）"""
+    try:
+        pid = int(pid)
+    except (TypeError, ValueError):
+        return False
+    if pid <= 0:
+        return False
+    try:
+        import psutil
+
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # 没有权限打开的进程也是存在的
+            return kernel32.GetLastError() == 5
+        try:
+            code = ctypes.c_ulong()
+            # STILL_ACTIVE = 259
+            return not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) or code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _devtools_version(port, timeout: float = VALIDATE_TIMEOUT):
+    """调试端口的 /json/version，端口不可用时返回None"""
+    try:
+        return _get_json(f"http://127.0.0.1:{port}/json/version", timeout)
+    except Exception:
+        return None
+
+
+def _browser_id(version: dict):
+    """浏览器级别的WebSocket地址中的id，每次启动浏览器都不同"""
+    url = (version or {}).get("webSocketDebuggerUrl") or ""
+    return url.rsplit('/', 1)[-1] or None
+
+
+class SessionJournal:
+    """store_id -> {store_id, store_name, debugging_port, core_version, opened_at, browser_id, pid}，线程安全"""
+
+    def __init__(self, path: str, save_delay: float = SAVE_DELAY):
+        """
+        :param path: 记录文件路径
+        :param save_delay: 记录变化后延迟写入的秒数，0 表示每次变化立即写入
+        """
+        self.path = path
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        # 串行化写文件，与 _lock 分开，写文件时不阻塞 record/remove
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        self._timer = None
+        # store_id -> remove 的次数、clear 的次数：record 在锁外请求调试端口期间店铺被删除时不再写回
+        self._removals = {}
+        self._clears = 0
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return {str(entry["store_id"]): entry for entry in json.load(f)}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"读取店铺记录 {self.path} 失败，忽略: {e}")
+            return {}
+
+    def _changed(self) -> bool:
+        """
+        在 _lock 内调用：标记有变化并安排一次延迟写入
+        :return: 是否需要调用方在锁外立即 flush（不延迟，或无法创建定时线程时）
+        """
+        self._version += 1
+        if self._timer is not None:
+            return False
+        if self.save_delay <= 0:
+            return True
+        timer = threading.Timer(self.save_delay, self.flush)
+        timer.daemon = True
+        try:
+            timer.start()
+        except RuntimeError:
+            # 解释器退出过程中不能再创建线程
+            return True
+        self._timer = timer
+        return False
+
+    def flush(self):
+        """立即把未写入的变化写到文件"""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if self._version == self._saved_version:
+                    return
+                version = self._version
+                data = json.dumps(list(self._entries.values()), ensure_ascii=False, separators=(',', ':'))
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"写入店铺记录 {self.path} 失败: {e}")
+                return
+            with self._lock:
+                self._saved_version = max(self._saved_version, version)
+
+    def record(self, store_id, store_name: str = None, debugging_port=None, core_version: str = None):
+        """记录或更新一个打开的店铺（记录为本进程打开）"""
+        if store_id is None:
+            return
+        key = str(store_id)
+        with self._lock:
+            entry = dict(self._entries.get(key) or {"store_id": store_id, "opened_at": time.time()})
+            entry["pid"] = os.getpid()
+            if store_name is not None:
+                entry["store_name"] = store_name
+            if core_version is not None:
+                entry["core_version"] = core_version
+            if debugging_port is not None and debugging_port != entry.get("debugging_port"):
+                entry["debugging_port"] = debugging_port
+                entry["browser_id"] = None
+            if entry == self._entries.get(key):
+                return
+            removals = (self._removals.get(key, 0), self._clears)
+        if entry.get("debugging_port") and not entry.get("browser_id"):
+            # 在锁外请求本机调试端口
+            entry["browser_id"] = _browser_id(_devtools_version(entry["debugging_port"]))
+        with self._lock:
+            if (self._removals.get(key, 0), self._clears) != removals:
+                # 请求期间店铺已关闭（remove/clear），写回会留下已失效的记录
+                return
+            self._entries[key] = entry
+            flush = self._changed()
+        if flush:
+            self.flush()
+
+    def remove(self, store_id):
+        key = str(store_id)
+        with self._lock:
+            self._removals[key] = self._removals.get(key, 0) + 1
+            if self._entries.pop(key, None) is None:
+                return
+            flush = self._changed()
+        if flush:
+            self.flush()
+
+    def get(self, store_id) -> dict:
+        with self._lock:
+            entry = self._entries.get(str(store_id))
+            return dict(entry) if entry else None
+
+    def entries(self) -> list:
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+            self._changed()
+        self.flush()
+
+    @staticmethod
+    def owned_by_other_process(entry: dict) -> bool:
+        """记录是否属于另一个仍在运行的进程（不能接管）"""
+        pid = entry.get("pid")
+        return pid is not None and pid != os.getpid() and _pid_alive(pid)
+
+    @staticmethod
+    def validate(entry: dict) -> bool:
+        """调试端口是否还在、是否还是同一个浏览器"""
+        port = entry.get("debugging_port")
+        if not port:
+            return False
+        version = _devtools_version(port)
+        if version is None:
+            return False
+        if entry.get("browser_id") and _browser_id(version) != entry["browser_id"]:
+            logger.info(f"端口 {port} 上已经不是店铺 {entry.get('store_name') or entry['store_id']} 的浏览器")
+            return False
+        core_version = entry.get("core_version")
+        browser = version.get("Browser") or ""
+        if core_version and '/' in browser and browser.split('/', 1)[1].split('.')[0] != core_version.split('.')[0]:
+            return False
+        return True
+
+
+_default_journal = None
+_default_journal_lock = threading.Lock()
+_disabled = object()
+
+
+def get_session_journal():
+    """默认的店铺记录（路径取配置 ZINIAO_SESSION_JOURNAL），未启用时返回None"""
+    global _default_journal
+    if _default_journal is None:
+        with _default_journal_lock:
+            if _default_journal is None:
+                path = ZINIAO_CONFIG['session_journal']
+                if path:
+                    _default_journal = SessionJournal(path)
+                    # 写入未到期的变化
+                    atexit.register(_default_journal.flush)
+                else:
+                    _default_journal = _disabled
+    return None if _default_journal is _disabled else _default_journal
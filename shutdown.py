@@ -0,0 +1,298 @@
+"""
+批量关闭店铺和退出清理
+- SessionRegistry：记录本进程通过本库打开的所有店铺（startBrowser 成功时登记，stopBrowser 时注销）
+- shutdown_stores：并发关闭店铺，有总的截止时间，超时的店铺直接结束浏览器/chromedriver进程，最后退出客户端
+- install_shutdown_hooks：收到 SIGINT/SIGTERM 或进程退出时自动关闭所有打开的店铺，避免残留Chromium和chromedriver进程
+
+示例：
+
+    install_shutdown_hooks(deadline=30)
+    stores = open_stores_by_names(store_names, browser_list)
+    ...
+    shutdown_stores(deadline=30)
+"""
+import atexit
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from logger import logger
+from session_journal import get_session_journal
+
+is_windows = sys.platform == 'win32'
+
+# 单个店铺 stopBrowser 的最长等待秒数（不超过剩余的截止时间）
+STOP_BROWSER_TIMEOUT = 15
+
+
+class SessionRegistry:
+    """
+    store_id -> 打开的店铺信息（store_id、store_name、debugging_port、driver/cdp），线程安全
+    启用了店铺记录（ZINIAO_SESSION_JOURNAL）时同步写入，用于崩溃后重新连接
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def register(self, store_id, store_name: str = None, debugging_port=None, core_version: str = None):
+        """startBrowser 成功后登记"""
+        if store_id is None:
+            return
+        with self._lock:
+            session = self._sessions.setdefault(str(store_id), {"store_id": store_id})
+            if store_name is not None:
+                session["store_name"] = store_name
+            if debugging_port is not None:
+                session["debugging_port"] = debugging_port
+        journal = get_session_journal()
+        if journal is not None:
+            journal.record(store_id, store_name, debugging_port, core_version)
+
+    def attach(self, store_id, driver=None, cdp=None):
+        """连接上店铺浏览器后记录 driver 或 CDPSession"""
+        with self._lock:
+            session = self._sessions.get(str(store_id))
+            if session is None:
+                return
+            if driver is not None:
+                session["driver"] = driver
+            if cdp is not None:
+                session["cdp"] = cdp
+
+    def unregister(self, store_id):
+        with self._lock:
+            self._sessions.pop(str(store_id), None)
+        journal = get_session_journal()
+        if journal is not None:
+            journal.remove(store_id)
+
+    def sessions(self) -> list:
+        with self._lock:
+            return [dict(session) for session in self._sessions.values()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+_registry = SessionRegistry()
+
+
+def get_session_registry() -> SessionRegistry:
+    return _registry
+
+
+def _pids_listening_on(port) -> list:
+    """监听该端口的进程id（店铺浏览器的调试端口）"""
+    try:
+        if is_windows:
+            ret = subprocess.run(['netstat', '-ano', '-p', 'TCP'], capture_output=True, text=True, timeout=10)
+            pids = set()
+            for line in ret.stdout.splitlines():
+                parts = line.split()
+                if len(parts) >= 5 and parts[3] == 'LISTENING' and parts[1].endswith(f':{port}'):
+                    pids.add(int(parts[4]))
+            return list(pids)
+        ret = subprocess.run(['lsof', '-nP', f'-iTCP:{port}', '-sTCP:LISTEN', '-t'],
+                             capture_output=True, text=True, timeout=10)
+        return [int(pid) for pid in ret.stdout.split() if pid.isdigit()]
+    except Exception as e:
+        logger.warning(f"查找端口 {port} 的进程失败: {e}")
+        return []
+
+
+def _kill_pid(pid: int):
+    """强制结束进程（Windows下连同子进程）"""
+    if pid == os.getpid():
+        return
+    try:
+        if is_windows:
+            subprocess.run(['taskkill', '/f', '/t', '/pid', str(pid)], capture_output=True, timeout=10)
+        else:
+            os.kill(pid, signal.SIGKILL)
+        logger.info(f"已结束进程 {pid}")
+    except Exception as e:
+        logger.warning(f"结束进程 {pid} 失败: {e}")
+
+
+def _kill_session(session: dict):
+    """关闭超时的店铺：结束独立的chromedriver进程和店铺浏览器进程"""
+    driver = session.get("driver")
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    if process is not None:
+        # 共享的chromedriver没有process属性，由 DriverServiceManager.shutdown 停止
+        try:
+            process.kill()
+        except Exception as e:
+            logger.warning(f"结束chromedriver进程失败: {e}")
+    cdp = session.get("cdp")
+    if cdp is not None:
+        try:
+            cdp.close()
+        except Exception:
+            pass
+    port = session.get("debugging_port")
+    if port:
+        for pid in _pids_listening_on(port):
+            _kill_pid(pid)
+
+
+def _close_session(session: dict, deadline: float):
+    from ziniao_func import _send_http
+    from ziniao_client import build_stop_browser_payload, check_result
+
+    store_id = session["store_id"]
+    timeout = max(0.5, min(STOP_BROWSER_TIMEOUT, deadline - time.monotonic()))
+    result = check_result("stopBrowser", _send_http(build_stop_browser_payload(store_id), timeout=timeout))
+    if str(result.get("statusCode")) == "0":
+        _registry.unregister(store_id)
+    driver = session.get("driver") or session.get("cdp")
+    if driver is not None:
+        driver.quit()
+    return str(result.get("statusCode")) == "0"
+
+
+def shutdown_stores(store_infos: list = None, deadline: float = 30, exit_client: bool = True,
+                    max_workers: int = 16) -> dict:
+    """
+    并发关闭店铺
+    :param store_infos: 要关闭的 StoreInfo 列表，默认关闭本进程打开的所有店铺
+    :param deadline: 总的截止时间（秒），到时仍未关闭的店铺直接结束进程
+    :param exit_client: 最后是否退出紫鸟客户端（_get_exit）
+    :param max_workers: 最大并发数
+    :return: {"closed": [店铺], "killed": [店铺], "failed": [店铺]}
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    started = time.monotonic()
+    end = started + deadline
+    sessions = _registry.sessions() if store_infos is None else [dict(store_info) for store_info in store_infos]
+    summary = {"closed": [], "killed": [], "failed": []}
+    if sessions:
+        logger.info(f"=====关闭 {len(sessions)} 个店铺（截止 {deadline} 秒）=====")
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(sessions)), thread_name_prefix='shutdown')
+        futures = {executor.submit(_close_session, session, end): session for session in sessions}
+        done, not_done = wait(futures, timeout=max(0.0, end - time.monotonic()))
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            session = futures[future]
+            name = session.get("store_name") or session["store_id"]
+            try:
+                ok = future.result()
+            except Exception as e:
+                logger.warning(f"关闭店铺 {name} 异常: {e}")
+                ok = False
+            if ok:
+                summary["closed"].append(name)
+            else:
+                # stopBrowser 失败，浏览器可能还在运行
+                _kill_session(session)
+                _registry.unregister(session["store_id"])
+                summary["failed"].append(name)
+        for future in not_done:
+            session = futures[future]
+            name = session.get("store_name") or session["store_id"]
+            logger.warning(f"关闭店铺 {name} 超时，结束进程")
+            _kill_session(session)
+            _registry.unregister(session["store_id"])
+            summary["killed"].append(name)
+    if 'driver_service' in sys.modules:
+        # 只有用过共享chromedriver时才需要停止（避免在这里导入selenium）
+        sys.modules['driver_service'].get_driver_service_manager().shutdown()
+    journal = get_session_journal()
+    if journal is not None:
+        journal.flush()
+    if exit_client:
+        from ziniao_func import _get_exit
+
+        _get_exit(timeout=max(1.0, min(10.0, end - time.monotonic())))
+    logger.info(f"关闭完成，耗时 {time.monotonic() - started:.2f}s：成功 {len(summary['closed'])}，"
+                f"结束进程 {len(summary['killed'])}，失败 {len(summary['failed'])}")
+    return summary
+
+
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+_shutdown_done = threading.Event()
+_shutdown_finished = threading.Event()
+# 信号处理函数只设置这个事件，清理在 shutdown-watcher 线程中执行
+_signal_received = threading.Event()
+_received_signals = []
+
+
+def _run_shutdown_once(deadline: float, exit_client: bool):
+    with _hooks_lock:
+        if _shutdown_done.is_set():
+            return
+        _shutdown_done.set()
+    try:
+        if len(_registry) or exit_client:
+            shutdown_stores(deadline=deadline, exit_client=exit_client)
+    except Exception as e:
+        logger.error(f"退出清理异常: {e}")
+    finally:
+        _shutdown_finished.set()
+
+
+def _watch_signals(deadline: float, exit_client: bool):
+    _signal_received.wait()
+    names = ", ".join(signal.Signals(signum).name for signum in _received_signals)
+    logger.warning(f"收到信号 {names}，关闭所有店铺")
+    _run_shutdown_once(deadline, exit_client)
+
+
+def _at_exit(deadline: float, exit_client: bool):
+    if _shutdown_done.is_set():
+        # 收到信号后已经在 shutdown-watcher 线程中清理，等它完成（守护线程在进程退出时会被直接结束）
+        _shutdown_finished.wait(deadline + 15)
+        return
+    _run_shutdown_once(deadline, exit_client)
+
+
+def install_shutdown_hooks(deadline: float = 30, exit_client: bool = True, signals=None) -> bool:
+    """
+    收到信号或进程退出时关闭本进程打开的所有店铺（只清理一次）
+    信号处理函数中只做标记并照常抛出 KeyboardInterrupt/SystemExit，关闭店铺在单独的线程中进行：
+    主线程被信号打断时可能正持有日志、店铺登记等锁，在信号处理函数里直接清理会死锁
+    原来忽略的信号（SIG_IGN）只关闭店铺，不抛出异常，进程继续运行
+    必须在主线程调用
+    :param deadline: 清理的截止时间（秒）
+    :param exit_client: 清理后是否退出紫鸟客户端
+    :param signals: 要处理的信号，默认 SIGINT、SIGTERM（Windows下还有 SIGBREAK）
+    :return: 是否安装成功（重复调用返回False）
+    """
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return False
+        _hooks_installed = True
+    if signals is None:
+        signals = [signal.SIGINT, signal.SIGTERM]
+        if hasattr(signal, 'SIGBREAK'):
+            signals.append(signal.SIGBREAK)
+    threading.Thread(target=_watch_signals, args=(deadline, exit_client), name='shutdown-watcher',
+                     daemon=True).start()
+    for signum in signals:
+        previous = signal.getsignal(signum)
+
+        def handler(received, frame, previous=previous):
+            _received_signals.append(received)
+            _signal_received.set()
+            if callable(previous):
+                previous(received, frame)
+            elif previous == signal.SIG_IGN:
+                # 宿主程序有意忽略该信号，不结束进程
+                return
+            elif received == signal.SIGINT:
+                raise KeyboardInterrupt
+            else:
+                raise SystemExit(128 + received)
+
+        signal.signal(signum, handler)
+    atexit.register(_at_exit, deadline, exit_client)
+    return True
@@ -0,0 +1,205 @@
+"""
+店铺目录
+缓存 getBrowserList 的结果，按店铺名称、小写名称、browserOauth/browserId 建立索引，
+避免每次打开店铺都重新拉取店铺列表并逐个比对
+"""
+import json
+import os
+import threading
+import time
+
+from logger import logger
+
+
+class StoreDirectory:
+    """
+    带TTL的店铺列表缓存
+    多个线程同时刷新时只会请求一次客户端，其余线程等待并复用结果
+    """
+
+    def __init__(self, fetch=None, ttl: float = 300, snapshot_path: str = None, miss_refresh_interval: float = 10):
+        """
+        :param fetch: 获取店铺列表的函数，默认 ziniao_func._get_browser_list
+        :param ttl: 缓存有效期（秒）
+        :param snapshot_path: 店铺列表快照文件路径，设置后每次刷新都会落盘，下次启动直接加载
+        :param miss_refresh_interval: 查找不到店铺时，距上次刷新超过该秒数才会重新拉取（防止新店铺找不到）
+        """
+        if fetch is None:
+            from ziniao_func import _get_browser_list
+            fetch = _get_browser_list
+        self._fetch = fetch
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.miss_refresh_interval = miss_refresh_interval
+        self._refresh_lock = threading.Lock()
+        self._browsers = []
+        self._by_name = {}
+        self._by_lower_name = {}
+        self._by_id = {}
+        self._loaded_at = 0.0
+        if snapshot_path:
+            self._load_snapshot()
+
+    @classmethod
+    def from_list(cls, browser_list: list) -> 'StoreDirectory':
+        """用已获取的店铺列表构造目录（不会再自动刷新）"""
+        directory = cls(fetch=lambda: browser_list, ttl=float('inf'), miss_refresh_interval=float('inf'))
+        directory._set_browsers(browser_list, time.time())
+        return directory
+
+    def _set_browsers(self, browser_list: list, loaded_at: float):
+        by_name, by_lower_name, by_id = {}, {}, {}
+        for browser in browser_list:
+            name = browser.get("browserName")
+            if name is not None:
+                by_name.setdefault(name, browser)
+                by_lower_name.setdefault(name.lower(), browser)
+            for key in ("browserOauth", "browserId"):
+                store_id = browser.get(key)
+                if store_id is not None:
+                    by_id.setdefault(str(store_id), browser)
+        # 整体替换引用，读的一方不需要加锁
+        self._browsers = list(browser_list)
+        self._by_name, self._by_lower_name, self._by_id = by_name, by_lower_name, by_id
+        self._loaded_at = loaded_at
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._set_browsers(snapshot.get("browserList") or [], float(snapshot.get("savedAt", 0)))
+            logger.info(f"已加载店铺列表快照：{len(self._browsers)} 个店铺")
+        except Exception as e:
+            logger.warning(f"加载店铺列表快照失败: {e}")
+
+    def _save_snapshot(self):
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            folder = os.path.dirname(self.snapshot_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"savedAt": self._loaded_at, "browserList": self._browsers}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"保存店铺列表快照失败: {e}")
+
+    @property
+    def age(self) -> float:
+        """距上次刷新的秒数"""
+        return time.time() - self._loaded_at
+
+    def is_fresh(self) -> bool:
+        return bool(self._loaded_at) and self.age < self.ttl
+
+    def refresh(self, force: bool = False):
+        """
+        刷新店铺列表
+        :param force: 是否忽略TTL强制刷新
+        """
+        requested_at = time.time()
+        with self._refresh_lock:
+            # 等锁期间别的线程已经刷新过了，直接复用
+            if self._loaded_at >= requested_at:
+                return
+            if not force and self.is_fresh():
+                return
+            browser_list = self._fetch()
+            if not browser_list and self._browsers:
+                logger.warning("店铺列表刷新结果为空，继续使用旧的缓存")
+                return
+            self._set_browsers(browser_list or [], time.time())
+            if self.snapshot_path:
+                self._save_snapshot()
+
+    def _ensure_fresh(self):
+        if not self.is_fresh():
+            self.refresh()
+
+    def _lookup_with_refresh(self, lookup):
+        self._ensure_fresh()
+        browser = lookup()
+        if browser is None and self.age >= self.miss_refresh_interval:
+            self.refresh(force=True)
+            browser = lookup()
+        return browser
+
+    def _lookup_name(self, store_name: str):
+        return self._by_name.get(store_name) or self._by_lower_name.get(store_name.lower())
+
+    def get_by_name(self, store_name: str):
+        """
+        根据店铺名称查找，优先精确匹配，其次忽略大小写匹配
+        :return: 店铺信息，不存在返回None
+        """
+        return self._lookup_with_refresh(lambda: self._lookup_name(store_name))
+
+    def get_by_id(self, store_id):
+        """
+        根据 browserOauth 或 browserId 查找
+        :return: 店铺信息，不存在返回None
+        """
+        return self._lookup_with_refresh(lambda: self._by_id.get(str(store_id)))
+
+    def find(self, store_names: list):
+        """
+        批量查找店铺
+        :param store_names: 店铺名称列表
+        :return: (找到的店铺信息列表, 找不到的店铺名称列表)
+        """
+        self._ensure_fresh()
+        found, missing = [], []
+        for name in store_names:
+            browser = self._lookup_name(name)
+            if browser is None:
+                missing.append(name)
+            else:
+                found.append(browser)
+        if missing and self.age >= self.miss_refresh_interval:
+            self.refresh(force=True)
+            retry, missing = missing, []
+            for name in retry:
+                browser = self._lookup_name(name)
+                if browser is None:
+                    missing.append(name)
+                else:
+                    found.append(browser)
+        return found, missing
+
+    def browsers(self) -> list:
+        """全部店铺信息"""
+        self._ensure_fresh()
+        return list(self._browsers)
+
+    def __len__(self):
+        return len(self._browsers)
+
+
+_default_directory = None
+_default_directory_lock = threading.Lock()
+
+
+def get_store_directory() -> StoreDirectory:
+    """获取默认的店铺目录（懒加载创建）"""
+    global _default_directory
+    if _default_directory is None:
+        with _default_directory_lock:
+            if _default_directory is None:
+                _default_directory = StoreDirectory()
+    return _default_directory
+
+
+def set_store_directory(directory: StoreDirectory):
+    """替换默认的店铺目录，例如设置快照路径或TTL"""
+    global _default_directory
+    with _default_directory_lock:
+        _default_directory = directory
+
+
+def as_store_directory(browser_list) -> StoreDirectory:
+    """把店铺列表或店铺目录统一转换成店铺目录"""
+    if isinstance(browser_list, StoreDirectory):
+        return browser_list
+    return StoreDirectory.from_list(browser_list)
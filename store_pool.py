@@ -0,0 +1,263 @@
+"""
+店铺会话池
+打开过的店铺保持在线，下次使用同一个店铺时直接借出，省去 startBrowser、连接driver、ip检测等完整的打开流程
+
+示例：
+
+    pool = StorePool(max_live=10, idle_timeout=600)
+    with pool.session("AMZ-TEST") as store:
+        if store:
+            store["driver"].get("https://sellercentral.amazon.com/")
+    ...
+    pool.close_all()
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from logger import logger
+from store_directory import get_store_directory, as_store_directory
+from typings import StoreInfo
+from ziniao_func import _use_one_browser_run_task, close_store_info
+
+OPENING = 'opening'
+IDLE = 'idle'
+LEASED = 'leased'
+
+
+class _PoolEntry:
+    __slots__ = ('key', 'store_info', 'state', 'last_used')
+
+    def __init__(self, key):
+        self.key = key
+        self.store_info = None
+        self.state = OPENING
+        self.last_used = time.monotonic()
+
+
+def default_health_check(store_info: StoreInfo) -> bool:
+    """店铺浏览器和driver都还能响应则认为可用"""
+    try:
+        if store_info.get("driver") is None:
+            return store_info["cdp"].evaluate("1") == 1
+        return store_info["driver"].execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+class StorePool:
+    """
+    店铺会话池，借出/归还语义，同一个店铺同一时间只会借给一个使用方
+    在线店铺数达到上限时，优先关闭最久未使用的空闲店铺
+    """
+
+    def __init__(self, max_live: int = 10, idle_timeout: float = 600, is_headless: bool = False,
+                 browser_list=None, open_func=None, health_check=default_health_check):
+        """
+        :param max_live: 同时在线（含借出中）的店铺浏览器数量上限
+        :param idle_timeout: 空闲超过该秒数的店铺会被关闭
+        :param is_headless: 是否无头模式打开店铺
+        :param browser_list: 店铺列表或 StoreDirectory，默认使用默认店铺目录
+        :param open_func: 打开店铺的函数 (browser, is_headless) -> StoreInfo，默认 _use_one_browser_run_task
+        :param health_check: 借出前的健康检查 (StoreInfo) -> bool，为None时不检查
+        """
+        self.max_live = max_live
+        self.idle_timeout = idle_timeout
+        self.is_headless = is_headless
+        self._directory = get_store_directory() if browser_list is None else as_store_directory(browser_list)
+        self._open_func = open_func or _use_one_browser_run_task
+        self._health_check = health_check
+        self._cond = threading.Condition()
+        # key -> _PoolEntry，按最近使用时间排序，最前面的是最久未使用的
+        self._entries = OrderedDict()
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'unhealthy': 0, 'open_failures': 0}
+
+    def _close_entries(self, entries, reason):
+        for entry in entries:
+            store_info = entry.store_info
+            if store_info is None:
+                continue
+            logger.info(f"=====关闭店铺({reason})：{store_info.get('store_name')}=====")
+            try:
+                close_store_info(store_info)
+            except Exception as e:
+                logger.warning(f"关闭店铺 {store_info.get('store_name')} 异常: {e}")
+
+    def _pop_idle_expired(self) -> list:
+        now = time.monotonic()
+        expired = [entry for entry in self._entries.values()
+                   if entry.state == IDLE and now - entry.last_used >= self.idle_timeout]
+        for entry in expired:
+            del self._entries[entry.key]
+        return expired
+
+    def _pop_lru_idle(self):
+        for entry in self._entries.values():
+            if entry.state == IDLE:
+                del self._entries[entry.key]
+                return entry
+        return None
+
+    def lease(self, store_name: str, timeout: float = None):
+        """
+        借出一个店铺，没有在线的会话时打开店铺
+        :param store_name: 店铺名称
+        :param timeout: 等待该店铺被归还或空出名额的最长秒数，None表示一直等待
+        :return: StoreInfo，店铺不存在、打开失败或超时返回None
+        """
+        browser = self._directory.get_by_name(store_name)
+        if browser is None:
+            logger.warning(f"店铺不存在：{store_name}")
+            return None
+        key = browser.get("browserOauth") or str(browser.get("browserId"))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        to_close = []
+        closed = False
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("StorePool已关闭")
+            to_close.extend(self._pop_idle_expired())
+            while True:
+                # 等待期间池可能已被 close_all 关闭，此时不能再打开新的店铺
+                if self._closed:
+                    closed = True
+                    entry = None
+                    break
+                entry = self._entries.get(key)
+                if entry is not None and entry.state == IDLE:
+                    entry.state = LEASED
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    break
+                if entry is None:
+                    if len(self._entries) < self.max_live:
+                        entry = self._new_entry(key)
+                        break
+                    victim = self._pop_lru_idle()
+                    if victim is not None:
+                        self.stats['evictions'] += 1
+                        to_close.append(victim)
+                        entry = self._new_entry(key)
+                        break
+                # 该店铺正在被使用/正在打开，或者名额已满且没有空闲店铺，等待归还
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    entry = None
+                    break
+                self._cond.wait(remaining)
+
+        self._close_entries(to_close, "空闲回收")
+        if closed:
+            raise RuntimeError("StorePool已关闭")
+        if entry is None:
+            logger.warning(f"等待店铺 {store_name} 超时")
+            return None
+        if entry.store_info is not None:
+            if self._health_check is None or self._health_check(entry.store_info):
+                return entry.store_info
+            logger.warning(f"店铺 {store_name} 会话不可用，重新打开")
+            self.stats['unhealthy'] += 1
+            self._close_entries([entry], "会话失效")
+            entry.store_info = None
+        return self._open_entry(entry, browser)
+
+    def _new_entry(self, key) -> _PoolEntry:
+        entry = _PoolEntry(key)
+        self._entries[key] = entry
+        self.stats['misses'] += 1
+        return entry
+
+    def _open_entry(self, entry: _PoolEntry, browser):
+        store_info = None
+        try:
+            store_info = self._open_func(browser, self.is_headless)
+        finally:
+            with self._cond:
+                if store_info is None:
+                    self.stats['open_failures'] += 1
+                    self._entries.pop(entry.key, None)
+                else:
+                    entry.store_info = store_info
+                    entry.state = LEASED
+                self._cond.notify_all()
+        return store_info
+
+    def release(self, store_info: StoreInfo, discard: bool = False):
+        """
+        归还店铺
+        :param store_info: lease 返回的店铺信息
+        :param discard: 是否直接关闭该店铺（例如任务中发现页面状态异常）
+        """
+        to_close = []
+        with self._cond:
+            entry = next((e for e in self._entries.values() if e.store_info is store_info), None)
+            if entry is None:
+                # 不在池中的店铺（池已关闭或已被回收），直接关闭
+                to_close.append(_detached_entry(store_info))
+            elif discard or self._closed:
+                del self._entries[entry.key]
+                to_close.append(entry)
+            else:
+                entry.state = IDLE
+                entry.last_used = time.monotonic()
+            to_close.extend(self._pop_idle_expired())
+            self._cond.notify_all()
+        self._close_entries(to_close, "归还")
+
+    @contextmanager
+    def session(self, store_name: str, timeout: float = None):
+        """
+        with 语句借出店铺，退出时自动归还；任务抛出异常时关闭该店铺而不是放回池中
+        :return: StoreInfo 或 None
+        """
+        store_info = self.lease(store_name, timeout)
+        try:
+            yield store_info
+        except BaseException:
+            if store_info is not None:
+                self.release(store_info, discard=True)
+                store_info = None
+            raise
+        finally:
+            if store_info is not None:
+                self.release(store_info)
+
+    def evict_idle(self) -> int:
+        """
+        关闭空闲超时的店铺，可定时调用
+        :return: 关闭的数量
+        """
+        with self._cond:
+            expired = self._pop_idle_expired()
+            if expired:
+                self._cond.notify_all()
+        self._close_entries(expired, "空闲超时")
+        return len(expired)
+
+    def live_count(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def close_all(self):
+        """关闭池中所有空闲店铺，借出中的店铺在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = [entry for entry in self._entries.values() if entry.state == IDLE]
+            for entry in idle:
+                del self._entries[entry.key]
+            self._cond.notify_all()
+        self._close_entries(idle, "关闭池")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close_all()
+
+
+def _detached_entry(store_info) -> _PoolEntry:
+    entry = _PoolEntry(store_info.get("store_id"))
+    entry.store_info = store_info
+    return entry
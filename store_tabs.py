@@ -0,0 +1,182 @@
+"""
+同一个店铺内多标签页并发执行
+打开店铺后只有一个driver操作一个标签页，同一店铺的多个页面只能依次处理。
+StoreTabs 在同一个店铺浏览器里通过 Target.createTarget 新建最多 max_tabs 个标签页，
+每个标签页一个独立的 CDPSession，多个页面任务在这些标签页上并发执行，不需要再调用 startBrowser。
+selenium模式和CDP模式打开的店铺都可以使用（通过 StoreInfo["debugging_port"] 连接）。
+
+示例：
+
+    with StoreTabs(store_info, max_tabs=4) as tabs:
+        for result in tabs.map_urls(urls, lambda tab, url: tab.evaluate("document.title")):
+            print(result["item"], result["result"])
+
+        results = tabs.run([
+            lambda tab: tab.navigate("https://sellercentral.amazon.com/orders-v3"),
+            lambda tab: tab.navigate("https://sellercentral.amazon.com/inventory"),
+        ])
+"""
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import logger, log_context
+from cdp_client import CDPSession
+from resource_profiles import apply_resource_profile, resolve_profile
+from typings import StoreInfo
+
+
+class StoreTabs:
+    """一个店铺浏览器中的标签页池"""
+
+    def __init__(self, store_info: StoreInfo, max_tabs: int = 4, host: str = '127.0.0.1', timeout: float = 30):
+        """
+        :param store_info: open_store_by_name 等返回的店铺信息（需要 debugging_port）
+        :param max_tabs: 最多同时打开的标签页数
+        :param timeout: CDP命令默认超时（秒）
+        """
+        self.port = store_info.get("debugging_port")
+        if not self.port:
+            raise ValueError("StoreInfo 中没有 debugging_port")
+        self.store_name = store_info.get("store_name")
+        self.max_tabs = max(1, max_tabs)
+        self.host = host
+        self.timeout = timeout
+        self._browser = None
+        self._idle = queue.SimpleQueue()
+        self._tabs = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_tabs)
+        self.closed = False
+
+    def _browser_session(self) -> CDPSession:
+        with self._lock:
+            if self._browser is None or self._browser.closed:
+                self._browser = CDPSession.connect_browser(self.port, self.host, self.timeout)
+            return self._browser
+
+    def _open_tab(self) -> CDPSession:
+        target_id = self._browser_session().send("Target.createTarget", {"url": "about:blank"})["targetId"]
+        try:
+            tab = CDPSession(f"ws://{self.host}:{self.port}/devtools/page/{target_id}", self.timeout)
+        except Exception:
+            self._close_target(target_id)
+            raise
+        tab.target_id = target_id
+        # 新标签页不会继承店铺页面的请求屏蔽设置
+        apply_resource_profile(tab, resolve_profile(self.store_name))
+        with self._lock:
+            self._tabs.append(tab)
+        return tab
+
+    def _close_target(self, target_id):
+        try:
+            self._browser_session().send("Target.closeTarget", {"targetId": target_id}, timeout=5)
+        except Exception as e:
+            logger.warning(f"关闭标签页 {target_id} 失败: {e}")
+
+    def _close_tab(self, tab: CDPSession):
+        with self._lock:
+            if tab in self._tabs:
+                self._tabs.remove(tab)
+        tab.close()
+        self._close_target(tab.target_id)
+
+    def acquire(self) -> CDPSession:
+        """借出一个标签页（没有空闲的标签页且未达到上限时新建，达到上限时等待）"""
+        if self.closed:
+            raise RuntimeError("StoreTabs 已关闭")
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    tab = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open_tab()
+                if not tab.closed:
+                    return tab
+                self._close_tab(tab)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, tab: CDPSession, discard: bool = False):
+        """归还标签页，discard=True 或会话已断开时关闭该标签页"""
+        if discard or tab.closed or self.closed:
+            self._close_tab(tab)
+        else:
+            self._idle.put(tab)
+        self._slots.release()
+
+    def _run_one(self, func, item) -> dict:
+        tab = self.acquire()
+        discard = False
+        try:
+            with log_context(store=self.store_name, tab=tab.target_id):
+                result = func(tab, item)
+            return {"item": item, "ok": True, "result": result, "error": None}
+        except Exception as e:
+            logger.error(f"店铺 {self.store_name} 的标签页任务异常:" + traceback.format_exc())
+            # 出错的标签页可能停在任意状态，不再复用
+            discard = True
+            return {"item": item, "ok": False, "result": None, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.release(tab, discard)
+
+    def _execute(self, func, items):
+        items = list(items)
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_tabs, len(items)),
+                                thread_name_prefix='store-tabs') as executor:
+            futures = [executor.submit(self._run_one, func, item) for item in items]
+            for future in futures:
+                yield future.result()
+
+    def map(self, func, items):
+        """
+        在多个标签页上并发执行 func(tab, item)
+        :return: 按 items 顺序的结果生成器 {"item", "ok", "result", "error"}
+        """
+        return self._execute(func, items)
+
+    def run(self, tasks) -> list:
+        """
+        在多个标签页上并发执行 task(tab)
+        :return: 按 tasks 顺序的结果列表 {"item": task, "ok", "result", "error"}
+        """
+        return list(self._execute(lambda tab, task: task(tab), tasks))
+
+    def map_urls(self, urls, func=None, wait_until: str = "load", timeout: float = 30):
+        """
+        每个标签页打开一个url并等待加载完成，然后执行 func(tab, url)
+        :param func: 不传时结果为是否加载完成
+        """
+        def visit(tab, url):
+            loaded = tab.navigate(url, wait_until, timeout)
+            if func is None:
+                return loaded
+            if not loaded:
+                logger.warning(f"等待页面加载超时: {url}")
+            return func(tab, url)
+
+        return self.map(visit, urls)
+
+    def close(self):
+        """关闭所有新建的标签页（店铺原有的标签页不受影响）"""
+        self.closed = True
+        with self._lock:
+            tabs = list(self._tabs)
+        for tab in tabs:
+            self._close_tab(tab)
+        with self._lock:
+            browser, self._browser = self._browser, None
+        if browser is not None:
+            browser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,348 @@
+"""
+店铺资源看门狗
+长时间运行的店铺浏览器内存会不断增长，最终拖垮整台机器。StoreWatchdog 定期采样每个店铺的内存和CPU：
+- 进程列表和CPU时间来自浏览器的 SystemInfo.getProcessInfo（通过 debuggingPort）
+- 内存为这些进程（以及独立的chromedriver进程）的RSS之和，安装了psutil时用psutil，Linux下读 /proc；
+  都不可用时退化为页面的 Performance.getMetrics（JS堆大小）
+超出单店铺预算（连续 grace 次）或整机预算时，回收最严重的店铺：关闭（_close_store）后重新打开。
+每次回收都会记录事件（events()、on_recycle 回调、metrics 计数 store_recycle）。
+
+示例：
+
+    watchdog = StoreWatchdog(store_budget_mb=1500, host_budget_mb=24000, on_recycle=print).start()
+    for store_info in open_stores_by_names(store_names, browser_list):
+        watchdog.watch(store_info)
+    ...
+    with watchdog.using("AMZ-1") as store_info:   # 使用期间不会被回收，回收后要重新取最新的 StoreInfo
+        store_info["driver"].get(url)
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from logger import logger, log_context
+from cdp_client import CDPSession
+from metrics import get_metrics
+from typings import StoreInfo
+
+_KB = 1024
+_MB = 1024 * 1024
+
+
+def _rss_psutil(pids) -> int:
+    import psutil
+
+    total = 0
+    for pid in pids:
+        try:
+            total += psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+def _rss_proc(pids) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", encoding='ascii', errors='ignore') as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * _KB
+                        break
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def _rss_reader():
+    """按平台选择读取进程内存的方式，都不可用时返回None"""
+    try:
+        import psutil  # noqa: F401
+
+        return _rss_psutil
+    except ImportError:
+        pass
+    if os.path.isdir("/proc/self"):
+        return _rss_proc
+    return None
+
+
+class _Watched:
+    __slots__ = ('store_info', 'reopen', 'browser', 'last_cpu', 'violations', 'busy', 'sample')
+
+    def __init__(self, store_info, reopen):
+        self.store_info = store_info
+        self.reopen = reopen
+        self.browser = None
+        self.last_cpu = None
+        self.violations = 0
+        self.busy = 0
+        self.sample = None
+
+
+class StoreWatchdog:
+    """监控已打开店铺的内存/CPU，超出预算时关闭并重新打开"""
+
+    def __init__(self, store_budget_mb: float = None, host_budget_mb: float = None, cpu_budget: float = None,
+                 interval: float = 30, grace: int = 2, on_recycle=None, is_headless: bool = False,
+                 driver_mode: str = None, max_events: int = 1000):
+        """
+        :param store_budget_mb: 单个店铺（浏览器+chromedriver进程树）的内存预算（MB）
+        :param host_budget_mb: 所有被监控店铺合计的内存预算（MB），超出时回收占用最多的店铺
+        :param cpu_budget: 单个店铺的CPU预算（百分比，100表示一个核）
+        :param interval: 采样间隔（秒）
+        :param grace: 单店铺预算连续超出多少次才回收，避免瞬时峰值
+        :param on_recycle: 回收事件回调 (event) -> None
+        :param is_headless: 默认的重新打开方式所用的无头模式
+        :param driver_mode: 默认的重新打开方式所用的模式，默认按原 StoreInfo 是否有 cdp 判断
+        :param max_events: 保留的回收事件数
+        """
+        self.store_budget = store_budget_mb * _MB if store_budget_mb else None
+        self.host_budget = host_budget_mb * _MB if host_budget_mb else None
+        self.cpu_budget = cpu_budget
+        self.interval = interval
+        self.grace = max(1, grace)
+        self.on_recycle = on_recycle
+        self.is_headless = is_headless
+        self.driver_mode = driver_mode
+        self._rss = _rss_reader()
+        self._watched = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, store_info: StoreInfo, reopen=None):
+        """
+        开始监控一个店铺
+        :param reopen: 重新打开的函数 () -> StoreInfo，默认按店铺名称从店铺目录中查找后重新打开
+        """
+        with self._lock:
+            self._watched[store_info["store_name"]] = _Watched(store_info, reopen)
+
+    def unwatch(self, store_name: str) -> StoreInfo:
+        """停止监控，返回最新的 StoreInfo"""
+        with self._lock:
+            watched = self._watched.pop(store_name, None)
+        if watched is None:
+            return None
+        if watched.browser is not None:
+            watched.browser.close()
+        return watched.store_info
+
+    def get(self, store_name: str) -> StoreInfo:
+        """店铺当前的 StoreInfo（回收后为重新打开的）"""
+        with self._lock:
+            watched = self._watched.get(store_name)
+            return watched.store_info if watched else None
+
+    @contextmanager
+    def using(self, store_name: str):
+        """使用期间不回收该店铺（超出预算的会在用完后的下一次检查中回收）"""
+        with self._lock:
+            watched = self._watched.get(store_name)
+            if watched is None:
+                raise KeyError(f"店铺 {store_name} 未被监控")
+            watched.busy += 1
+        try:
+            yield watched.store_info
+        finally:
+            with self._lock:
+                watched.busy -= 1
+
+    def events(self) -> list:
+        """最近的回收事件"""
+        with self._lock:
+            return list(self._events)
+
+    def _process_info(self, watched: _Watched) -> list:
+        port = watched.store_info.get("debugging_port")
+        if watched.browser is None or watched.browser.closed:
+            watched.browser = CDPSession.connect_browser(port, timeout=10)
+        return watched.browser.send("SystemInfo.getProcessInfo", timeout=10).get("processInfo") or []
+
+    def _js_heap(self, watched: _Watched) -> int:
+        cdp = watched.store_info.get("cdp")
+        own = cdp is None
+        if own:
+            cdp = CDPSession.connect(watched.store_info.get("debugging_port"), timeout=10)
+        try:
+            cdp.send("Performance.enable")
+            metrics = cdp.send("Performance.getMetrics").get("metrics") or []
+            return int(sum(m["value"] for m in metrics if m.get("name") == "JSHeapTotalSize"))
+        finally:
+            if own:
+                cdp.close()
+
+    def _sample_one(self, name: str, watched: _Watched) -> dict:
+        processes = self._process_info(watched)
+        pids = [p["id"] for p in processes if p.get("id")]
+        driver = watched.store_info.get("driver")
+        process = getattr(getattr(driver, "service", None), "process", None)
+        if process is not None:
+            pids.append(process.pid)
+        if self._rss is not None:
+            rss, source = self._rss(pids), "process"
+        else:
+            rss, source = self._js_heap(watched), "js_heap"
+        now = time.monotonic()
+        cpu_time = sum(p.get("cpuTime") or 0 for p in processes)
+        cpu_percent = None
+        if watched.last_cpu is not None and now > watched.last_cpu[0]:
+            cpu_percent = max(0.0, (cpu_time - watched.last_cpu[1]) / (now - watched.last_cpu[0]) * 100)
+        watched.last_cpu = (now, cpu_time)
+        return {"store_name": name, "store_id": watched.store_info.get("store_id"), "rss": rss,
+                "cpu_percent": cpu_percent, "processes": len(pids), "source": source}
+
+    def sample(self) -> list:
+        """
+        采样所有被监控的店铺
+        :return: [{"store_name", "store_id", "rss"(字节), "cpu_percent", "processes", "source"}]
+        """
+        with self._lock:
+            items = list(self._watched.items())
+        samples = []
+        for name, watched in items:
+            try:
+                watched.sample = self._sample_one(name, watched)
+                samples.append(watched.sample)
+            except Exception as e:
+                logger.warning(f"采样店铺 {name} 失败: {e}")
+                if watched.browser is not None:
+                    watched.browser.close()
+        return samples
+
+    def check(self) -> list:
+        """
+        采样一次并回收超出预算的店铺
+        :return: 本次的回收事件
+        """
+        samples = self.sample()
+        to_recycle = {}
+        for sample in samples:
+            watched = self._watched.get(sample["store_name"])
+            if watched is None:
+                continue
+            reason = None
+            if self.store_budget and sample["rss"] > self.store_budget:
+                reason = "store_memory"
+            elif self.cpu_budget and sample["cpu_percent"] is not None and sample["cpu_percent"] > self.cpu_budget:
+                reason = "cpu"
+            watched.violations = watched.violations + 1 if reason else 0
+            if reason and watched.violations >= self.grace:
+                to_recycle[sample["store_name"]] = (reason, sample)
+        if self.host_budget:
+            total = sum(sample["rss"] for sample in samples)
+            freed = sum(sample["rss"] for _, sample in to_recycle.values())
+            # 整机超出预算时从占用最多的店铺开始回收
+            for sample in sorted(samples, key=lambda s: s["rss"], reverse=True):
+                if total - freed <= self.host_budget:
+                    break
+                if sample["store_name"] not in to_recycle:
+                    to_recycle[sample["store_name"]] = ("host_memory", sample)
+                    freed += sample["rss"]
+        events = []
+        for name, (reason, sample) in to_recycle.items():
+            event = self.recycle(name, reason, sample)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _default_reopen(self, store_info: StoreInfo):
+        from store_directory import get_store_directory
+        from ziniao_func import _use_one_browser_run_task, DRIVER_MODE_CDP, DRIVER_MODE_SELENIUM
+
+        browser = get_store_directory().get_by_name(store_info["store_name"])
+        if browser is None:
+            return None
+        driver_mode = self.driver_mode or (DRIVER_MODE_CDP if store_info.get("cdp") else DRIVER_MODE_SELENIUM)
+        return _use_one_browser_run_task(browser, self.is_headless, driver_mode)
+
+    def recycle(self, store_name: str, reason: str = "manual", sample: dict = None) -> dict:
+        """
+        关闭并重新打开店铺
+        :return: 回收事件 {"ts", "store_name", "store_id", "reason", "rss_mb", "cpu_percent", "reopened", "elapsed"}，
+                 店铺正在使用中时返回None（下次检查再回收）
+        """
+        from ziniao_func import close_store_info
+
+        with self._lock:
+            watched = self._watched.get(store_name)
+            if watched is None or watched.busy:
+                return None
+            # 回收期间视为使用中，避免重复回收
+            watched.busy += 1
+        sample = sample or watched.sample or {}
+        started = time.monotonic()
+        old = watched.store_info
+        with log_context(store=store_name):
+            logger.warning(f"回收店铺 {store_name}：{reason}，内存 {sample.get('rss', 0) / _MB:.0f}MB，"
+                           f"CPU {sample.get('cpu_percent') or 0:.0f}%")
+            if watched.browser is not None:
+                watched.browser.close()
+                watched.browser = None
+            try:
+                close_store_info(old)
+            except Exception as e:
+                logger.warning(f"关闭店铺 {store_name} 失败: {e}")
+            new = None
+            try:
+                new = watched.reopen() if watched.reopen else self._default_reopen(old)
+            except Exception as e:
+                logger.error(f"重新打开店铺 {store_name} 失败: {e}")
+        event = {
+            "ts": time.time(),
+            "store_name": store_name,
+            "store_id": old.get("store_id"),
+            "reason": reason,
+            "rss_mb": round(sample.get("rss", 0) / _MB, 1),
+            "cpu_percent": sample.get("cpu_percent"),
+            "reopened": bool(new),
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+        with self._lock:
+            watched.busy -= 1
+            watched.violations = 0
+            watched.last_cpu = None
+            if new:
+                watched.store_info = new
+            else:
+                # 重新打开失败的店铺不再监控
+                self._watched.pop(store_name, None)
+            self._events.append(event)
+        get_metrics().inc("store_recycle", reason=reason, store=store_name)
+        if self.on_recycle is not None:
+            try:
+                self.on_recycle(event)
+            except Exception as e:
+                logger.warning(f"回收事件回调异常: {e}")
+        return event
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"店铺看门狗检查异常: {e}")
+
+    def start(self) -> 'StoreWatchdog':
+        """在后台线程中每隔 interval 秒检查一次"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='store-watchdog', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            watched = list(self._watched.values())
+        for item in watched:
+            if item.browser is not None:
+                item.browser.close()
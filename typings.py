@@ -1,9 +1,34 @@
-from typing import TypedDict, Optional
-from selenium import webdriver
+from typing import TypedDict, Optional, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from selenium import webdriver
+    from cdp_client import CDPSession
 
-class StoreInfo(TypedDict):
-    driver: webdriver.Chrome
+
+class _StoreInfoExtra(TypedDict, total=False):
+    cdp: 'CDPSession'  # CDP模式下的会话（此时driver为None）
+    debugging_port: int  # 店铺浏览器的调试端口
+    core_version: str  # Chromium内核版本
+
+
+class StoreInfo(_StoreInfoExtra):
+    driver: Optional['webdriver.Chrome']
     store_name: str
     store_id: str
 
+
+class LaunchResult(TypedDict):
+    store_name: str
+    status: str  # ok / failed / timeout
+    store_info: Optional[StoreInfo]
+    code: Optional[str]  # 最后一次 startBrowser 的 statusCode
+    attempts: int
+    elapsed: float
+
+
+class PipelineResult(TypedDict):
+    store_name: str
+    status: str  # ok / open_failed / task_failed / missing
+    result: object  # 任务函数的返回值
+    error: Optional[str]
+    elapsed: float  # 打开+运行任务+关闭的总秒数
@@ -0,0 +1,251 @@
+"""
+紫鸟客户端HTTP通讯
+所有与客户端的交互（startBrowser/stopBrowser/getBrowserList/updateCore/exit）都通过同一个
+长连接会话发送，避免每次调用都重新建立TCP连接
+"""
+import json
+import threading
+import time
+import uuid
+
+from logger import logger, LazyJson
+from config import ZINIAO_CONFIG
+
+# 连接超时（秒），本机端口连不上说明客户端没启动，不需要等太久
+CONNECT_TIMEOUT = 3
+
+# 各个action的读取超时（秒）
+ACTION_TIMEOUTS = {
+    'getBrowserList': 15,
+    'stopBrowser': 15,
+    'startBrowser': 120,
+    'updateCore': 60,
+    'exit': 10,
+}
+DEFAULT_TIMEOUT = 60
+
+
+def build_payload(action: str, **fields) -> dict:
+    """
+    构造请求体，自动带上requestId和账号信息
+    :param action: 接口名
+    :param fields: 其余字段
+    """
+    data = {"action": action, "requestId": str(uuid.uuid4())}
+    data.update(fields)
+    data.update(ZINIAO_CONFIG['user_info'])
+    return data
+
+
+def build_start_browser_payload(store_info, isWebDriverReadOnlyMode=0, isprivacy=0, isHeadless=0, cookieTypeSave=0,
+                                jsInfo="") -> dict:
+    data = build_payload(
+        "startBrowser",
+        isWaitPluginUpdate=0,
+        isHeadless=isHeadless,
+        isWebDriverReadOnlyMode=isWebDriverReadOnlyMode,
+        cookieTypeLoad=0,
+        cookieTypeSave=cookieTypeSave,
+        runMode="1",
+        isLoadUserPlugin=True,  # True: 启动时加载插件，False: 不加载插件
+        pluginIdType=1,
+        privacyMode=isprivacy,
+        notPromptForDownload=1,  # 1: 下载文件不弹窗选择保存路径，0: 弹窗
+    )
+    if store_info.isdigit():
+        data["browserId"] = store_info
+    else:
+        data["browserOauth"] = store_info
+
+    if len(str(jsInfo)) > 2:
+        data["injectJsInfo"] = json.dumps(jsInfo)
+    return data
+
+
+def build_stop_browser_payload(browser_oauth) -> dict:
+    return build_payload("stopBrowser", duplicate=0, browserOauth=browser_oauth)
+
+
+def check_result(action: str, r):
+    """
+    统一处理接口返回：空返回转换成statusCode=-1，非0状态码记录日志
+    :param action: 接口名
+    :param r: _send_http 的返回
+    :return: 返回的json字典
+    """
+    if r is None:
+        logger.error(f"{action} 调用失败，返回为空")
+        return {"statusCode": -1, "msg": f"{action} http failed"}
+    code = str(r.get("statusCode"))
+    if code == "-10003":
+        logger.error("login Err %s", LazyJson(r))
+    elif code != "0":
+        logger.error("Fail %s", LazyJson(r))
+    return r
+
+
+class LatencyStats:
+    """按action统计请求次数、失败次数和耗时，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, action, elapsed, ok):
+        with self._lock:
+            stat = self._stats.get(action)
+            if stat is None:
+                stat = {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+                self._stats[action] = stat
+            stat['count'] += 1
+            if not ok:
+                stat['errors'] += 1
+            stat['total'] += elapsed
+            stat['last'] = elapsed
+            if elapsed > stat['max']:
+                stat['max'] = elapsed
+
+    def snapshot(self) -> dict:
+        """
+        :return: {action: {count, errors, total, max, last, avg}}
+        """
+        with self._lock:
+            snapshot = {action: dict(stat) for action, stat in self._stats.items()}
+        for stat in snapshot.values():
+            stat['avg'] = stat['total'] / stat['count'] if stat['count'] else 0.0
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class ZiniaoClient:
+    """
+    紫鸟客户端通讯对象
+    内部维护一个带连接池的 requests.Session，可在多个线程间共享使用
+    """
+
+    def __init__(self, port, host: str = '127.0.0.1', pool_size: int = 10, timeouts: dict = None, throttle=None):
+        """
+        :param port: 客户端的socket端口
+        :param host: 客户端地址
+        :param pool_size: 连接池大小，建议与并发线程数一致
+        :param timeouts: 覆盖默认的 action -> 超时秒数
+        :param throttle: 限流，throttle(action) 返回上下文管理器，请求在其中发送（见 runner.ProcessThrottle）
+        """
+        self.port = port
+        self.url = 'http://{}:{}'.format(host, port)
+        self.timeouts = dict(ACTION_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.pool_size = 0
+        self.throttle = throttle
+        self.latency = LatencyStats()
+        import requests
+
+        self._session = requests.Session()
+        self._session.headers.update({'Content-Type': 'application/json'})
+        self._lock = threading.Lock()
+        self.ensure_pool_size(pool_size)
+
+    def ensure_pool_size(self, pool_size: int):
+        """
+        保证连接池不小于 pool_size（只扩不缩）
+        :param pool_size: 期望的连接池大小
+        """
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+            self.pool_size = pool_size
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            # 替换前关闭旧的连接池，否则其中的连接不会释放
+            old_adapter = self._session.adapters.get('http://')
+            if old_adapter is not None:
+                old_adapter.close()
+            self._session.mount('http://', adapter)
+
+    def get_timeout(self, action: str):
+        """:return: (连接超时, 读取超时)"""
+        return CONNECT_TIMEOUT, self.timeouts.get(action, DEFAULT_TIMEOUT)
+
+    def send(self, data: dict, timeout=None):
+        """
+        发送一次请求
+        :param data: 请求体，必须包含action
+        :param timeout: 本次请求的读取超时，不传则按action取默认值
+        :return: 返回的json字典，失败返回None
+        """
+        action = data.get('action', '')
+        if timeout is None:
+            timeout = self.get_timeout(action)
+        else:
+            timeout = (CONNECT_TIMEOUT, timeout)
+        body = json.dumps(data).encode('utf-8')
+        start = time.perf_counter()
+        try:
+            if self.throttle is None:
+                response = self._session.post(self.url, data=body, timeout=timeout)
+            else:
+                with self.throttle(action):
+                    start = time.perf_counter()
+                    response = self._session.post(self.url, data=body, timeout=timeout)
+            result = json.loads(response.content)
+        except Exception as err:
+            self.latency.record(action, time.perf_counter() - start, False)
+            logger.error(f"{action} 请求异常: {err}")
+            return None
+        self.latency.record(action, time.perf_counter() - start, True)
+        return result
+
+    def stats(self) -> dict:
+        """各action的请求耗时统计"""
+        return self.latency.snapshot()
+
+    def reset_stats(self):
+        self.latency.reset()
+
+    def close(self):
+        self._session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def create_client(pool_size: int = None, throttle=None):
+    """
+    按配置创建客户端通讯对象：配置了 ZINIAO_SOCKET_PORTS 或 ZINIAO_ACCOUNTS_FILE 时为 client_pool.ClientPool，
+    否则为 ZINIAO_SOCKET_PORT 上的 ZiniaoClient
+    :param pool_size: 连接池大小，默认取配置 ZINIAO_HTTP_POOL_SIZE
+    :param throttle: 限流（见 ZiniaoClient）
+    """
+    pool_size = pool_size or int(ZINIAO_CONFIG['http_pool_size'])
+    if ZINIAO_CONFIG['socket_ports'] or ZINIAO_CONFIG['accounts_file']:
+        # 多个客户端实例
+        from client_pool import ClientPool
+
+        return ClientPool.from_config(pool_size, throttle)
+    return ZiniaoClient(ZINIAO_CONFIG['socket_port'], pool_size=pool_size, throttle=throttle)
+
+
+def get_client() -> ZiniaoClient:
+    """获取默认的客户端通讯对象（按配置懒加载创建，见 create_client）"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = create_client()
+    return _default_client
+
+
+def set_client(client: ZiniaoClient):
+    """替换默认的客户端通讯对象，例如改端口或调整超时"""
+    global _default_client
+    with _default_client_lock:
+        old = _default_client
+        _default_client = client
+    if old is not None and old is not client:
+        old.close()
@@ -1,40 +1,80 @@
-import hashlib
+# selenium、requests 等较重的依赖都在用到时才导入，import 本模块不读取配置、不创建日志目录
+# 需要提前初始化时调用 configure()
 import os
 import shutil
+import sys
 import time
 import traceback
-from typing import Dict
-import uuid
 import json
 import platform
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import requests
 import subprocess
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common import NoSuchElementException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from logger import logger
+from logger import logger, log_context, LazyJson
 # from typing import Tuple
 from typings import StoreInfo
-from config import ZINIAO_CONFIG
+from config import ZINIAO_CONFIG, configure
+from store_directory import StoreDirectory, get_store_directory, as_store_directory
+from cdp_client import CDPSession
+from client_pool import ClientPool
+from driver_sync import DriverSync
+from ip_check import verify_store_ip
+from shutdown import get_session_registry
+from session_journal import get_session_journal, SessionJournal
+from resource_profiles import apply_resource_profile, resolve_profile
+from extract import extract
+from metrics import get_metrics
+from readiness import WAIT_POLL_FREQUENCY, PhaseTimer, wait_until, wait_for_port, wait_for_process_exit, is_port_open
+from ziniao_client import (
+    get_client, build_payload, build_start_browser_payload, build_stop_browser_payload, check_result,
+)
+
+is_windows = sys.platform == 'win32'
+is_mac = sys.platform == 'darwin'
+
+# selenium默认的页面加载超时（秒），按截止时间缩短后恢复为该值
+PAGE_LOAD_TIMEOUT = 300
+# 检测ip的页面元素
+IP_SB_XPATH = "//td[@class='proto_address']/a"
+IP_CHECK_SUCCESS_XPATH = '//button[contains(@class, "styles_btn--success")]'
+
+
+def _driver_folder_path() -> str:
+    """存放chromedriver的文件夹路径，程序自动下载driver文件到该路径下"""
+    if is_windows:
+        return ZINIAO_CONFIG['driver_folder_path']
+    return os.path.expanduser(r'~/webdriver')
+
+
+def _client_path() -> str:
+    """紫鸟客户端在本设备的路径"""
+    if is_windows:
+        return ZINIAO_CONFIG['client_path']
+    return os.path.join(os.path.expanduser('~'), 'ziniao')
+
+
+def _socket_port() -> str:
+    """系统未被占用的端口"""
+    return ZINIAO_CONFIG['socket_port']
 
-is_windows = platform.system() == 'Windows'
-is_mac = platform.system() == 'Darwin'
 
-if is_windows:
-    driver_folder_path = ZINIAO_CONFIG['driver_folder_path']   # 存放chromedriver的文件夹路径，程序自动下载driver文件到该路径下
-    client_path = ZINIAO_CONFIG['client_path']  # 紫鸟客户端在本设备的路径
-else:
-    driver_folder_path = os.path.expanduser(r'~/webdriver')
-    client_path = os.path.join(os.path.expanduser('~'), 'ziniao')
-socket_port = ZINIAO_CONFIG['socket_port']  # 系统未被占用的端口
+_LAZY_ATTRS = {
+    'driver_folder_path': _driver_folder_path,
+    'client_path': _client_path,
+    'socket_port': _socket_port,
+    'user_info': lambda: ZINIAO_CONFIG['user_info'],
+}
 
-user_info = ZINIAO_CONFIG['user_info']
+
+def __getattr__(name):
+    """兼容原来的模块级变量 driver_folder_path/client_path/socket_port/user_info，用到时才读取配置"""
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+DRIVER_MODE_SELENIUM = 'selenium'
+DRIVER_MODE_CDP = 'cdp'
+_driver_sync = None
 
 def _kill_process(version):
     """
@@ -56,80 +96,98 @@ def _kill_process(version):
             logger.info("紫鸟客户端未在运行，跳过终止进程")
         else:
             logger.info(f"已终止进程: {process_name}")
+            if not wait_for_process_exit(process_name, timeout=10):
+                logger.warning(f"进程 {process_name} 10秒内未退出")
     elif is_mac:
         ret = subprocess.run(['killall', 'ziniao'], capture_output=True)
         if ret.returncode == 0:
-            time.sleep(3)
+            if not wait_for_process_exit('ziniao', timeout=10):
+                logger.warning("进程 ziniao 10秒内未退出")
         # 未运行时 killall 返回非 0，静默跳过
 
 
-def _start_browser():
+def _start_browser(timeout: float = 60, socket_port=None):
     """
-    启动客户端
-    :return:
+    启动客户端，等待客户端端口开始监听后返回
+    :param timeout: 等待端口就绪的最长秒数
+    :param socket_port: 客户端端口，默认取配置（多个客户端实例时由 ClientPool.start_all 传入）
+    :return: 端口是否就绪
     """
+    socket_port = socket_port or _socket_port()
     try:
         if is_windows:
-            cmd = [client_path, '--run_type=web_driver', '--ipc_type=http', '--port=' + str(socket_port)]
+            cmd = [_client_path(), '--run_type=web_driver', '--ipc_type=http', '--port=' + str(socket_port)]
         elif is_mac:
-            cmd = ['open', '-a', client_path, '--args', '--run_type=web_driver', '--ipc_type=http',
+            cmd = ['open', '-a', _client_path(), '--args', '--run_type=web_driver', '--ipc_type=http',
                    '--port=' + str(socket_port)]
         else:
             exit()
         subprocess.Popen(cmd)
-        time.sleep(5)
     except Exception:
         logger.error('start browser process failed: ' + traceback.format_exc())
         exit()
+    start = time.perf_counter()
+    ready = wait_for_port(socket_port, timeout=timeout)
+    if ready:
+        logger.info(f"客户端端口 {socket_port} 已就绪，耗时 {time.perf_counter() - start:.2f}s")
+    else:
+        logger.warning(f"客户端端口 {socket_port} 在 {timeout} 秒内未就绪")
+    return ready
 
 
-def _update_core():
+def _update_core(timeout: float = 1800):
     """
     下载所有内核，打开店铺前调用，需客户端版本5.285.7以上
     因为http有超时时间，所以这个action适合循环调用，直到返回成功
+    重试间隔从0.2秒开始指数增长到2秒
+    :param timeout: 最长等待秒数
+    :return: 是否更新完成（不支持此接口也视为完成）
     """
-    data = {
-        "action": "updateCore",
-        "requestId": str(uuid.uuid4()),
-    }
-    data.update(user_info)
+    data = build_payload("updateCore")
+    deadline = time.monotonic() + timeout
+    interval = 0.2
     while True:
-        result = _send_http(data)
-        logger.info(result)
-        if result is None:
-            logger.info("等待客户端启动...")
-            time.sleep(2)
-            continue
-        if result.get("statusCode") is None or result.get("statusCode") == -10003:
-            logger.info("当前版本不支持此接口，请升级客户端")
-            return
-        elif result.get("statusCode") == 0:
-            logger.info("更新内核完成")
-            return
-        else:
-            logger.warning(f"等待更新内核: {json.dumps(result)}")
-            time.sleep(2)
+        if _update_core_done(_send_http(data)):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.error(f"更新内核超时（{timeout}秒）")
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, 2)
+
+
+def _update_core_done(result) -> bool:
+    """updateCore 的一次返回是否表示更新完成（不支持此接口也视为完成），同步和asyncio版本共用"""
+    logger.debug("updateCore 返回: %s", LazyJson(result))
+    if result is None:
+        logger.info("等待客户端启动...")
+        return False
+    if result.get("statusCode") is None or result.get("statusCode") == -10003:
+        logger.info("当前版本不支持此接口，请升级客户端")
+        return True
+    if result.get("statusCode") == 0:
+        logger.info("更新内核完成")
+        return True
+    logger.warning("等待更新内核: %s", LazyJson(result))
+    return False
 
 
-def _send_http(data):
+def _send_http(data, timeout=None):
     """
-    通讯方式
-    :param data:
-    :return:
+    通讯方式，通过默认的 ZiniaoClient 长连接会话发送
+    :param data: 请求体
+    :param timeout: 读取超时，不传则按action取默认值
+    :return: 返回的json字典，失败返回None
     """
-    try:
-        url = 'http://127.0.0.1:{}'.format(socket_port)
-        response = requests.post(url, json.dumps(data).encode('utf-8'), timeout=120)
-        return json.loads(response.text)
-    except Exception as err:
-        logger.error(err)
-        return None
+    return get_client().send(data, timeout=timeout)
 
 
 def _delete_all_cache():
     """
     删除所有店铺缓存
     非必要的，如果店铺特别多、硬盘空间不够了才要删除
+    有店铺在运行时会失败；只删除不常用的店铺缓存用 cache_manager.CacheManager
     """
     if not is_windows:
         return
@@ -144,6 +202,7 @@ def _delete_all_cache_with_path(path):
     :param path: 启动客户端参数使用--enforce-cache-path时设置的缓存路径
     删除所有店铺缓存
     非必要的，如果店铺特别多、硬盘空间不够了才要删除
+    按预算只删除不常用的店铺缓存用 CacheManager(cache_root(path))
     """
     if not is_windows:
         return
@@ -152,104 +211,105 @@ def _delete_all_cache_with_path(path):
         shutil.rmtree(cache_path)
 
 
-def _open_store(store_info, isWebDriverReadOnlyMode=0, isprivacy=0, isHeadless=0, cookieTypeSave=0, jsInfo=""):
-    request_id = str(uuid.uuid4())
-    data = {
-        "action": "startBrowser",
-        "isWaitPluginUpdate": 0,
-        "isHeadless": isHeadless,
-        "requestId": request_id,
-        "isWebDriverReadOnlyMode": isWebDriverReadOnlyMode,
-        "cookieTypeLoad": 0,
-        "cookieTypeSave": cookieTypeSave,
-        "runMode": "1",
-        "isLoadUserPlugin": True,  # True: 启动时加载插件，False: 不加载插件
-        "pluginIdType": 1,
-        "privacyMode": isprivacy,
-        "notPromptForDownload": 1,  # 1: 下载文件不弹窗选择保存路径，0: 弹窗
+def _remaining(deadline, timeout: float) -> float:
+    """
+    等待的秒数，不超过截止时间
+    :param deadline: time.monotonic() 的截止时间，None表示不限
+    :param timeout: 没有截止时间时的等待秒数
+    """
+    if deadline is None:
+        return timeout
+    return max(0.1, min(timeout, deadline - time.monotonic()))
+
+
+def _past_deadline(deadline) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _started_store_id(ret_json: dict, fallback=None):
+    """startBrowser 返回中的店铺id（browserOauth，没有时为 browserId）"""
+    store_id = ret_json.get("browserOauth")
+    if store_id is None:
+        store_id = ret_json.get("browserId", fallback)
+    return store_id
+
+
+def _core_version(ret_json: dict):
+    return ret_json.get("core_version") or ret_json.get("coreVersion")
+
+
+def _register_started_store(ret_json: dict, fallback_id=None, store_name: str = None):
+    """
+    startBrowser 成功后登记店铺，退出清理（shutdown_stores）时关闭，启用店铺记录时写入记录
+    同步和asyncio版本共用
+    :return: 店铺id
+    """
+    store_id = _started_store_id(ret_json, fallback_id)
+    get_session_registry().register(store_id, store_name, ret_json.get("debuggingPort"), _core_version(ret_json))
+    return store_id
+
+
+def _build_store_info(ret_json: dict, store_id, store_name: str, driver=None, cdp=None) -> StoreInfo:
+    """打开成功后返回给调用方的 StoreInfo，同步、CDP和asyncio版本共用"""
+    store_info = {
+        "driver": driver,
+        "store_id": store_id,
+        "store_name": store_name,
+        "debugging_port": ret_json.get("debuggingPort"),
+        "core_version": _core_version(ret_json),
     }
-    data.update(user_info)
+    if cdp is not None:
+        store_info["cdp"] = cdp
+    return store_info
 
-    if store_info.isdigit():
-        data["browserId"] = store_info
-    else:
-        data["browserOauth"] = store_info
-
-    if len(str(jsInfo)) > 2:
-        data["injectJsInfo"] = json.dumps(jsInfo)
-
-    r = _send_http(data)
-    if r is None:
-        logger.error("startBrowser 调用失败，返回为空")
-        return {"statusCode": -1, "msg": "startBrowser http failed"}
-    code = str(r.get("statusCode"))
-    if code == "0":
-        return r
-    elif code == "-10003":
-        logger.error(f"login Err {json.dumps(r, ensure_ascii=False)}")
-        return r
-    else:
-        logger.error(f"Fail {json.dumps(r, ensure_ascii=False)} ")
-        return r
+
+def _open_store(store_info, isWebDriverReadOnlyMode=0, isprivacy=0, isHeadless=0, cookieTypeSave=0, jsInfo="",
+                timeout=None, store_name=None):
+    data = build_start_browser_payload(store_info, isWebDriverReadOnlyMode, isprivacy, isHeadless, cookieTypeSave, jsInfo)
+    r = check_result("startBrowser", _send_http(data, timeout=timeout))
+    if str(r.get("statusCode")) == "0":
+        _register_started_store(r, store_info, store_name)
+    return r
 
 
 def _close_store(browser_oauth):
-    request_id = str(uuid.uuid4())
-    data = {
-        "action": "stopBrowser"
-        , "requestId": request_id
-        , "duplicate": 0
-        , "browserOauth": browser_oauth
-    }
-    data.update(user_info)
-
-    r = _send_http(data)
-    if r is None:
-        logger.error("stopBrowser 调用失败，返回为空")
-        return {"statusCode": -1, "msg": "stopBrowser http failed"}
-    code = str(r.get("statusCode"))
-    if code == "0":
-        return r
-    elif code == "-10003":
-        logger.error(f"login Err {json.dumps(r, ensure_ascii=False)}")
-        return r
-    else:
-        logger.error(f"Fail {json.dumps(r, ensure_ascii=False)} ")
-        return r
+    data = build_stop_browser_payload(browser_oauth)
+    r = check_result("stopBrowser", _send_http(data))
+    get_session_registry().unregister(browser_oauth)
+    return r
 
 
 def _get_browser_list() -> list:
-    request_id = str(uuid.uuid4())
-    data = {
-        "action": "getBrowserList",
-        "requestId": request_id
-    }
-    data.update(user_info)
-
-    r = _send_http(data)
-    if r is None:
-        logger.error("getBrowserList 调用失败，返回为空")
-        return []
-    code = str(r.get("statusCode"))
-    if code == "0":
-        return r.get("browserList")
-    elif code == "-10003":
-        logger.error(f"login Err {json.dumps(r, ensure_ascii=False)}")
-        return []
-    else:
-        logger.error(f"Fail {json.dumps(r, ensure_ascii=False)} ")
-        return []
+    r = check_result("getBrowserList", _send_http(build_payload("getBrowserList")))
+    if str(r.get("statusCode")) == "0":
+        return r.get("browserList") or []
+    return []
 
 
-def _get_driver(open_ret_json, is_headless=False):
+def _get_driver(open_ret_json, is_headless=False, capture_network=False, store_name: str = None):
+    """
+    连接店铺浏览器
+    :param capture_network: 是否开启performance日志（配合 perf_log.PerformanceLogConsumer 采集网络事件）
+    :param store_name: 店铺名称，用于选择资源配置（resource_profiles）
+    """
     core_type = open_ret_json.get('core_type')
     if core_type == 'Chromium' or core_type == 0:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from driver_service import get_driver_service_manager
+
+        driver_folder_path = _driver_folder_path()
         major = open_ret_json.get('core_version').split('.')[0]
         if is_windows:
             chrome_driver_path = os.path.join(driver_folder_path, 'chromedriver%s.exe') % major
         else:
             chrome_driver_path = os.path.join(driver_folder_path, 'chromedriver%s') % major
         logger.info(f"chrome_driver_path: {chrome_driver_path}")
+        # 按需同步该店铺用到的版本（每个版本在本进程内只校验一次）
+        if _get_driver_sync().ensure(major) is None:
+            logger.error(f"chromedriver{major} 不存在且下载失败")
+            return None
         port = open_ret_json.get('debuggingPort')
         options = Options()
         options.add_argument('--log-level=3')
@@ -257,15 +317,20 @@ def _get_driver(open_ret_json, is_headless=False):
         options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36")
         options.add_experimental_option("debuggerAddress", '127.0.0.1:' + str(port))
         # 启用performance日志以支持CDP网络事件捕获
-        try:
+        # 开启后chromedriver会缓存所有网络事件直到被读取，所以只在需要时开启并用 PerformanceLogConsumer 持续消费
+        if capture_network:
             options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-        except Exception:
-            pass
         if is_headless:
             options.add_argument('--headless')
             options.add_argument('--window-size=1920,1080')
             options.add_argument('--disable-gpu')
-        driver = webdriver.Chrome(service=Service(chrome_driver_path), options=options)
+        if ZINIAO_CONFIG['shared_driver_service'] == '1':
+            # 同一个内核版本的店铺共用一个chromedriver进程
+            driver = get_driver_service_manager().create_driver(major, chrome_driver_path, options)
+        else:
+            driver = webdriver.Chrome(service=Service(chrome_driver_path), options=options)
+        # 按资源配置屏蔽图片、字体等请求（默认不屏蔽）
+        apply_resource_profile(driver, resolve_profile(store_name))
         # 反检测脚本注入
         if is_headless:
             driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
@@ -280,37 +345,47 @@ def _get_driver(open_ret_json, is_headless=False):
     else:
         return None
 
-def _custom_check_ip(driver, expected_ip):
+def _custom_check_ip(driver, expected_ip, deadline=None):
     """
     自定义ip检测
     :param driver: driver实例
     :param expected_ip: 期望的ip
+    :param deadline: 截止时间（time.monotonic()），等待不超过该时间
     :return: 检测结果
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     if not expected_ip:
         raise ValueError("期望的ip不能为空")
     driver.get("https://ip.sb/")
     # 等待页面加载完成
-    wait = WebDriverWait(driver, timeout=10, poll_frequency=0.5)
-    wait.until(EC.presence_of_element_located((By.XPATH, "//td[@class='proto_address']/a")))
-    ip_element = driver.find_element(By.XPATH, "//td[@class='proto_address']/a")
-    ip = ip_element.text
+    wait = WebDriverWait(driver, timeout=_remaining(deadline, 10), poll_frequency=WAIT_POLL_FREQUENCY)
+    wait.until(EC.presence_of_element_located((By.XPATH, IP_SB_XPATH)))
+    ip = extract(driver, {"xpath": IP_SB_XPATH})
     logger.info(f"当前店铺浏览器检测到的IP：{ip}")
     logger.info(f"期望的IP：{expected_ip}")
     return ip == expected_ip
 
-def _open_ip_check(driver, ip_check_url):
+def _open_ip_check(driver, ip_check_url, deadline=None):
     """
     打开ip检测页检测ip是否正常
     :param driver: driver实例
     :param ip_check_url ip检测页地址
+    :param deadline: 截止时间（time.monotonic()），等待不超过该时间
     :return 检测结果
     """
+    from selenium.common import NoSuchElementException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     try:
         driver.get(ip_check_url)
         # 等待ip检测页加载完成
-        wait = WebDriverWait(driver, timeout=30, poll_frequency=0.5)
-        wait.until(EC.presence_of_element_located((By.XPATH, '//button[contains(@class, "styles_btn--success")]')))
+        wait = WebDriverWait(driver, timeout=_remaining(deadline, 30), poll_frequency=WAIT_POLL_FREQUENCY)
+        wait.until(EC.presence_of_element_located((By.XPATH, IP_CHECK_SUCCESS_XPATH)))
         return True
     except NoSuchElementException:
         logger.warning("未找到ip检测成功元素")
@@ -320,153 +395,182 @@ def _open_ip_check(driver, ip_check_url):
         return False
 
 
-def _open_launcher_page(driver, launcher_page):
+def _open_launcher_page(driver, launcher_page, deadline=None):
+    from selenium.webdriver.support.ui import WebDriverWait
+
     driver.get(launcher_page)
-    # 等待页面加载完成
-    time.sleep(3)
     try:
         # 使用 WebDriverWait 等待页面加载状态为 complete
-        WebDriverWait(driver, timeout=30).until(
+        WebDriverWait(driver, timeout=_remaining(deadline, 30), poll_frequency=WAIT_POLL_FREQUENCY).until(
             lambda d: d.execute_script('return document.readyState') == 'complete'
         )
     except Exception as e:
         logger.warning(f"等待页面加载超时: {e}")
 
 
-def _get_exit():
+def _get_exit(timeout=None):
     """
     关闭客户端
+    :param timeout: 读取超时，不传则按action取默认值
     :return:
     """
-    data = {"action": "exit", "requestId": str(uuid.uuid4())}
-
-    data.update(user_info)
-
-    logger.info('@@ get_exit...' + json.dumps(data, ensure_ascii=False))
-    _send_http(data)
+    data = build_payload("exit")
+    logger.info('@@ get_exit... action=%s', data.get("action"))
+    _send_http(data, timeout=timeout)
 
 
-def _encrypt_sha1(fpath: str) -> str:
-    with open(fpath, 'rb') as f:
-        return hashlib.new('sha1', f.read()).hexdigest()
+def _get_driver_sync() -> DriverSync:
+    global _driver_sync
+    if _driver_sync is None:
+        _driver_sync = DriverSync(_driver_folder_path())
+    return _driver_sync
 
 
-def _download_file(url, save_path):
-    # 发送GET请求获取文件内容
-    response = requests.get(url, stream=True)
-    # 检查请求是否成功
-    if response.status_code == 200:
-        # 创建一个本地文件并写入下载的内容（如果文件已存在，将被覆盖）
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
-        logger.info(f"文件已成功下载并保存到：{save_path}")
-    else:
-        logger.error(f"下载失败，响应状态码为：{response.status_code}")
-
+def download_driver(majors=None) -> dict:
+    """
+    同步各个版本的webdriver驱动
+    :param majors: 只同步这些Chromium主版本，None表示全部（配置了 ZINIAO_DRIVER_MAJORS 时为配置的版本）
+    :return: {"ok": [...], "downloaded": [...], "failed": [...]}
+    """
+    if majors is None and ZINIAO_CONFIG['driver_majors']:
+        majors = [major.strip() for major in ZINIAO_CONFIG['driver_majors'].split(',') if major.strip()]
+    return _get_driver_sync().sync(majors)
 
-def download_driver():
-    if is_windows:
-        config_url = "https://cdn-superbrowser-attachment.ziniao.com/webdriver/exe_32/config.json"
-    elif is_mac:
-        arch = platform.machine()
-        if arch == 'x86_64':
-            config_url = "https://cdn-superbrowser-attachment.ziniao.com/webdriver/mac/x64/config.json"
-        elif arch == 'arm64':
-            config_url = "https://cdn-superbrowser-attachment.ziniao.com/webdriver/mac/arm64/config.json"
-        else:
-            return
-    else:
-        return
-    response = requests.get(config_url)
-    # 检查请求是否成功
-    if response.status_code == 200:
-        # 获取文本内容
-        txt_content = response.text
-        config = json.loads(txt_content)
-    else:
-        logger.error(f"下载驱动失败，状态码：{response.status_code}")
-        exit()
-    if not os.path.exists(driver_folder_path):
-        os.makedirs(driver_folder_path)
+def close_store_and_quit_driver(store_id, driver):
+    """
+    关闭店铺并退出driver
+    批量关闭（并发、有截止时间、超时直接结束进程）用 shutdown.shutdown_stores
+    :param driver: selenium driver 或 CDPSession，为None时只关闭店铺
+    """
+    _close_store(store_id)
+    if driver is not None:
+        driver.quit()
 
-    # 获取文件夹中所有chromedriver文件
-    driver_list = [filename for filename in os.listdir(driver_folder_path) if filename.startswith('chromedriver')]
 
-    for item in config:
-        filename = item['name']
-        if is_windows:
-            filename = filename + ".exe"
-        local_file_path = os.path.join(driver_folder_path, filename)
-        if filename in driver_list:
-            # 判断sha1是否一致
-            file_sha1 = _encrypt_sha1(local_file_path)
-            if file_sha1 == item['sha1']:
-                logger.info(f"驱动{filename}已存在，sha1校验通过...")
-            else:
-                logger.warning(f"驱动{filename}的sha1不一致，重新下载...")
-                _download_file(item['url'], local_file_path)
-                # mac首次下载修改文件权限
-                if is_mac:
-                    cmd = ['chmod', '+x', local_file_path]
-                    subprocess.Popen(cmd)
-        else:
-            logger.info(f"驱动{filename}不存在，开始下载...")
-            _download_file(item['url'], local_file_path)
-            # mac首次下载修改文件权限
-            if is_mac:
-                cmd = ['chmod', '+x', local_file_path]
-                subprocess.Popen(cmd)
+def close_store_info(store_info: StoreInfo):
+    """关闭 open_store_by_name 等返回的店铺（selenium和CDP模式通用）"""
+    close_store_and_quit_driver(store_info["store_id"], store_info.get("driver") or store_info.get("cdp"))
 
-def close_store_and_quit_driver(store_id, driver):
-    _close_store(store_id)
-    driver.quit()
 
-def _use_one_browser_run_task(browser, is_headless: bool = False):
+def _use_one_browser_run_task(browser, is_headless: bool = False, driver_mode: str = DRIVER_MODE_SELENIUM,
+                              capture_network: bool = False, deadline: float = None, on_start_browser=None):
     """
     打开一个店铺运行脚本
     :param browser: 店铺信息
+    :param driver_mode: selenium: 通过chromedriver连接，cdp: 直接通过CDP连接（不需要chromedriver）
+    :param capture_network: 是否开启performance日志（仅selenium模式需要，CDP模式直接订阅事件）
+    :param deadline: 截止时间（time.monotonic()），startBrowser、连接和各阶段的等待都不超过该时间，超过时关闭店铺
+    :param on_start_browser: startBrowser 返回后的回调 (statusCode, 耗时秒数)，批量启动时用于调整并发和重试
     :return: (driver, store_id, store_name) 或 None
     """
+    store_name = browser.get('browserName')
+    timer = PhaseTimer(f"打开店铺{store_name}", kind="store_open", store=store_name)
+    store_info = None
+    try:
+        with log_context(store=store_name, store_id=browser.get('browserOauth')):
+            store_info = _open_store_phases(browser, is_headless, timer, driver_mode, capture_network, deadline,
+                                            on_start_browser)
+        return store_info
+    finally:
+        timer.report()
+        metrics = get_metrics()
+        metrics.observe("store_open", "total", timer.total, store_name)
+        metrics.inc("store_open", status="ok" if store_info else "failed", store=store_name)
+
+
+def _open_store_phases(browser, is_headless: bool, timer: PhaseTimer, driver_mode: str = DRIVER_MODE_SELENIUM,
+                       capture_network: bool = False, deadline: float = None, on_start_browser=None):
+    """_use_one_browser_run_task 的各个阶段，每个阶段的耗时记录到 timer"""
     # 如果要指定店铺ID, 获取方法:登录紫鸟客户端->账号管理->选择对应的店铺账号->点击"查看账号"进入账号详情页->账号名称后面的ID即为店铺ID
     store_id = browser.get('browserOauth')
     store_name = browser.get("browserName")
+    journal = get_session_journal()
+    entry = journal.get(store_id) if journal is not None else None
+    if entry is not None:
+        # 上次进程退出时店铺还开着，优先重新连接
+        with timer.phase("reattach"):
+            store_info = _reattach_store(entry, is_headless, driver_mode, capture_network)
+        if store_info:
+            return store_info
     # 打开店铺
     logger.info(f"=====打开店铺：{store_name}=====")
-    ret_json = _open_store(store_id, isHeadless = 1 if is_headless else 0)
-    logger.info(ret_json)
+    start_timeout = None
+    if deadline is not None:
+        start_timeout = _remaining(deadline, get_client().get_timeout('startBrowser')[1])
+    start = time.perf_counter()
+    with timer.phase("start_browser"):
+        ret_json = _open_store(store_id, isHeadless = 1 if is_headless else 0, timeout=start_timeout,
+                               store_name=store_name)
+    latency = time.perf_counter() - start
+    logger.debug("startBrowser 返回: %s", LazyJson(ret_json))
     code = str(ret_json.get("statusCode")) if isinstance(ret_json, dict) else "-1"
+    get_metrics().inc("start_browser", code=code, store=store_name)
+    if on_start_browser is not None:
+        on_start_browser(code, latency)
     if code != "0":
         logger.error(f"打开店铺失败，statusCode={code}")
         return None
+    return _attach_store(browser, ret_json, is_headless, timer, driver_mode, capture_network, deadline)
+
+
+def _attach_store(browser, ret_json, is_headless: bool, timer: PhaseTimer, driver_mode: str = DRIVER_MODE_SELENIUM,
+                  capture_network: bool = False, deadline: float = None):
+    """
+    startBrowser 成功之后的阶段：连接driver、等待加载、ip检测、打开平台主页
+    :param browser: 店铺信息
+    :param ret_json: startBrowser 的返回
+    :param deadline: 截止时间（time.monotonic()），各阶段的等待都不超过该时间，超过时关闭店铺
+    :return: StoreInfo 或 None（失败时已关闭店铺）
+    """
+    store_name = browser.get("browserName")
     logger.info(
         "调试端口=%s, Chromium内核版本=%s",
         ret_json.get("debuggingPort"),
         ret_json.get("coreVersion"),
     )
-    store_id = ret_json.get("browserOauth")
-    if store_id is None:
-        store_id = ret_json.get("browserId")
+    store_id = _started_store_id(ret_json)
+    if driver_mode == DRIVER_MODE_CDP:
+        return _open_cdp_phases(ret_json, store_id, store_name, is_headless, timer, deadline)
     # 使用驱动实例开启会话
-    driver = _get_driver(ret_json, is_headless)
+    with timer.phase("attach_driver"):
+        driver = _get_driver(ret_json, is_headless, capture_network, store_name)
+    registry = get_session_registry()
+    registry.register(store_id, store_name)
+    registry.attach(store_id, driver=driver)
     if driver is None:
         logger.info(f"=====关闭店铺：{store_name}=====")
         _close_store(store_id)
         return None
+    if _past_deadline(deadline):
+        logger.warning(f"店铺 {store_name} 超过截止时间，关闭")
+        close_store_and_quit_driver(store_id, driver)
+        return None
+    if deadline is not None:
+        # driver.get 最多等到截止时间，打开完成后恢复selenium默认的300秒
+        driver.set_page_load_timeout(_remaining(deadline, PAGE_LOAD_TIMEOUT))
+
+    from selenium.webdriver.support.ui import WebDriverWait
 
     # 等待店铺打开完成
     try:
         # 使用 WebDriverWait 等待页面加载状态为 complete
-        WebDriverWait(driver, timeout=30).until(
-            lambda d: d.execute_script('return document.readyState') == 'complete'
-        )
+        with timer.phase("wait_ready"):
+            WebDriverWait(driver, timeout=_remaining(deadline, 30), poll_frequency=WAIT_POLL_FREQUENCY).until(
+                lambda d: d.execute_script('return document.readyState') == 'complete'
+            )
     except Exception as e:
         logger.warning(f"等待店铺打开超时: {e}")
 
+    if _past_deadline(deadline):
+        logger.warning(f"店铺 {store_name} 超过截止时间，关闭")
+        close_store_and_quit_driver(store_id, driver)
+        return None
     ip_usable = False
     if is_headless:
-        ip_usable = _custom_check_ip(driver, ret_json.get("ip"))
+        with timer.phase("ip_check"):
+            ip_usable = verify_store_ip(driver, store_id, ret_json.get("ip"),
+                                        lambda: _custom_check_ip(driver, ret_json.get("ip"), deadline),
+                                        timeout=_remaining(deadline, 60))
         if not ip_usable:
             logger.warning("ip检测不通过，请检查")
             close_store_and_quit_driver(store_id, driver)
@@ -479,22 +583,26 @@ def _use_one_browser_run_task(browser, is_headless: bool = False):
             logger.info(f"=====关闭店铺：{store_name}=====")
             close_store_and_quit_driver(store_id, driver)
             exit()
-        ip_usable = _open_ip_check(driver, ip_check_url)
+        with timer.phase("ip_check"):
+            ip_usable = verify_store_ip(driver, store_id, ret_json.get("ip"),
+                                        lambda: _open_ip_check(driver, ip_check_url, deadline),
+                                        timeout=_remaining(deadline, 60))
     # 执行脚本
     try:
+        if ip_usable and _past_deadline(deadline):
+            logger.warning(f"店铺 {store_name} 超过截止时间，关闭")
+            ip_usable = None
         if ip_usable:
             logger.info("ip检测通过，打开店铺平台主页")
-            _open_launcher_page(driver, ret_json.get("launcherPage"))
+            with timer.phase("launcher_page"):
+                _open_launcher_page(driver, ret_json.get("launcherPage"), deadline)
+            if deadline is not None:
+                driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
             logger.info(f"店铺{store_name}打开成功")
-            # 是否成功返回
-            # 返回 driver、store_id、store_name
-            return {
-                "driver": driver,
-                "store_id": store_id,
-                "store_name": store_name
-            }
+            return _build_store_info(ret_json, store_id, store_name, driver=driver)
         else:
-            logger.warning("ip检测不通过，请检查")
+            if ip_usable is False:
+                logger.warning("ip检测不通过，请检查")
             close_store_and_quit_driver(store_id, driver)
             return None
     except:
@@ -502,6 +610,161 @@ def _use_one_browser_run_task(browser, is_headless: bool = False):
         close_store_and_quit_driver(store_id, driver)
         return None
 
+def _reattach_store(entry: dict, is_headless: bool = False, driver_mode: str = DRIVER_MODE_SELENIUM,
+                    capture_network: bool = False):
+    """
+    重新连接店铺记录中仍在运行的店铺（不调用 startBrowser）
+    :param entry: SessionJournal 的一条记录
+    :return: StoreInfo 或 None（校验不通过时删除记录）
+    """
+    store_id = entry["store_id"]
+    store_name = entry.get("store_name")
+    if SessionJournal.owned_by_other_process(entry):
+        logger.warning(f"店铺 {store_name or store_id} 由仍在运行的进程 {entry['pid']} 打开，不重新连接")
+        return None
+    registry = get_session_registry()
+    if not SessionJournal.validate(entry):
+        logger.info(f"店铺 {store_name or store_id} 的浏览器已不在运行，重新打开")
+        registry.unregister(store_id)
+        return None
+    port = entry["debugging_port"]
+    core_version = entry.get("core_version")
+    try:
+        if driver_mode == DRIVER_MODE_CDP:
+            cdp = CDPSession.connect(port)
+            apply_resource_profile(cdp, resolve_profile(store_name))
+            driver = None
+        else:
+            cdp = None
+            driver = _get_driver({"core_type": "Chromium", "core_version": core_version, "debuggingPort": port},
+                                 is_headless, capture_network, store_name)
+    except Exception as e:
+        logger.warning(f"重新连接店铺 {store_name or store_id} 失败: {e}")
+        driver = cdp = None
+    if driver is None and cdp is None:
+        registry.unregister(store_id)
+        return None
+    registry.register(store_id, store_name, port, core_version)
+    registry.attach(store_id, driver=driver, cdp=cdp)
+    logger.info(f"已重新连接店铺 {store_name or store_id}（调试端口 {port}）")
+    return _build_store_info({"debuggingPort": port, "core_version": core_version}, store_id, store_name,
+                             driver=driver, cdp=cdp)
+
+
+def recover_sessions(is_headless: bool = False, driver_mode: str = DRIVER_MODE_SELENIUM,
+                     capture_network: bool = False) -> list:
+    """
+    进程崩溃重启后，重新连接店铺记录（ZINIAO_SESSION_JOURNAL）中仍在运行的店铺
+    :return: 重新连接成功的 StoreInfo 列表
+    """
+    journal = get_session_journal()
+    if journal is None:
+        return []
+    entries = journal.entries()
+    if not entries:
+        return []
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(16, len(entries))) as executor:
+        results = list(executor.map(
+            lambda entry: _reattach_store(entry, is_headless, driver_mode, capture_network), entries))
+    recovered = [store_info for store_info in results if store_info]
+    logger.info(f"重新连接 {len(recovered)}/{len(entries)} 个上次未关闭的店铺")
+    return recovered
+
+
+def _cdp_find_xpath_js(xpath: str) -> str:
+    return ("document.evaluate(%s, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)"
+            ".singleNodeValue" % json.dumps(xpath))
+
+
+def _cdp_custom_check_ip(cdp: CDPSession, expected_ip, deadline=None):
+    """CDP模式下的自定义ip检测，逻辑同 _custom_check_ip"""
+    if not expected_ip:
+        raise ValueError("期望的ip不能为空")
+    cdp.navigate("https://ip.sb/", wait_until="DOMContentLoaded", timeout=_remaining(deadline, 30))
+    node = _cdp_find_xpath_js(IP_SB_XPATH)
+    if not wait_until(lambda: cdp.evaluate(f"!!{node}"), timeout=_remaining(deadline, 10)):
+        logger.warning("ip检测页加载超时")
+        return False
+    ip = cdp.evaluate(f"{node}.textContent.trim()")
+    logger.info(f"当前店铺浏览器检测到的IP：{ip}")
+    logger.info(f"期望的IP：{expected_ip}")
+    return ip == expected_ip
+
+
+def _cdp_open_ip_check(cdp: CDPSession, ip_check_url, deadline=None):
+    """CDP模式下打开ip检测页，逻辑同 _open_ip_check"""
+    try:
+        cdp.navigate(ip_check_url, wait_until="DOMContentLoaded", timeout=_remaining(deadline, 30))
+        node = _cdp_find_xpath_js(IP_CHECK_SUCCESS_XPATH)
+        if wait_until(lambda: cdp.evaluate(f"!!{node}"), timeout=_remaining(deadline, 30)):
+            return True
+        logger.warning("未找到ip检测成功元素")
+        return False
+    except Exception:
+        logger.error("ip检测异常:" + traceback.format_exc())
+        return False
+
+
+def _open_cdp_phases(ret_json, store_id, store_name, is_headless: bool, timer: PhaseTimer, deadline: float = None):
+    """CDP模式：不启动chromedriver，直接连接 debuggingPort 完成店铺打开流程"""
+    with timer.phase("attach_driver"):
+        try:
+            cdp = CDPSession.connect(ret_json.get("debuggingPort"))
+            apply_resource_profile(cdp, resolve_profile(store_name))
+        except Exception as e:
+            logger.error(f"CDP连接失败: {e}")
+            cdp = None
+    registry = get_session_registry()
+    registry.register(store_id, store_name)
+    registry.attach(store_id, cdp=cdp)
+    if cdp is None:
+        logger.info(f"=====关闭店铺：{store_name}=====")
+        _close_store(store_id)
+        return None
+    try:
+        with timer.phase("wait_ready"):
+            if not cdp.wait_for_lifecycle("load", timeout=_remaining(deadline, 30)):
+                logger.warning("等待店铺打开超时")
+        if _past_deadline(deadline):
+            logger.warning(f"店铺 {store_name} 超过截止时间，关闭")
+            close_store_and_quit_driver(store_id, cdp)
+            return None
+        with timer.phase("ip_check"):
+            if is_headless:
+                ip_usable = verify_store_ip(cdp, store_id, ret_json.get("ip"),
+                                            lambda: _cdp_custom_check_ip(cdp, ret_json.get("ip"), deadline),
+                                            timeout=_remaining(deadline, 60))
+            else:
+                ip_check_url = ret_json.get("ipDetectionPage")
+                if not ip_check_url:
+                    logger.warning("ip检测页地址为空，请升级紫鸟浏览器到最新版")
+                    ip_usable = False
+                else:
+                    ip_usable = verify_store_ip(cdp, store_id, ret_json.get("ip"),
+                                                lambda: _cdp_open_ip_check(cdp, ip_check_url, deadline),
+                                                timeout=_remaining(deadline, 60))
+        if not ip_usable:
+            logger.warning("ip检测不通过，请检查")
+            close_store_and_quit_driver(store_id, cdp)
+            return None
+        if _past_deadline(deadline):
+            logger.warning(f"店铺 {store_name} 超过截止时间，关闭")
+            close_store_and_quit_driver(store_id, cdp)
+            return None
+        logger.info("ip检测通过，打开店铺平台主页")
+        with timer.phase("launcher_page"):
+            if not cdp.navigate(ret_json.get("launcherPage"), timeout=_remaining(deadline, 30)):
+                logger.warning("等待页面加载超时")
+        logger.info(f"店铺{store_name}打开成功")
+        return _build_store_info(ret_json, store_id, store_name, cdp=cdp)
+    except Exception:
+        logger.error("脚本运行异常:" + traceback.format_exc())
+        close_store_and_quit_driver(store_id, cdp)
+        return None
+
+
 def _check_platform_version():
     is_windows = platform.system() == 'Windows'
     is_mac = platform.system() == 'Darwin'
@@ -509,8 +772,13 @@ def _check_platform_version():
     if not is_windows and not is_mac:
         raise "webdriver/cdp只支持windows和mac操作系统"
 
-def _init_process():
-    """ 需要从系统右下角角标将紫鸟浏览器退出后再运行"""
+def _init_process(kill_client: bool = None) -> dict:
+    """
+    客户端需要以webdriver模式运行，普通方式打开的客户端需要从系统右下角角标退出，或传 kill_client=True
+    :param kill_client: 是否先终止已运行的客户端，默认取配置 ZINIAO_KILL_CLIENT；
+                        不终止时客户端端口已在监听就直接复用，上次未关闭的店铺可以重新连接（recover_sessions）
+    :return: 各阶段耗时 {阶段: 秒数}
+    """
 
     _check_platform_version()
 
@@ -522,69 +790,118 @@ def _init_process():
 
     启动客户端参数使用--enforce-cache-path时用这个方法删除，传入设置的缓存路径删除缓存
     delete_all_cache_with_path(path)
-    """
 
-    '''下载各个版本的webdriver驱动'''
-    download_driver()
+    只想控制缓存总大小时，用 cache_manager.CacheManager(budget_bytes=...).evict()，
+    按最近使用时间删除不常用店铺的缓存，跳过正在打开的店铺
+    """
 
-    # 终止紫鸟客户端已启动的进程
-    # todo 3、v5与v6的进程名不同，按版本修改v5或v6
-    _kill_process(version="v5")
+    timer = PhaseTimer("初始化", kind="init")
+    '''
+    下载webdriver驱动：配置了 ZINIAO_DRIVER_MAJORS 时启动时同步这些版本，
+    否则打开店铺时按需下载该店铺用到的版本（_get_driver），需要全部同步时调用 download_driver()
+    '''
+    if ZINIAO_CONFIG['driver_majors']:
+        with timer.phase("download_driver"):
+            download_driver()
+
+    if kill_client is None:
+        kill_client = ZINIAO_CONFIG['kill_client'] == '1'
+    if kill_client:
+        # 终止紫鸟客户端已启动的进程
+        # todo 3、v5与v6的进程名不同，按版本修改v5或v6
+        with timer.phase("kill_process"):
+            _kill_process(version="v5")
+        journal = get_session_journal()
+        if journal is not None:
+            # 客户端重启后之前的店铺都已关闭
+            journal.clear()
 
     logger.info("=====启动客户端=====")
-    _start_browser()
+    with timer.phase("start_client"):
+        client = get_client()
+        if isinstance(client, ClientPool):
+            client.start_all(skip_running=not kill_client)
+        elif not kill_client and is_port_open(_socket_port()):
+            logger.info(f"客户端端口 {_socket_port()} 已在监听，直接使用")
+        else:
+            _start_browser()
     logger.info("=====更新内核=====")
-    _update_core()
+    with timer.phase("update_core"):
+        _update_core()
+    return timer.report()
+
+def _resolve_directory(browser_list) -> StoreDirectory:
+    """
+    :param browser_list: 店铺列表或 StoreDirectory，为None时初始化客户端并使用默认的店铺目录
+    """
+    if browser_list is None:
+        # 兼容老用法，自动初始化
+        _init_process()
+        logger.info("=====获取店铺列表=====")
+        directory = get_store_directory()
+        directory.refresh()
+        return directory
+    return as_store_directory(browser_list)
+
 
-def open_store_by_name(store_name: str, browser_list=None, is_headless: bool = False) -> tuple[StoreInfo, str]:
+def open_store_by_name(store_name: str, browser_list=None, is_headless: bool = False,
+                       driver_mode: str = DRIVER_MODE_SELENIUM, capture_network: bool = False) -> tuple[StoreInfo, str]:
     """
     根据店铺名称打开店铺
     :param store_name: 店铺名称
-    :param browser_list: 已获取的店铺列表（推荐主流程只初始化一次并传入）
+    :param browser_list: 已获取的店铺列表或 StoreDirectory（推荐主流程只初始化一次并传入）
     :param is_headless: 是否无头模式
+    :param driver_mode: selenium: 返回的 StoreInfo["driver"] 为 webdriver.Chrome；
+                        cdp: 不启动chromedriver，StoreInfo["cdp"] 为 CDPSession，driver 为None
+    :param capture_network: 是否开启performance日志，用 perf_log.PerformanceLogConsumer 读取
     :return: (StoreInfo, str) 店铺信息和错误信息
     """
     err_msg = ''
-    if browser_list is None:
-        # 兼容老用法，自动初始化
-        _init_process()
-        logger.info("=====获取店铺列表=====")
-        browser_list = _get_browser_list()
-    if not browser_list:
+    directory = _resolve_directory(browser_list)
+    if not len(directory):
         logger.warning("browser list is empty")
         err_msg = "browser list is empty"
-        return None, err_msg    
-    for browser in browser_list:
-        if browser.get("browserName").lower() == store_name.lower():
-            return _use_one_browser_run_task(browser, is_headless), err_msg
+        return None, err_msg
+    browser = directory.get_by_name(store_name)
+    if browser is not None:
+        return _use_one_browser_run_task(browser, is_headless, driver_mode, capture_network), err_msg
     err_msg = f"店铺不存在：{store_name}"
     logger.warning(err_msg)
     return None, err_msg
 
 
-def open_stores_by_names(store_names: list, browser_list=None, is_headless: bool = False, max_threads: int = 5):
+def open_stores_by_names(store_names: list, browser_list=None, is_headless: bool = False, max_threads: int = 5,
+                         driver_mode=DRIVER_MODE_SELENIUM, capture_network: bool = False):
     """
     并发打开多个店铺，返回每个店铺的 driver、store_id、store_name 等信息组成的列表。
+    整批店铺会同时保持打开，店铺很多时用 pipeline.run_pipeline（打开-运行-关闭，限制同时在线的数量）
     :param store_names: 店铺名称列表
-    :param browser_list: 已获取的店铺列表（推荐主流程只初始化一次并传入）
+    :param browser_list: 已获取的店铺列表或 StoreDirectory（推荐主流程只初始化一次并传入）
     :param is_headless: 是否无头模式
     :param max_threads: 最大并发线程数
+    :param driver_mode: selenium / cdp，或 {店铺名称: 模式} 按店铺指定（未指定的店铺使用selenium）
+    :param capture_network: 是否开启performance日志，用 perf_log.PerformanceLogConsumer 读取
     :return: [{"driver":..., "store_id":..., "store_name":...}, ...]
     """
-    if browser_list is None:
-        # 兼容老用法，自动初始化
-        _init_process()
-        logger.info("=====获取店铺列表=====")
-        browser_list = _get_browser_list()
-    if not browser_list:
+    directory = _resolve_directory(browser_list)
+    if not len(directory):
         logger.warning("browser list is empty")
         return []
-    name2browser = {browser.get("browserName"): browser for browser in browser_list}
-    selected_browsers = [name2browser[name] for name in store_names if name in name2browser]
+    # 连接池至少要能容纳所有并发线程，否则多出的请求会重复建立连接
+    get_client().ensure_pool_size(max_threads)
+    selected_browsers, missing = directory.find(store_names)
+    if missing:
+        logger.warning(f"店铺不存在：{missing}")
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
     results = []
     def open_one(browser):
-        return _use_one_browser_run_task(browser, is_headless)
-    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        if isinstance(driver_mode, dict):
+            mode = driver_mode.get(browser.get("browserName"), DRIVER_MODE_SELENIUM)
+        else:
+            mode = driver_mode
+        return _use_one_browser_run_task(browser, is_headless, mode, capture_network)
+    with get_metrics().collect() as collector, ThreadPoolExecutor(max_workers=max_threads) as executor:
         future_to_name = {executor.submit(open_one, browser): browser.get("browserName") for browser in selected_browsers}
         for future in as_completed(future_to_name):
             try:
@@ -593,4 +910,6 @@ def open_stores_by_names(store_names: list, browser_list=None, is_headless: bool
                     results.append(result)
             except Exception as e:
                 logger.error(f"打开店铺 {future_to_name[future]} 失败: {e}")
+    logger.info(f"批量打开完成：成功 {len(results)}/{len(selected_browsers)}")
+    collector.report("批量打开 ")
     return results